@@ -0,0 +1,76 @@
+"""
+Timing helpers shared by the benchmark suite: calibrated sampling, percentiles, baselines and comparison.
+"""
+import json
+import platform
+import statistics
+import time
+from collections.abc import Callable
+from typing import Dict, List
+
+
+def _time_batch(func: Callable, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - start
+
+
+def calibrate(func: Callable, min_time: float = 0.01) -> int:
+    """Number of calls needed for one sample to last at least `min_time` seconds."""
+    number = 1
+    while True:
+        if _time_batch(func, number) >= min_time:
+            return number
+        number *= 2
+
+
+def measure(func: Callable, samples: int = 30, min_time: float = 0.01, warmup: int = 3) -> dict:
+    """
+    Time `func` over `samples` calibrated batches. Reports the mean cost per call of the median batch as ops/s,
+    and the per-call cost percentiles across batches in microseconds.
+    """
+    number = calibrate(func, min_time)
+    for _ in range(warmup):
+        _time_batch(func, number)
+    per_call = sorted(_time_batch(func, number) / number for _ in range(samples))
+    median = statistics.median(per_call)
+    return {
+        "ops_per_sec": 1 / median,
+        "p50_us": median * 1e6,
+        "p95_us": percentile(per_call, 95) * 1e6,
+        "p99_us": percentile(per_call, 99) * 1e6,
+        "stdev_pct": statistics.pstdev(per_call) / median * 100,
+        "calls_per_sample": number,
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def save_baseline(results: Dict[str, dict], path: str):
+    with open(path, "w") as f:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results},
+                  f, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> Dict[str, dict]:
+    with open(path, "r") as f:
+        return json.load(f)["results"]
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float = 0.15) -> Dict[str, dict]:
+    """
+    Relative ops/s change of every benchmark present in both runs. A benchmark regressed when it is more than
+    `threshold` (fraction) slower than its baseline.
+    """
+    report = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1
+        report[name] = {"change": change, "regression": change < -threshold}
+    return report
@@ -0,0 +1,107 @@
+"""
+Import-time report of the connector startup, from `python -X importtime`, checked against a startup budget.
+
+Run from the repository root:
+    python -m benchmarks.importtime                      # report the imports of a node running one motion sensor
+    python -m benchmarks.importtime garage strip         # with these device classes configured instead
+    python -m benchmarks.importtime --check              # exit code 1 when over benchmarks/startup_budget.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List
+
+BUDGET_PATH = os.path.join(os.path.dirname(__file__), "startup_budget.json")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def startup_statement(device_classes: List[str]) -> str:
+    """What main() imports before connecting, for a configuration with these device classes."""
+    lookups = "".join(f"; DEVICE_CLASSES[{name!r}]" for name in device_classes)
+    return f"import src.main; from src.enums.device_class import DEVICE_CLASSES{lookups}"
+
+
+def parse_importtime(output: str) -> List[dict]:
+    """Entries of `-X importtime` output: module, self and cumulative time in microseconds, nesting depth."""
+    entries = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            entries.append({"module": match[4], "self_us": int(match[1]), "cumulative_us": int(match[2]),
+                            # One space before top-level modules, two more per level
+                            "depth": (len(match[3]) - 1) // 2})
+    return entries
+
+
+def total_us(entries: List[dict], exclude=("site", "encodings")) -> int:
+    """Time spent in top-level imports, the interpreter's own start-up imports excluded."""
+    return sum(entry["cumulative_us"] for entry in entries if entry["depth"] == 0 and entry["module"] not in exclude)
+
+
+def measure_imports(statement: str, runs: int = 5) -> Dict:
+    """Run `statement` in `runs` fresh interpreters. Returns the median total and the entries of the median run."""
+    measured = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if result.returncode != 0:
+            raise RuntimeError(f"Import failed:\n{result.stderr}")
+        entries = parse_importtime(result.stderr)
+        measured.append((total_us(entries), entries))
+    measured.sort(key=lambda run: run[0])
+    total, entries = measured[len(measured) // 2]
+    return {"total_ms": total / 1000, "spread_ms": (measured[-1][0] - measured[0][0]) / 1000, "entries": entries}
+
+
+def check_budget(report: dict, budget: dict) -> List[str]:
+    """Violations of the budget: total import time above `max_ms`, or `forbidden` modules imported."""
+    violations = []
+    if report["total_ms"] > budget["max_ms"]:
+        violations.append(f"startup imports took {report['total_ms']:.1f} ms, budget {budget['max_ms']} ms")
+    imported = {entry["module"] for entry in report["entries"]}
+    for module in budget.get("forbidden", []):
+        if module in imported:
+            violations.append(f"{module} is imported")
+    return violations
+
+
+def print_report(report: dict, top: int):
+    print(f"Startup imports: {report['total_ms']:.1f} ms (spread across runs {report['spread_ms']:.1f} ms)")
+    print()
+    print(f"{'module':<48} {'cumulative ms':>14} {'self ms':>10}")
+    for entry in sorted(report["entries"], key=lambda entry: entry["cumulative_us"], reverse=True)[:top]:
+        print(f"{'  ' * entry['depth'] + entry['module']:<48} {entry['cumulative_us'] / 1000:>14.2f} "
+              f"{entry['self_us'] / 1000:>10.2f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("classes", nargs="*", help="Device classes configured, those of the budget by default")
+    parser.add_argument("--runs", type=int, default=5, help="Interpreters started, the median one is reported")
+    parser.add_argument("--top", type=int, default=25, help="Slowest modules listed")
+    parser.add_argument("--budget", metavar="FILE", default=BUDGET_PATH, help="Startup budget")
+    parser.add_argument("--check", action="store_true", help="Exit with code 1 when over the budget")
+    args = parser.parse_args(argv)
+
+    with open(args.budget, "r") as f:
+        budget = json.load(f)
+    report = measure_imports(startup_statement(args.classes or budget["classes"]), runs=args.runs)
+    print_report(report, args.top)
+
+    if not args.check:
+        return 0
+    violations = check_budget(report, budget)
+    print()
+    for violation in violations:
+        print(f"OVER BUDGET: {violation}")
+    if not violations:
+        print(f"Within the {budget['max_ms']} ms startup budget.")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
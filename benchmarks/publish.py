@@ -0,0 +1,53 @@
+"""
+Measure MQTTService publish throughput (messages/second) at each QoS level against a running broker.
+
+Run from the repository root, against a broker listening (e.g. `docker compose up mqtt-broker`):
+    python -m benchmarks.publish [host] [port] [messages] [max_inflight]
+or against the in-process test broker, with an optional latency (seconds) added to every packet:
+    python -m benchmarks.publish local [latency] [messages] [max_inflight]
+"""
+import sys
+import time
+
+from src.services.mqtt_service import MQTTService
+from tests.mqtt_broker import MQTTBroker
+
+
+def publish_rate(host: str, port: int, qos: int, messages: int = 5000, max_inflight: int = 20) -> float:
+    """Return the number of messages per second published and acknowledged at `qos`."""
+    service = MQTTService(host=host, port=port, username="", password="", devices=[], interval=0,
+                          publish_policy={"ack": {"qos": qos, "retain": False}}, max_inflight=max_inflight)
+    service.client.connect(host, port)
+    service.client.loop_start()
+    try:
+        start = time.perf_counter()
+        for i in range(messages):
+            service.publish("benchmark/publish", str(i))
+        while service.publish_stats()["acknowledged"] < messages:
+            time.sleep(0.001)
+        return messages / (time.perf_counter() - start)
+    finally:
+        service.client.loop_stop()
+        service.client.disconnect()
+
+
+def main():
+    host = sys.argv[1] if len(sys.argv) > 1 else "localhost"
+    messages = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    max_inflight = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+    broker = None
+    if host == "local":
+        broker = MQTTBroker(latency=float(sys.argv[2]) if len(sys.argv) > 2 else 0.0).start()
+        host, port = broker.host, broker.port
+    else:
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 1883
+    try:
+        for qos in (0, 1, 2):
+            print(f"QoS {qos}: {publish_rate(host, port, qos, messages, max_inflight):>10.0f} messages/s")
+    finally:
+        if broker is not None:
+            broker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Measure MQTTService.on_message routing cost as the number of devices grows.
+
+Run from the repository root:
+    python -m benchmarks.routing
+"""
+import timeit
+from types import SimpleNamespace
+
+from src.services.mqtt_service import MQTTService
+
+
+class _Device:
+    """The part of the device interface MQTTService uses, doing nothing so only the routing is measured."""
+
+    def __init__(self, device_class: str, device_id: int):
+        self.device_class = device_class
+        self.device_id = device_id
+
+    def identifier(self) -> str:
+        return f"{self.device_class}_{self.device_id}"
+
+    def get_topic(self, topic_type: str) -> str:
+        return f"{self.device_class}/{self.device_id}/{'set' if topic_type == 'command' else topic_type}"
+
+    def decode_command(self, payload):
+        return payload
+
+    def handle_command(self, command):
+        pass
+
+    def get_status(self) -> str:
+        return "ON"
+
+
+def route_cost(device_count: int, number: int = 100000) -> float:
+    """Return the mean cost (microseconds) of routing a message to the last registered device."""
+    devices = [_Device("light", i) for i in range(device_count)]
+    service = MQTTService(host="localhost", port=1883, username="", password="", devices=devices, interval=0)
+    message = SimpleNamespace(topic=f"light/{device_count - 1}/set", payload=b"ON")
+    seconds = timeit.timeit(lambda: service.on_message(None, None, message), number=number)
+    return seconds / number * 1e6
+
+
+def main():
+    for device_count in (1, 10, 100, 1000, 10000):
+        print(f"{device_count:>6} devices: {route_cost(device_count):.3f} us/message")
+
+
+if __name__ == "__main__":
+    main()
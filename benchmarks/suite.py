@@ -0,0 +1,117 @@
+"""
+Micro-benchmarks of the connector hot paths, run offline on mocked GPIO.
+
+Run from the repository root:
+    python -m benchmarks.suite                          # print the results
+    python -m benchmarks.suite --save baseline.json     # record a baseline
+    python -m benchmarks.suite --compare baseline.json  # flag regressions against it (exit code 1)
+"""
+import argparse
+import json
+import logging
+import sys
+from types import SimpleNamespace
+
+from benchmarks.harness import compare, load_baseline, measure, save_baseline
+from src.devices.garage import GarageDevice
+from src.devices.light import LightDevice
+from src.services.gpio_service import GPIOService
+from src.services.mqtt_service import MQTTService
+from src.utils.payload_loader import PayloadLoader
+
+STRIP_GPIO = 12
+STRIP_LEDS = 600
+
+
+def garage_config(device_id: int) -> dict:
+    return {"id": device_id, "class": "garage", "gpio": [
+        {"name": "status", "type": "input", "gpio": 1000 + device_id},
+        {"name": "control", "type": "output", "gpio": 2000 + device_id},
+    ]}
+
+
+def build_cases(device_count: int = 100) -> dict:
+    """Benchmark name -> zero-argument callable, all sharing one mocked setup of `device_count` garages."""
+    PayloadLoader.load_payloads()
+    configs = [garage_config(i) for i in range(device_count)]
+    configs.append({"id": 0, "class": "light", "gpio": [{"name": "control", "type": "output", "gpio": 3000}]})
+    gpio_service = GPIOService(devices=configs, mock_gpio=True)
+    gpio_service.initialize_strip(STRIP_GPIO, STRIP_LEDS)
+    # QoS 0 so the unconnected client does not queue the messages
+    service = MQTTService(host="localhost", port=1883, username="", password="", devices=[], interval=0,
+                          timers=gpio_service.timers,
+                          publish_policy={kind: {"qos": 0} for kind in ("status", "availability", "ack")})
+    garages = [GarageDevice(i, "garage", gpio_service, service, service.handle_device_state_change)
+               for i in range(device_count)]
+    light = LightDevice(0, "light", gpio_service, service, service.handle_device_state_change)
+    service.devices = garages + [light]
+    service.publish_status()
+
+    message = SimpleNamespace(topic=f"garage/{device_count - 1}/set", payload=b"OPEN")
+    service.dispatch = lambda device, command: None
+    light_commands = [json.dumps({"state": PayloadLoader.get("light", state)}) for state in ("open", "close")]
+    toggle = iter(range(sys.maxsize))
+
+    def publish_status_refresh():
+        service.state_store.invalidate()
+        service.publish_status()
+
+    def strip_fill():
+        for position in range(STRIP_LEDS):
+            gpio_service.set_strip_color(STRIP_GPIO, position, (255, 120, 0), show=False)
+        gpio_service.show_strip(STRIP_GPIO)
+
+    return {
+        "mqtt.on_message": lambda: service.on_message(None, None, message),
+        "device.get_gpio": lambda: garages[0]._get_gpio("control"),
+        "payload_loader.get": lambda: PayloadLoader.get("garage", "state_open"),
+        "payload_codec.decode": lambda: GarageDevice.codec.decode(b"OPEN"),
+        "light.decode_command": lambda: light.decode_command(light_commands[0]),
+        f"mqtt.publish_status.idle[{device_count}]": service.publish_status,
+        f"mqtt.publish_status.refresh[{device_count}]": publish_status_refresh,
+        "light.handle_command": lambda: light.handle_command(light_commands[next(toggle) & 1]),
+        f"gpio.strip_fill[{STRIP_LEDS}]": strip_fill,
+    }
+
+
+def run(names=None, samples: int = 30, device_count: int = 100) -> dict:
+    results = {}
+    for name, func in build_cases(device_count).items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        results[name] = measure(func, samples=samples)
+        result = results[name]
+        print(f"{name:<36} {result['ops_per_sec']:>14,.0f} ops/s  p50 {result['p50_us']:>10.3f} us  "
+              f"p95 {result['p95_us']:>10.3f} us  p99 {result['p99_us']:>10.3f} us  +/-{result['stdev_pct']:.1f}%")
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help="Only run the benchmarks whose name contains one of these")
+    parser.add_argument("--samples", type=int, default=30, help="Timed batches per benchmark")
+    parser.add_argument("--devices", type=int, default=100, help="Number of devices of the status benchmarks")
+    parser.add_argument("--save", metavar="FILE", help="Write the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Compare the results with a baseline")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Slowdown (fraction of ops/s) reported as a regression, 0.15 by default")
+    args = parser.parse_args(argv)
+
+    # Mocked GPIO and publishing log at debug level, keep them out of the measurements
+    logging.disable(logging.INFO)
+    results = run(args.names, args.samples, args.devices)
+    if args.save:
+        save_baseline(results, args.save)
+    if not args.compare:
+        return 0
+
+    report = compare(results, load_baseline(args.compare), args.threshold)
+    print()
+    for name, entry in report.items():
+        flag = "REGRESSION" if entry["regression"] else "ok"
+        print(f"{name:<36} {entry['change']:>+8.1%}  {flag}")
+    return 1 if any(entry["regression"] for entry in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
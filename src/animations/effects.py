@@ -0,0 +1,179 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+import numpy as np
+
+Color = Tuple[int, int, int]
+
+# Perceptual brightness correction, LEDs are linear while the eye is not
+GAMMA = 2.2
+GAMMA_TABLE = np.round((np.arange(256) / 255) ** GAMMA * 255).astype(np.uint8)
+
+
+class Effect(ABC):
+    """
+    Base class for strip effects.
+
+    An effect renders whole frames as a (num_leds, 3) uint8 RGB array from the time elapsed since it started, so
+    the animation speed does not depend on the achieved frame rate.
+    """
+
+    # Seconds after which the effect is over, None for endless effects
+    duration: Optional[float] = None
+
+    def __init__(self, num_leds: int):
+        self.num_leds = num_leds
+        self.positions = np.arange(num_leds, dtype=np.float32)
+
+    @abstractmethod
+    def render(self, elapsed: float) -> np.ndarray:
+        """Return the frame to display `elapsed` seconds after the effect started."""
+        pass
+
+    def blank(self) -> np.ndarray:
+        return np.zeros((self.num_leds, 3), dtype=np.uint8)
+
+
+class ChaserEffect(Effect):
+    """A single pixel running once along the strip."""
+
+    def __init__(self, num_leds: int, color: Color = (255, 0, 0), speed: float = 10.0):
+        """
+        :param color: Color of the running pixel.
+        :param speed: Speed in LEDs per second.
+        """
+        super().__init__(num_leds)
+        self.color = np.array(color, dtype=np.uint8)
+        self.speed = speed
+        self.duration = num_leds / speed
+
+    def render(self, elapsed: float) -> np.ndarray:
+        frame = self.blank()
+        position = int(elapsed * self.speed)
+        if position < self.num_leds:
+            frame[position] = self.color
+        return frame
+
+
+class GradientEffect(Effect):
+    """A linear gradient between two colors, optionally scrolling along the strip."""
+
+    def __init__(self, num_leds: int, start: Color = (255, 0, 0), end: Color = (0, 0, 255), speed: float = 0.0):
+        """
+        :param start: Color of the first LED.
+        :param end: Color of the last LED.
+        :param speed: Scrolling speed in strip lengths per second, 0 for a static gradient.
+        """
+        super().__init__(num_leds)
+        self.start = np.array(start, dtype=np.float32)
+        self.end = np.array(end, dtype=np.float32)
+        self.speed = speed
+
+    def render(self, elapsed: float) -> np.ndarray:
+        ratio = self.positions / max(self.num_leds - 1, 1)
+        if self.speed:
+            # Scroll as a triangle wave so the gradient wraps around without a seam
+            ratio = np.abs(((ratio + elapsed * self.speed) % 2.0) - 1.0)
+        frame = self.start + (self.end - self.start) * ratio[:, None]
+        return frame.astype(np.uint8)
+
+
+class RainbowEffect(Effect):
+    """The full hue wheel spread along the strip and rotating over time."""
+
+    def __init__(self, num_leds: int, speed: float = 0.2, spread: float = 1.0, brightness: int = 255):
+        """
+        :param speed: Rotations of the hue wheel per second.
+        :param spread: Number of hue wheels displayed along the strip.
+        :param brightness: Maximum channel value.
+        """
+        super().__init__(num_leds)
+        self.speed = speed
+        self.spread = spread
+        self.brightness = brightness
+
+    def render(self, elapsed: float) -> np.ndarray:
+        hue = (self.positions * self.spread / max(self.num_leds, 1) + elapsed * self.speed) % 1.0
+        # HSV to RGB with full saturation and value, vectorized over the strip
+        channels = np.abs(((hue[:, None] * 6.0 + np.array([0.0, 4.0, 2.0])) % 6.0) - 3.0) - 1.0
+        return (np.clip(channels, 0.0, 1.0) * self.brightness).astype(np.uint8)
+
+
+class BreathingEffect(Effect):
+    """The whole strip slowly fading in and out."""
+
+    def __init__(self, num_leds: int, color: Color = (255, 255, 255), period: float = 4.0):
+        """
+        :param color: Color at full brightness.
+        :param period: Seconds for a full in/out cycle.
+        """
+        super().__init__(num_leds)
+        self.color = np.array(color, dtype=np.float32)
+        self.period = period
+
+    def render(self, elapsed: float) -> np.ndarray:
+        level = (1.0 - np.cos(2.0 * np.pi * elapsed / self.period)) / 2.0
+        pixel = GAMMA_TABLE[(self.color * level).astype(np.uint8)]
+        return np.broadcast_to(pixel, (self.num_leds, 3)).copy()
+
+
+class CometEffect(Effect):
+    """A bright head with an exponentially fading tail, looping along the strip."""
+
+    def __init__(self, num_leds: int, color: Color = (255, 255, 255), speed: float = 30.0, tail: float = 10.0):
+        """
+        :param color: Color of the head.
+        :param speed: Speed in LEDs per second.
+        :param tail: Tail length in LEDs (distance at which brightness drops to ~37%).
+        """
+        super().__init__(num_leds)
+        self.color = np.array(color, dtype=np.float32)
+        self.speed = speed
+        self.tail = tail
+
+    def render(self, elapsed: float) -> np.ndarray:
+        head = (elapsed * self.speed) % self.num_leds
+        distance = (head - self.positions) % self.num_leds
+        level = np.exp(-distance / self.tail)
+        return GAMMA_TABLE[(self.color * level[:, None]).astype(np.uint8)]
+
+
+class FadeEffect(Effect):
+    """A gamma-corrected fade from one color to another, then holding the final color until stopped."""
+
+    def __init__(self, num_leds: int, start: Color = (0, 0, 0), end: Color = (255, 255, 255), duration: float = 2.0):
+        """
+        :param start: Color at the beginning of the fade.
+        :param end: Color at the end of the fade.
+        :param duration: Length of the fade in seconds.
+        """
+        super().__init__(num_leds)
+        # Interpolate in linear light so the fade looks even to the eye
+        self.start = (np.array(start, dtype=np.float32) / 255) ** GAMMA
+        self.end = (np.array(end, dtype=np.float32) / 255) ** GAMMA
+        # Not `self.duration`: the effect does not end with the fade, which would clear the strip
+        self.fade_time = duration
+
+    def render(self, elapsed: float) -> np.ndarray:
+        ratio = min(elapsed / self.fade_time, 1.0) if self.fade_time > 0 else 1.0
+        linear = self.start + (self.end - self.start) * ratio
+        pixel = np.round(linear ** (1 / GAMMA) * 255).astype(np.uint8)
+        return np.broadcast_to(pixel, (self.num_leds, 3)).copy()
+
+
+EFFECTS = {
+    "chaser": ChaserEffect,
+    "gradient": GradientEffect,
+    "rainbow": RainbowEffect,
+    "breathing": BreathingEffect,
+    "comet": CometEffect,
+    "fade": FadeEffect,
+}
+
+
+def create_effect(name: str, num_leds: int, **options) -> Effect:
+    """Instantiate a registered effect by name."""
+    effect_type = EFFECTS.get(name)
+    if effect_type is None:
+        raise ValueError(f"Unsupported animation: {name}")
+    return effect_type(num_leds, **options)
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from array import array
+
+import numpy as np
+
+from src.animations.effects import Effect
+from src.services.metrics import REGISTRY
+from src.services.timer_service import TimerService
+
+logger = logging.getLogger("AnimationEngine")
+
+FRAME_RENDER = REGISTRY.histogram("connector_strip_frame_render_seconds",
+                                  "Time to render and show one animation frame.")
+
+_animation_timers = None
+_animation_timers_lock = threading.Lock()
+
+
+def animation_timers() -> TimerService:
+    """
+    Timer service rendering the frames of every strip. A frame blocks while the strip is shown, so frames run on a
+    thread of their own rather than delaying the other timers, or the asyncio loop.
+    """
+    global _animation_timers
+    with _animation_timers_lock:
+        if _animation_timers is None:
+            _animation_timers = TimerService(name="animation")
+        return _animation_timers
+
+
+class AnimationEngine:
+    """Render an effect on a strip at a fixed frame rate, one timer callback per frame."""
+
+    def __init__(self, gpio_service, gpio: int, fps: float = 30, timers=None, on_finish=None):
+        """
+        Initialize AnimationEngine.
+        :param gpio_service: The GPIO service owning the strip frame buffer.
+        :param gpio: Control pin of the strip.
+        :param fps: Target frame rate.
+        :param timers: Timer service scheduling the frames, animation_timers() if None.
+        :param on_finish: Called without arguments when an animation ends on its own (duration elapsed or failure).
+        """
+        self.gpio_service = gpio_service
+        self.gpio = gpio
+        self.fps = fps
+        self.timers = timers if timers is not None else animation_timers()
+        self.on_finish = on_finish
+        self.effect = None
+        self._timer = None
+        self._lock = threading.RLock()
+        self._reset_stats()
+
+    def start(self, effect: Effect):
+        """Start rendering `effect`, replacing any running animation."""
+        with self._lock:
+            self.stop()
+            self._reset_stats()
+            self.effect = effect
+            self._started_at = time.monotonic()
+            self._deadline = self._started_at
+            self._timer = self.timers.call_at(self._deadline, self._frame, effect)
+
+    def stop(self):
+        """Stop the running animation, if any. No frame is rendered once this returns."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._finish()
+
+    def is_running(self) -> bool:
+        return self._timer is not None
+
+    def stats(self) -> dict:
+        """Frame statistics of the current (or last) animation."""
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._stopped_at or time.monotonic()) - self._started_at
+        return {
+            "frames": self.frames,
+            "skipped_frames": self.skipped_frames,
+            "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "render_ms_avg": self._render_total / self.frames * 1000 if self.frames else 0.0,
+            "render_ms_max": self._render_max * 1000,
+        }
+
+    def _reset_stats(self):
+        self.frames = 0
+        self.skipped_frames = 0
+        self._render_total = 0.0
+        self._render_max = 0.0
+        self._started_at = None
+        self._stopped_at = None
+        self._deadline = None
+
+    def _finish(self):
+        self._timer = None
+        self._stopped_at = time.monotonic()
+
+    def _frame(self, effect: Effect):
+        if not self._advance(effect) and self.on_finish is not None:
+            self.on_finish()
+
+    def _advance(self, effect: Effect) -> bool:
+        """Render the frame due and schedule the next one. Returns False if the animation ended by itself."""
+        with self._lock:
+            # A stop() or start() may have won the race against this callback
+            if self.effect is not effect or self._timer is None:
+                return True
+            elapsed = time.monotonic() - self._started_at
+            if effect.duration is not None and elapsed >= effect.duration:
+                self._finish()
+                # The last frame rendered may still light some LEDs
+                try:
+                    self.gpio_service.set_strip_frame(self.gpio, to_packed(effect.blank()))
+                    self.gpio_service.show_strip(self.gpio)
+                except Exception:
+                    logger.exception(f"Clearing the strip on GPIO pin {self.gpio} failed")
+                return False
+            try:
+                self._render(effect, elapsed)
+            except Exception:
+                logger.exception(f"Animation on GPIO pin {self.gpio} failed")
+                self._finish()
+                return False
+
+            # Schedule against absolute deadlines so the frame rate does not drift, and skip
+            # the frames we are already too late for instead of trying to catch up
+            period = 1.0 / self.fps
+            self._deadline += period
+            now = time.monotonic()
+            if now > self._deadline:
+                missed = int((now - self._deadline) / period) + 1
+                self.skipped_frames += missed
+                self._deadline += missed * period
+            self._timer = self.timers.call_at(self._deadline, self._frame, effect)
+            return True
+
+    def _render(self, effect: Effect, elapsed: float):
+        start = time.perf_counter()
+        self.gpio_service.set_strip_frame(self.gpio, to_packed(effect.render(elapsed)))
+        self.gpio_service.show_strip(self.gpio)
+        render_time = time.perf_counter() - start
+        FRAME_RENDER.observe(render_time)
+
+        self.frames += 1
+        self._render_total += render_time
+        self._render_max = max(self._render_max, render_time)
+
+
+def to_packed(pixels: np.ndarray) -> array:
+    """Convert a (num_leds, 3) RGB frame to one packed 0xRRGGBB value per LED."""
+    rgb = pixels.astype(np.uint32)
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    frame = array("I")
+    frame.frombytes(packed.tobytes())
+    return frame
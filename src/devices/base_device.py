@@ -1,13 +1,30 @@
+import contextvars
 from abc import ABC, abstractmethod
+from collections import namedtuple
 from collections.abc import Callable
+from functools import lru_cache
+from typing import Optional
 
 from src.services.gpio_service import GPIOService
 from src.services.mqtt_service import MQTTService
+from src.utils.payload_loader import PayloadLoader
 
 
 class BaseDevice(ABC):
     """Abstract base class for all devices."""
 
+    # Pins that must be present in the device configuration
+    required_pins = ()
+    # Input pins whose edges are pushed to Home Assistant as soon as they happen
+    watched_pins = ()
+    # Home Assistant MQTT discovery component, None for devices that are not discoverable
+    discovery_component = None
+    # Compiled payloads of the device class (PayloadCodec)
+    codec = None
+    # Availability topic of the whole connector, set by DeviceService. Home Assistant then requires it online too
+    # when the device has an availability topic of its own
+    bridge_availability_topic = None
+
     def __init__(self, device_id: int, device_class: str, gpio_service: GPIOService, mqtt_service: MQTTService,
                  on_state_change: Callable, custom_vars: dict = None):
         self.device_id = device_id
@@ -21,15 +38,49 @@ class BaseDevice(ABC):
         }
         self._on_state_change = on_state_change
         self.custom_vars = custom_vars if custom_vars is not None else {}
+        self.pins = self._build_pin_table()
+        for pin_name in self.watched_pins:
+            self.watch_input(pin_name)
 
     @abstractmethod
-    def handle_command(self, command: str):
-        """Process a command specific to the device."""
+    def handle_command(self, command):
+        """Process a command specific to the device, either a raw payload or the result of decode_command()."""
         pass
 
+    def decode_command(self, payload):
+        """
+        Map a command payload (bytes or str) to the command passed to handle_command, done once when the message is
+        received. Raises ValueError on unknown commands.
+        """
+        command = self.codec.decode(payload) if self.codec is not None and self.codec.commands else None
+        if command is None:
+            if isinstance(payload, bytes):
+                payload = payload.decode(errors="replace")
+            raise ValueError(f"Unknown command '{payload}' for {type(self).__name__} {self.device_id}.")
+        return command
+
+    async def handle_command_async(self, command: str, executor=None):
+        """
+        Coroutine version of handle_command, used by the asyncio runtime.
+        GPIO access is blocking, so the default implementation runs handle_command in `executor`, within a copy of
+        the current context so the command trace follows it.
+        """
+        # Only the asyncio runtime, which has already imported asyncio, gets here: keep it off the threaded startup
+        import asyncio
+        context = contextvars.copy_context()
+        await asyncio.get_running_loop().run_in_executor(executor, context.run, self.handle_command, command)
+
+    def coalesce_key(self, command) -> Optional[str]:
+        """
+        Commands sharing a non-None key supersede each other while queued, only the latest one is executed.
+        `command` is the result of decode_command().
+        Only idempotent commands that fully determine the device state should have a key.
+        """
+        return None
+
     @abstractmethod
-    def get_status(self) -> str:
-        """Return the current status of the device."""
+    def get_status(self):
+        """Return the current status payload of the device, preferably pre-encoded bytes (PayloadCodec.encode)."""
         pass
 
     def delay_updates(self, delay_seconds: int):
@@ -47,6 +98,29 @@ class BaseDevice(ABC):
             actual_state = state if state is not None else self.get_status()
             self._on_state_change(self.device_class, self.device_id, actual_state)
 
+    def discovery_config(self, node_id: str) -> dict:
+        """Home Assistant MQTT discovery config of the device, built from its topics and discovery_options()."""
+        config = {
+            "name": self.custom_vars.get("name", f"{self.device_class} {self.device_id}"),
+            "unique_id": f"{node_id}_{self.identifier()}",
+            "availability_topic": self.topics["availability"],
+            "payload_available": PayloadLoader.get("availability", "online"),
+            "payload_not_available": PayloadLoader.get("availability", "offline"),
+            "state_topic": self.topics["status"],
+            "command_topic": self.topics["command"],
+            "device": {"identifiers": [node_id], "name": node_id, "manufacturer": "ha-rpi-connector"},
+        }
+        bridge = self.bridge_availability_topic
+        if bridge is not None and bridge != self.topics["availability"]:
+            config["availability"] = [{"topic": bridge}, {"topic": config.pop("availability_topic")}]
+            config["availability_mode"] = "all"
+        config.update(self.discovery_options())
+        return {key: value for key, value in config.items() if value is not None}
+
+    def discovery_options(self) -> dict:
+        """Component specific entries of the discovery config. A None value removes a default entry."""
+        return {}
+
     def get_topic(self, topic_type):
         if topic_type not in self.topics:
             raise ValueError(f"Invalid topic type: {topic_type}")
@@ -67,12 +141,42 @@ class BaseDevice(ABC):
         gpio = self._get_gpio(pin_name)
         self.gpio_service.toggle_pin(gpio, duration)
 
+    def watch_input(self, pin_name: str):
+        """Notify a state change whenever the given input pin changes level."""
+        gpio = self._get_gpio(pin_name)
+        self.gpio_service.add_edge_callback(gpio, self._on_input_edge)
+
+    def close(self):
+        """Release what the device holds (watchers, timers) when it is removed or rebuilt by a config reload."""
+        for pin_name in self.watched_pins:
+            self.gpio_service.remove_edge_callback(self._get_gpio(pin_name), self._on_input_edge)
+
+    def _on_input_edge(self, gpio: int, level: int):
+        self.notify_state_change()
+
     def _get_gpio(self, pin_name: str) -> int:
         """Retrieve GPIO pin number by name."""
+        try:
+            return getattr(self.pins, pin_name)
+        except AttributeError:
+            raise ValueError(f"Pin '{pin_name}' not found for device {self.device_id}.") from None
+
+    def _build_pin_table(self):
+        """Resolve the device pins once, so lookups are attribute accesses (`self.pins.control`)."""
         device = next((device for device in self.gpio_service.devices if device['id'] == self.device_id and device['class'] == self.device_class), None)
         if not device:
             raise ValueError(f"Device '{self.device_id}' not found.")
-        pin = next((gpio for gpio in device['gpio'] if gpio["name"] == pin_name), None)
-        if not pin:
-            raise ValueError(f"Pin '{pin_name}' not found for device {self.device_id}.")
-        return pin["gpio"]
\ No newline at end of file
+        pins = {gpio["name"]: gpio["gpio"] for gpio in device['gpio']}
+        for pin_name in self.required_pins:
+            if pin_name not in pins:
+                raise ValueError(f"Pin '{pin_name}' not found for device {self.device_id}.")
+        try:
+            return _pin_table_type(tuple(pins))(**pins)
+        except ValueError as e:
+            raise ValueError(f"Invalid pin name for device {self.device_id}: {e}") from None
+
+
+@lru_cache(maxsize=None)
+def _pin_table_type(pin_names: tuple):
+    """One immutable, slotted record type per distinct set of pin names."""
+    return namedtuple("PinTable", pin_names)
\ No newline at end of file
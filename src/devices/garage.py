@@ -1,23 +1,36 @@
 from src.devices.base_device import BaseDevice
-from src.utils.payload_loader import PayloadLoader
+from src.enums.payload_enums import GarageCommand, GarageState
+from src.utils.payload_codec import PayloadCodec
 
 
 class GarageDevice(BaseDevice):
+    required_pins = ("status", "control")
+    watched_pins = ("status",)
+    discovery_component = "cover"
+    codec = PayloadCodec("garage", GarageCommand, GarageState)
 
-    def handle_command(self, command: str):
+    def discovery_options(self) -> dict:
+        return {
+            "device_class": "garage",
+            "payload_open": self.codec.payload(GarageCommand.OPEN),
+            "payload_close": self.codec.payload(GarageCommand.CLOSE),
+            "state_open": self.codec.payload(GarageState.OPEN),
+            "state_opening": self.codec.payload(GarageState.OPENING),
+            "state_closed": self.codec.payload(GarageState.CLOSED),
+            "state_closing": self.codec.payload(GarageState.CLOSING),
+        }
+
+    def handle_command(self, command):
         """Handle garage-specific commands like open/close."""
-        if command == PayloadLoader.get("garage", "open"):
-            self.toggle_control("control")
-            self.notify_state_change(PayloadLoader.get("garage", "state_opening"))
-            self.delay_updates(7)
-        elif command == PayloadLoader.get("garage", "close"):
-            self.toggle_control("control")
-            self.notify_state_change(PayloadLoader.get("garage", "state_closing"))
-            self.delay_updates(7)
+        command = self.decode_command(command)
+        self.toggle_control("control")
+        if command is GarageCommand.OPEN:
+            self.notify_state_change(self.codec.encode(GarageState.OPENING))
         else:
-            raise ValueError(f"Unknown command '{command}' for GarageDevice {self.device_id}.")
+            self.notify_state_change(self.codec.encode(GarageState.CLOSING))
+        self.delay_updates(7)
 
-    def get_status(self) -> str:
+    def get_status(self) -> bytes:
         """Return the current status of the garage door."""
         status_pin = self.read_status("status")
-        return PayloadLoader.get("garage", "state_open") if status_pin == 1 else PayloadLoader.get("garage", "state_closed")
\ No newline at end of file
+        return self.codec.encode(GarageState.OPEN if status_pin == 1 else GarageState.CLOSED)
@@ -1,36 +1,61 @@
 import json
-import threading
-import time
 
 from src.devices.base_device import BaseDevice
 from src.enums.gpio_enums import GPIOState
+from src.enums.payload_enums import LightCommand, LightState
 from src.services.gpio_service import GPIOService
 from src.services.mqtt_service import MQTTService
-from src.utils.payload_loader import PayloadLoader
+from src.utils.payload_codec import PayloadCodec
 
 
 class LightDevice(BaseDevice):
+    required_pins = ("control",)
+    discovery_component = "light"
+    # Commands and status are JSON documents, the codec maps their "state" member
+    codec = PayloadCodec("light", LightCommand, LightState, state_format=lambda state: json.dumps({"state": state}))
 
     def __init__(self, device_id: int, device_class: str, gpio_service: GPIOService, mqtt_service: MQTTService, on_state_change, custom_vars=None):
         super().__init__(device_id, device_class, gpio_service, mqtt_service, on_state_change, custom_vars)
         self.status = None
         self.brightness = 255
-        self.cleaning_thread = None
-        self.stop_flash = threading.Event()
+        self.flash_timer = None
 
 
-    def get_status(self) -> str:
-        return json.dumps({
-            "state": PayloadLoader.get("light", "open") if self.status == GPIOState.HIGH else PayloadLoader.get("light", "close"),
-        })
+    def get_status(self) -> bytes:
+        return self.codec.encode(LightState.ON if self.status == GPIOState.HIGH else LightState.OFF)
 
-    def handle_command(self, command: str):
-        """Handle garage-specific commands like open/close."""
-        payload = json.loads(command)
-        if payload['state'] == PayloadLoader.get("light", "open"):
+    def discovery_options(self) -> dict:
+        # Commands and status are JSON documents, HA's "json" schema
+        return {"schema": "json"}
+
+    def decode_command(self, payload):
+        """Parse the JSON command, its "state" member mapped to a LightCommand (None if absent)."""
+        try:
+            command = json.loads(payload)
+        except ValueError:
+            command = None
+        if not isinstance(command, dict):
+            raise ValueError(f"Invalid command '{payload}' for LightDevice {self.device_id}.")
+        if 'state' in command:
+            state = self.codec.decode(command['state']) if isinstance(command['state'], str) else None
+            if state is None:
+                raise ValueError(f"Unknown state '{command['state']}' for LightDevice {self.device_id}.")
+            command['state'] = state
+        else:
+            command['state'] = None
+        return command
+
+    def coalesce_key(self, command):
+        """Plain state commands supersede each other, flashes are always played."""
+        return "state" if 'flash' not in command else None
+
+    def handle_command(self, command):
+        """Handle light-specific commands like on/off and flashes."""
+        payload = command if isinstance(command, dict) else self.decode_command(command)
+        if payload['state'] is LightCommand.ON:
             self.status = GPIOState.HIGH
             self.write_status("control", self.status)
-        elif payload['state'] == PayloadLoader.get("light", "close"):
+        elif payload['state'] is LightCommand.OFF:
             self.status = GPIOState.LOW
             self.write_status("control", self.status)
         if 'brightness' in payload:
@@ -39,22 +64,21 @@ class LightDevice(BaseDevice):
         if 'flash' in payload:
             self.status = GPIOState.HIGH
             self.write_status("control", self.status)
-            if self.cleaning_thread and self.cleaning_thread.is_alive():
-                self.stop_flash.set()
-                self.cleaning_thread.join()
-
-            self.stop_flash.clear()
-            self.cleaning_thread = threading.Thread(target=self.clean_light_after, args=(payload['flash'],))
-            self.cleaning_thread.start()
+            if self.flash_timer is not None:
+                self.flash_timer.cancel()
+            self.flash_timer = self.gpio_service.timers.call_later(payload['flash'], self.clean_light)
 
         self.notify_state_change()
 
-    def clean_light_after(self, duration: float):
-        start = time.time()
-        while time.time() - start < duration:
-            if self.stop_flash.is_set():
-                break
-            time.sleep(0.1)
+    def close(self):
+        super().close()
+        if self.flash_timer is not None:
+            self.flash_timer.cancel()
+            self.flash_timer = None
+
+    def clean_light(self):
+        """Turn the light off at the end of a flash."""
+        self.flash_timer = None
         self.status = GPIOState.LOW
         self.write_status("control", self.status)
         self.notify_state_change()
\ No newline at end of file
@@ -1,18 +1,34 @@
 from src.devices.base_device import BaseDevice
-from src.enums.gpio_enums import GPIOState
+from src.enums.payload_enums import MotionState
 from src.services.gpio_service import GPIOService
 from src.services.mqtt_service import MQTTService
-from src.utils.payload_loader import PayloadLoader
+from src.utils.payload_codec import PayloadCodec
 
 
 class MotionDevice(BaseDevice):
+    required_pins = ("status",)
+    watched_pins = ("status",)
+    discovery_component = "binary_sensor"
+    codec = PayloadCodec("motion", states=MotionState)
 
     def __init__(self, device_id: int, device_class: str, gpio_service: GPIOService, mqtt_service: MQTTService, on_state_change, custom_vars=None):
         super().__init__(device_id, device_class, gpio_service,mqtt_service, on_state_change, custom_vars)
         self.status = None
 
-    def get_status(self) -> str:
-        return PayloadLoader.get("motion", "detected") if self.read_status("status") else PayloadLoader.get("motion", "free")
+    def get_status(self) -> bytes:
+        return self.codec.encode(MotionState.DETECTED if self.read_status("status") else MotionState.FREE)
 
-    def handle_command(self, command: str):
-        raise ValueError(f"MotionDevice is a read-only device.")
\ No newline at end of file
+    def discovery_options(self) -> dict:
+        # Read-only, binary sensors have no command topic
+        return {
+            "command_topic": None,
+            "device_class": "motion",
+            "payload_on": self.codec.payload(MotionState.DETECTED),
+            "payload_off": self.codec.payload(MotionState.FREE),
+        }
+
+    def decode_command(self, payload):
+        raise ValueError(f"MotionDevice is a read-only device.")
+
+    def handle_command(self, command):
+        raise ValueError(f"MotionDevice is a read-only device.")
@@ -1,27 +1,41 @@
 from src.devices.base_device import BaseDevice
 from src.enums.gpio_enums import GPIOState
+from src.enums.payload_enums import SirenCommand
 from src.services.gpio_service import GPIOService
 from src.services.mqtt_service import MQTTService
-from src.utils.payload_loader import PayloadLoader
+from src.utils.payload_codec import PayloadCodec
+
+# The siren publishes the level of its control pin
+_STATUS_PAYLOADS = {state: state.value.encode() for state in GPIOState}
 
 
 class SirenDevice(BaseDevice):
+    required_pins = ("control",)
+    discovery_component = "siren"
+    codec = PayloadCodec("siren", SirenCommand)
 
-    def __init__(self, device_id: int, device_class: str, gpio_service: GPIOService, mqtt_service: MQTTService, on_state_change):
-        super().__init__(device_id, device_class, gpio_service, mqtt_service, on_state_change)
+    def __init__(self, device_id: int, device_class: str, gpio_service: GPIOService, mqtt_service: MQTTService, on_state_change, custom_vars=None):
+        super().__init__(device_id, device_class, gpio_service, mqtt_service, on_state_change, custom_vars)
         self.status = None
 
-    def get_status(self) -> str:
-        return self.status
-
-    def handle_command(self, command: str):
-        """Handle garage-specific commands like open/close."""
-        if command == PayloadLoader.get("siren", "on"):
-            self.status = GPIOState.HIGH
-            self.write_status("control", GPIOState.HIGH)
-        elif command == PayloadLoader.get("siren", "off"):
-            self.status = GPIOState.LOW
-            self.write_status("control", GPIOState.LOW)
-        else:
-            raise ValueError(f"Unknown command '{command}' for SirenDevice {self.device_id}.")
-        self.notify_state_change()
\ No newline at end of file
+    def get_status(self):
+        return _STATUS_PAYLOADS.get(self.status)
+
+    def discovery_options(self) -> dict:
+        return {
+            "payload_on": self.codec.payload(SirenCommand.ON),
+            "payload_off": self.codec.payload(SirenCommand.OFF),
+            "state_on": GPIOState.HIGH.value,
+            "state_off": GPIOState.LOW.value,
+        }
+
+    def coalesce_key(self, command):
+        """On/off commands only matter for the last one."""
+        return "state"
+
+    def handle_command(self, command):
+        """Handle siren-specific commands like on/off."""
+        command = self.decode_command(command)
+        self.status = GPIOState.HIGH if command is SirenCommand.ON else GPIOState.LOW
+        self.write_status("control", self.status)
+        self.notify_state_change()
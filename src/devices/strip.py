@@ -1,62 +1,76 @@
-import threading
-import time
+from src.animations.effects import create_effect
+from src.animations.engine import AnimationEngine
 from src.devices.base_device import BaseDevice
 from src.enums.gpio_enums import GPIOState
-from src.utils.payload_loader import PayloadLoader
+from src.enums.payload_enums import StripCommand, StripState
+from src.utils.payload_codec import PayloadCodec
 
 class StripDevice(BaseDevice):
+    required_pins = ("control", "power")
+    discovery_component = "switch"
+    codec = PayloadCodec("strip", StripCommand, StripState)
 
     def __init__(self, device_id: int, device_class: str, gpio_service, mqtt_service, on_state_change, custom_vars=None):
         super().__init__(device_id, device_class, gpio_service, mqtt_service, on_state_change, custom_vars)
-        self.gpio_service.initialize_strip(self._get_gpio("control"), self.custom_vars['num_leds'])
-        self.animation_thread = None
-        self.stop_animation = threading.Event()
+        self.gpio_service.initialize_strip(self.pins.control, self.custom_vars['num_leds'])
+        self.animation = AnimationEngine(self.gpio_service, self.pins.control, fps=self.custom_vars.get('fps', 30),
+                                         on_finish=self.notify_state_change)
         self.last_applied_color = None
 
-    def handle_command(self, command: str):
+    def handle_command(self, command):
         """Handle strip-specific commands."""
-        if command == PayloadLoader.get("strip", "color"):
+        command = self.decode_command(command)
+        if command is StripCommand.COLOR:
+            self.animation.stop()
             self.last_applied_color = self.custom_vars.get('color', (255, 255, 255))
-            for i in range(self.custom_vars['num_leds']):
-                self.gpio_service.set_strip_color(self._get_gpio("control"), i, self.last_applied_color)
+            self.gpio_service.fill_strip(self.pins.control, self.last_applied_color)
+            self.gpio_service.show_strip(self.pins.control)
             self.write_status("power", GPIOState.HIGH)
-        elif command == PayloadLoader.get("strip", "garage_animation"):
+        elif command is StripCommand.ANIMATION:
             self.write_status("power", GPIOState.HIGH)
             self.start_animation()
-        elif command == PayloadLoader.get("strip", "stop"):
+        else:
+            self.animation.stop()
             self.last_applied_color = None
-            for i in range(self.custom_vars['num_leds']):
-                self.gpio_service.set_strip_color(self._get_gpio("control"), i, (0, 0, 0))
+            self.gpio_service.fill_strip(self.pins.control, (0, 0, 0))
+            self.gpio_service.show_strip(self.pins.control)
             self.write_status("power", GPIOState.LOW)
-        else:
-            raise ValueError(f"Unknown command '{command}' for StripDevice {self.device_id}.")
+        self.notify_state_change()
+
+    def close(self):
+        super().close()
+        # Silently: the device is gone, or replaced by one that publishes its own state
+        self.animation.on_finish = None
+        self.animation.stop()
 
-    def get_status(self) -> str:
+    def discovery_options(self) -> dict:
+        # Exposed as a switch playing the configured animation
+        return {
+            "payload_on": self.codec.payload(StripCommand.ANIMATION),
+            "payload_off": self.codec.payload(StripCommand.STOP),
+            "state_on": self.codec.payload(StripState.RUNNING),
+            "state_off": self.codec.payload(StripState.STOPPED),
+        }
+
+    def coalesce_key(self, command):
+        """Color, animation and stop each set the whole strip, only the last one matters."""
+        return "state"
+
+    def get_status(self) -> bytes:
         """Return the current status of the strip."""
-        if self.animation_thread and self.animation_thread.is_alive():
-            return PayloadLoader.get("strip", "running")
+        if self.animation.is_running():
+            return self.codec.encode(StripState.RUNNING)
         elif self.last_applied_color is not None:
-            return PayloadLoader.get("strip", "color")
+            return self.codec.encode(StripState.COLOR)
         else:
-            return PayloadLoader.get("strip", "stopped")
+            return self.codec.encode(StripState.STOPPED)
 
     def start_animation(self):
-        """Start an animation in a separate thread."""
-        if self.animation_thread and self.animation_thread.is_alive():
-            self.stop_animation.set()
-            self.animation_thread.join()
-
-        self.stop_animation.clear()
-        self.animation_thread = threading.Thread(target=self.animate)
-        self.animation_thread.start()
-
-    def animate(self):
-        """Run a simple animation."""
-        for i in range(self.custom_vars['num_leds']):
-            if self.stop_animation.is_set():
-                break
-            self.gpio_service.set_strip_color(self._get_gpio("control"), i, (255, 0, 0))  # Red color
-            time.sleep(0.05)
-            self.gpio_service.set_strip_color(self._get_gpio("control"), i, (0, 0, 0))  # Turn off
-            time.sleep(0.05)
-        self.last_applied_color = None
\ No newline at end of file
+        """Start the configured animation (`animation` and `animation_options` env vars, red chaser by default)."""
+        effect = create_effect(
+            self.custom_vars.get('animation', 'chaser'),
+            self.custom_vars['num_leds'],
+            **self.custom_vars.get('animation_options', {}),
+        )
+        self.last_applied_color = None
+        self.animation.start(effect)
@@ -1,13 +1,77 @@
-from src.devices.garage import GarageDevice
-from src.devices.light import LightDevice
-from src.devices.motion import MotionDevice
-from src.devices.siren import SirenDevice
-from src.devices.strip import StripDevice
-
-DEVICE_CLASSES = {
-    "garage": GarageDevice,
-    "motion": MotionDevice,
-    "light": LightDevice,
-    "siren": SirenDevice,
-    "strip": StripDevice
+from collections.abc import MutableMapping
+from importlib import import_module
+
+# Device class name -> "module:class". Modules are only imported once a configured device needs them, so a node
+# without LED strips never loads numpy or rpi_ws281x
+DEVICE_MODULES = {
+    "garage": "src.devices.garage:GarageDevice",
+    "motion": "src.devices.motion:MotionDevice",
+    "light": "src.devices.light:LightDevice",
+    "siren": "src.devices.siren:SirenDevice",
+    "strip": "src.devices.strip:StripDevice",
 }
+
+# Installed distributions can add device classes under this entry point group
+ENTRY_POINT_GROUP = "ha_rpi_connector.devices"
+
+
+class DeviceClassRegistry(MutableMapping):
+    """Device classes by name, imported on first lookup."""
+
+    def __init__(self, modules: dict, group: str = None):
+        """
+        Initialize DeviceClassRegistry.
+        :param modules: Device class name -> "module:class".
+        :param group: Entry point group searched for names missing from `modules`, none if None.
+        """
+        self._modules = dict(modules)
+        self._group = group
+        self._entry_points = None
+        self._classes = {}
+
+    def __getitem__(self, name):
+        device_type = self._classes.get(name)
+        if device_type is None:
+            target = self._modules.get(name) or self._plugins().get(name)
+            if target is None:
+                raise KeyError(name)
+            module, _, attribute = target.partition(":")
+            device_type = self._classes[name] = getattr(import_module(module), attribute)
+        return device_type
+
+    def __setitem__(self, name, device_type):
+        self._classes[name] = device_type
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self._classes.pop(name, None)
+        self._modules.pop(name, None)
+        self._plugins().pop(name, None)
+
+    def __contains__(self, name):
+        # Without importing anything
+        return name in self._classes or name in self._modules or name in self._plugins()
+
+    def __iter__(self):
+        return iter(dict.fromkeys([*self._modules, *self._plugins(), *self._classes]))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def loaded(self) -> list:
+        """Names of the device classes imported so far."""
+        return list(self._classes)
+
+    def _plugins(self) -> dict:
+        if self._entry_points is None:
+            self._entry_points = {}
+            if self._group is not None:
+                # importlib.metadata scans every installed distribution: only done for names not built in
+                from importlib.metadata import entry_points
+                for entry_point in entry_points(group=self._group):
+                    self._entry_points.setdefault(entry_point.name, entry_point.value)
+        return self._entry_points
+
+
+DEVICE_CLASSES = DeviceClassRegistry(DEVICE_MODULES, ENTRY_POINT_GROUP)
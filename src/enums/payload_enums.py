@@ -0,0 +1,48 @@
+from enum import Enum
+
+# Commands and states of each device class. Values are the keys of the payloads in conf/payloads.yaml, the payloads
+# themselves are compiled into the class PayloadCodec.
+
+
+class GarageCommand(Enum):
+    OPEN = "open"
+    CLOSE = "close"
+
+
+class GarageState(Enum):
+    OPEN = "state_open"
+    OPENING = "state_opening"
+    CLOSED = "state_closed"
+    CLOSING = "state_closing"
+
+
+class LightCommand(Enum):
+    ON = "open"
+    OFF = "close"
+
+
+class LightState(Enum):
+    ON = "open"
+    OFF = "close"
+
+
+class MotionState(Enum):
+    DETECTED = "detected"
+    FREE = "free"
+
+
+class SirenCommand(Enum):
+    ON = "on"
+    OFF = "off"
+
+
+class StripCommand(Enum):
+    COLOR = "color"
+    ANIMATION = "garage_animation"
+    STOP = "stop"
+
+
+class StripState(Enum):
+    RUNNING = "running"
+    COLOR = "color"
+    STOPPED = "stopped"
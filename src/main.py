@@ -1,43 +1,163 @@
-from services.device_service import DeviceService
-from services.gpio_service import GPIOService
-from services.mqtt_service import MQTTService
-from utils.config import get_config
-from utils.logger import get_logger
-from utils.payload_loader import PayloadLoader
+import logging
+import signal
+
+from src.services.backoff import Backoff
+from src.services.command_dispatcher import CommandDispatcher
+from src.services.config_reloader import ConfigReloader
+from src.services.device_service import DeviceService
+from src.services.discovery_service import DiscoveryService
+from src.services.gpio_service import GPIOService
+from src.services.metrics import REGISTRY, MetricsServer, collect_process
+from src.services.mqtt_service import MQTTService
+from src.services.node_service import NodeService
+from src.services.outbound_spool import OutboundSpool
+from src.services.supervisor import Supervisor
+from src.services.timer_service import AsyncioTimerService, TimerService
+from src.services.tracing import Tracer
+from src.utils.config import get_config, node_name, owned_config
+from src.utils.logger import setup_logging
+from src.utils.payload_loader import PayloadLoader
 
 
 def main():
-    logger = get_logger("main")
-    config = get_config()
+    shared_config = get_config()
+    log_pipeline = setup_logging("main", shared_config.get("logging"))
+    logger = logging.getLogger("main")
+    # The device list may be shared by several nodes: only set up the devices assigned to this one
+    node = node_name(shared_config)
+    config = owned_config(shared_config, node)
+    logger.info(f"Running as node {node} with {len(config['devices'])} of {len(shared_config['devices'])} devices.")
     PayloadLoader.load_payloads()
-    gpio_service = GPIOService(devices=config["devices"], mock_gpio=config.get("mock_gpio", False))
-
-    try:
-        # Initialize MQTT Service
-        mqtt_service = MQTTService(
-            host=config["mqtt"]["host"],
-            port=config["mqtt"]["port"],
-            username=config["mqtt"]["username"],
-            password=config["mqtt"]["password"],
-            devices=[],
-            interval=10
-        )
+    use_asyncio = config.get("runtime", "threaded") == "asyncio"
+    supervisor = Supervisor(shutdown_timeout=config.get("shutdown_timeout", 5))
+    # Hooks run in reverse order: flush the logs once everything else has stopped
+    supervisor.add_shutdown_hook(log_pipeline.stop)
+    # One timer service for every delayed action (pulses, flashes, update delays, animation frames)
+    timers = AsyncioTimerService() if use_asyncio else TimerService()
+    supervisor.add_shutdown_hook(timers.stop)
+    gpio_service = GPIOService(devices=config["devices"], mock_gpio=config.get("mock_gpio", False), timers=timers)
+    supervisor.add_shutdown_hook(gpio_service.cleanup)
+
+    spool = None
+    spool_config = config["mqtt"].get("spool", {})
+    if spool_config.get("enabled", False):
+        spool = OutboundSpool(spool_config.get("path", "outbound.spool"),
+                              max_bytes=spool_config.get("max_bytes", 1048576),
+                              sync_interval=spool_config.get("sync_interval", 1.0), timers=timers)
+        # Registered before the MQTT service stops, so it runs after it and keeps the last offline messages
+        supervisor.add_shutdown_hook(spool.close)
+
+    reconnect = config["mqtt"].get("reconnect", {})
+    backoff = Backoff(initial=reconnect.get("initial", 0.5), maximum=reconnect.get("maximum", 30.0))
+
+    # One availability topic for the whole node, registered as its last will, unless every device keeps its own
+    availability = config["mqtt"].get("availability", {})
+    availability_topic = availability.get("topic", f"ha-rpi-connector/{node}/availability") \
+        if availability.get("bridge", True) else None
+
+    # Initialize MQTT Service
+    mqtt_service = MQTTService(
+        host=config["mqtt"]["host"],
+        port=config["mqtt"]["port"],
+        username=config["mqtt"]["username"],
+        password=config["mqtt"]["password"],
+        devices=[],
+        # Input edges are pushed as they happen, the periodic publish is only a consistency sweep
+        interval=config.get("status_interval", 60),
+        subscribe_wildcard=config["mqtt"].get("subscribe_wildcard", False),
+        timers=timers,
+        publish_policy=config["mqtt"].get("publish"),
+        max_inflight=config["mqtt"].get("max_inflight", 20),
+        max_queued=config["mqtt"].get("max_queued", 0),
+        client_id=node,
+        spool=spool,
+        backoff=backoff,
+        availability_topic=availability_topic,
+    )
+
+    tracing = config.get("tracing", {})
+    if tracing.get("enabled", False):
+        mqtt_service.tracer = Tracer(capacity=tracing.get("capacity", 256))
+        trace_path = tracing.get("path", "trace.json")
 
-        device_manager = DeviceService(config, gpio_service, mqtt_service)
+        def export_traces():
+            mqtt_service.tracer.export_chrome(trace_path)
+            logger.info(f"Exported {len(mqtt_service.tracer.traces())} command traces to {trace_path}")
 
-        mqtt_service.devices = device_manager.devices
+        # kill -USR1 <pid> dumps the ring buffer for chrome://tracing or Perfetto
+        supervisor.add_signal_handler(signal.SIGUSR1, export_traces)
 
+    device_manager = DeviceService(config, gpio_service, mqtt_service, availability_topic=availability_topic)
+
+    mqtt_service.devices = device_manager.devices
+
+    # kill -HUP <pid> applies device changes of conf/default.yaml without restarting
+    reloader = ConfigReloader(device_manager, timers, node=node,
+                              schedule_reload=lambda: supervisor.send_signal(signal.SIGHUP))
+    supervisor.add_signal_handler(signal.SIGHUP, reloader.reload)
+    if config.get("reload", {}).get("watch", 0) > 0:
+        reloader.watch(config["reload"]["watch"])
+        supervisor.add_shutdown_hook(reloader.stop)
+
+    node_service = NodeService(mqtt_service, node, device_manager.devices, timers,
+                               heartbeat=config.get("node", {}).get("heartbeat", 30))
+    node_service.start()
+    reloader.reload_hooks.append(lambda changes: node_service.announce())
+
+    discovery = config.get("discovery", {})
+    if discovery.get("enabled", False):
+        discovery_service = DiscoveryService(
+            mqtt_service,
+            device_manager.devices,
+            prefix=discovery.get("prefix", "homeassistant"),
+            node_id=discovery.get("node_id", node.replace(".", "_")),
+            cache_path=discovery.get("cache"),
+            verify_retained=discovery.get("verify_retained", True),
+        )
+        discovery_service.start()
+        reloader.reload_hooks.append(lambda changes: discovery_service.refresh())
+
+    if use_asyncio:
+        # asyncio is the largest import of the connector, only loaded when running on it
+        from src.services.async_runtime import AsyncRuntime
+        runtime = AsyncRuntime(mqtt_service, executor_workers=config.get("executor_workers", 2), timers=timers)
+        runtime.start()
+        supervisor.add_shutdown_hook(runtime.stop)
+    else:
+        commands = config.get("commands", {})
+        if commands.get("workers", 2) > 0:
+            dispatcher = CommandDispatcher(
+                workers=commands.get("workers", 2),
+                max_depth=commands.get("max_depth", 16),
+                overflow=commands.get("overflow", "drop_oldest"),
+            )
+            mqtt_service.dispatch = dispatcher.submit
+            mqtt_service.removal_hooks.append(dispatcher.forget)
+            REGISTRY.add_collector(dispatcher.collect_metrics)
+            supervisor.add_shutdown_hook(dispatcher.stop)
         mqtt_service.start()
+        supervisor.add_shutdown_hook(mqtt_service.stop)
+
+    # Registered after the MQTT service, so it runs before it and the offline announcement still goes out
+    supervisor.add_shutdown_hook(node_service.stop)
 
-        # Keep the program running
-        while True:
-            pass
+    metrics = config.get("metrics", {})
+    if metrics.get("enabled", False):
+        REGISTRY.add_collector(collect_process)
+        REGISTRY.add_collector(timers.collect_metrics)
+        REGISTRY.add_collector(mqtt_service.collect_metrics)
+        REGISTRY.add_collector(log_pipeline.collect_metrics)
+        REGISTRY.add_collector(node_service.collect_metrics)
+        if spool is not None:
+            REGISTRY.add_collector(spool.collect_metrics)
+        metrics_server = MetricsServer(REGISTRY, host=metrics.get("host", "127.0.0.1"), port=metrics.get("port", 9108))
+        metrics_server.start()
+        supervisor.add_shutdown_hook(metrics_server.stop)
 
-    except KeyboardInterrupt:
-        logger.info("Shutting down services.")
-        mqtt_service.stop()
-        gpio_service.cleanup()
+    # Block on signals until SIGTERM/SIGINT, then run the shutdown hooks
+    supervisor.run()
+    logger.info("Services stopped.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import paho.mqtt.client as mqtt
+
+from src.services.metrics import COMMAND_LATENCY
+from src.services.timer_service import AsyncioTimerService
+from src.services.tracing import execution
+
+logger = logging.getLogger("AsyncRuntime")
+
+
+class AsyncRuntime:
+    """
+    Run the connector on a single asyncio event loop instead of paho's network thread plus helper threads.
+
+    The paho client is driven through its socket hooks (the loop watches the socket and calls loop_read/loop_write),
+    commands run as device coroutines, periodic work uses `loop.call_later` and blocking GPIO calls go to a small
+    executor.
+    """
+
+    def __init__(self, mqtt_service, executor_workers: int = 2, latency_samples: int = 1000,
+                 timers: AsyncioTimerService = None):
+        """
+        Initialize AsyncRuntime.
+        :param mqtt_service: The MQTT service to drive. Its backoff spaces the connection attempts.
+        :param executor_workers: Number of threads running blocking GPIO calls.
+        :param latency_samples: Number of recent command latencies kept for latency_stats().
+        :param timers: Timer service to run on the event loop, shared with the other services.
+        """
+        self.mqtt_service = mqtt_service
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="gpio")
+        self.command_latencies = deque(maxlen=latency_samples)
+        self.timers = timers
+        self.loop = None
+        self.thread = None
+        self._loop_thread_id = None
+        self._stop = None
+        self._ready = threading.Event()
+        self._status_handle = None
+        self._tasks = set()
+
+    def start(self):
+        """Run the event loop in a background thread."""
+        self.thread = threading.Thread(target=asyncio.run, args=(self.run(),), name="asyncio-runtime")
+        self.thread.start()
+        self._ready.wait()
+
+    def stop(self, timeout: float = 5.0):
+        """Ask the event loop to shut down and wait for it."""
+        if self.loop is not None and self._stop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stop.set)
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def call_later(self, delay: float, callback, *args) -> asyncio.TimerHandle:
+        """Schedule `callback(*args)` on the event loop. Must be called from the loop thread."""
+        return self.loop.call_later(delay, callback, *args)
+
+    def latency_stats(self) -> dict:
+        """Command latency (receipt to handler completion) over the recent commands, in milliseconds."""
+        samples = sorted(self.command_latencies)
+        if not samples:
+            return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": len(samples),
+            "p50_ms": statistics.median(samples) * 1000,
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+            "max_ms": samples[-1] * 1000,
+        }
+
+    async def run(self):
+        """Connect, serve commands until stop() is called, then shut down cleanly."""
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop = asyncio.Event()
+        if self.timers is not None:
+            self.timers.attach(self.loop)
+        self._attach()
+        self._ready.set()
+        service = self.mqtt_service
+        misc = None
+        try:
+            service.publish_availability("online")
+            misc = asyncio.create_task(self._misc_loop())
+            if service.interval > 0:
+                self._status_handle = self.loop.call_soon(self._status_tick)
+            await self._stop.wait()
+        finally:
+            if self._status_handle is not None:
+                self._status_handle.cancel()
+            if self._tasks:
+                await asyncio.wait(self._tasks, timeout=5)
+            if misc is not None:
+                misc.cancel()
+            client = service.client
+            info = service.publish_availability("offline")
+            if info is not None and info.rc == mqtt.MQTT_ERR_SUCCESS:
+                # A clean disconnection discards the will: the offline state must reach the broker first
+                await self._flush(info.is_published, timeout=1)
+            client.disconnect()
+            await self._flush(lambda: client.socket() is None, timeout=1)
+            self.executor.shutdown(wait=False)
+            logger.info("Asyncio runtime stopped.")
+
+    async def _flush(self, done, timeout: float):
+        """
+        Service the client's socket until `done()` is true or `timeout` elapses. Nothing drives the client once
+        run() returns, so the packets queued on shutdown are written here.
+        :param done: Callable telling whether the awaited packets have been handled.
+        :param timeout: Maximum time to wait, in seconds.
+        """
+        client = self.mqtt_service.client
+        deadline = self.loop.time() + timeout
+        while not done() and self.loop.time() < deadline:
+            client.loop_write()
+            client.loop_misc()
+            await asyncio.sleep(0.01)
+
+    def _attach(self):
+        client = self.mqtt_service.client
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        self.mqtt_service.dispatch = self._dispatch
+
+    async def _connect(self, connect):
+        """Connect with `connect` (client.connect or client.reconnect), retrying with backoff until it succeeds."""
+        service = self.mqtt_service
+        while True:
+            try:
+                # The TCP connect blocks, keep it off the loop
+                await self.loop.run_in_executor(self.executor, connect)
+                return
+            except OSError as e:
+                delay = service.backoff.next_delay()
+                logger.warning(f"Connection to MQTT broker failed, retrying in {delay:.1f} s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _misc_loop(self):
+        """Connection, keepalive handling and reconnection, which paho's own thread would otherwise do."""
+        service = self.mqtt_service
+        client = service.client
+        service.connecting()
+        await self._connect(lambda: client.connect(service.host, service.port))
+        while True:
+            await asyncio.sleep(1)
+            if client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                continue
+            await asyncio.sleep(service.backoff.next_delay())
+            await self._connect(client.reconnect)
+
+    def _dispatch(self, device, command: str, trace=None):
+        """MQTTService dispatch hook: called from on_message, on the loop thread."""
+        task = self.loop.create_task(self._run_command(device, command, time.perf_counter(), trace))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_command(self, device, command: str, received_at: float, trace=None):
+        try:
+            with execution(trace):
+                await device.handle_command_async(command, self.executor)
+        except Exception:
+            logger.exception(f"Command '{command}' failed for {device.device_class} {device.device_id}")
+        finally:
+            latency = time.perf_counter() - received_at
+            self.command_latencies.append(latency)
+            COMMAND_LATENCY.labels(device.device_class).observe(latency)
+
+    def _status_tick(self):
+        self.loop.run_in_executor(self.executor, self.mqtt_service.publish_status)
+        self._status_handle = self.loop.call_later(self.mqtt_service.interval, self._status_tick)
+
+    def _in_loop(self, callback, *args):
+        """Socket hooks may fire from executor threads (connect, publish); the loop is not thread-safe."""
+        if threading.get_ident() == self._loop_thread_id:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._in_loop(self.loop.add_reader, sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._in_loop(self.loop.remove_reader, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._in_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._in_loop(self.loop.remove_writer, sock)
@@ -0,0 +1,35 @@
+import random
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter between connection attempts. The delay doubles from `initial` up to `maximum`,
+    each one drawn between half and all of it, so nodes restarted together by a power cut do not retry in lockstep.
+    """
+
+    def __init__(self, initial: float = 0.5, maximum: float = 30.0, multiplier: float = 2.0, rng=random.random):
+        """
+        Initialize Backoff.
+        :param initial: Delay (seconds) before the first retry.
+        :param maximum: Upper bound of the delays.
+        :param multiplier: Growth of the delay after each failed attempt.
+        :param rng: Source of floats in [0, 1), for tests.
+        """
+        if initial <= 0 or maximum < initial or multiplier < 1:
+            raise ValueError(f"Invalid backoff: initial {initial}, maximum {maximum}, multiplier {multiplier}")
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.rng = rng
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        """Delay before the next attempt, counting this one as failed."""
+        ceiling = min(self.maximum, self.initial * self.multiplier ** self.attempts)
+        if ceiling < self.maximum:
+            self.attempts += 1
+        return ceiling / 2 + self.rng() * ceiling / 2
+
+    def reset(self):
+        """Called once connected: the next failure retries after `initial` again."""
+        self.attempts = 0
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List
+
+from src.services.metrics import COMMAND_LATENCY
+from src.services.tracing import execution
+
+logger = logging.getLogger("CommandDispatcher")
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST)
+
+
+class Mailbox:
+    """Pending commands of one device."""
+
+    __slots__ = ("device", "queue", "scheduled", "processed", "coalesced", "dropped")
+
+    def __init__(self, device):
+        self.device = device
+        # (coalesce key, command, submitted at, trace) entries, oldest first
+        self.queue: Deque[tuple] = deque()
+        # True while the mailbox is waiting for a worker or being served by one
+        self.scheduled = False
+        self.processed = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+
+class CommandDispatcher:
+    """
+    Execute device commands on a worker pool, through one mailbox per device.
+
+    Commands of a device run one at a time and in order, while different devices run in parallel. A command
+    whose `coalesce_key` matches a queued one supersedes it, so a burst of ON/OFF toggles only applies the last
+    state. Mailboxes are bounded; when full, `overflow` decides whether the oldest or the newest command is
+    dropped.
+    """
+
+    def __init__(self, workers: int = 2, max_depth: int = 16, overflow: str = DROP_OLDEST):
+        """
+        Initialize CommandDispatcher.
+        :param workers: Number of worker threads.
+        :param max_depth: Maximum number of queued commands per device.
+        :param overflow: Either "drop_oldest" or "drop_newest".
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported overflow policy: {overflow}")
+        self.max_depth = max_depth
+        self.overflow = overflow
+        self._mailboxes: Dict[object, Mailbox] = {}
+        self._ready: Deque[Mailbox] = deque()
+        self._condition = threading.Condition()
+        self._running = 0
+        self._stopped = False
+        self._workers: List[threading.Thread] = [
+            threading.Thread(target=self._work, name=f"command-worker-{i}", daemon=True) for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, device, command: str, trace=None):
+        """Queue a command for a device. Suitable as MQTTService.dispatch."""
+        key = device.coalesce_key(command)
+        with self._condition:
+            if self._stopped:
+                logger.warning("Dispatcher stopped, dropping command '%s' for %s", command, device.identifier())
+                _finish(trace, "dropped")
+                return
+            mailbox = self._mailboxes.get(device)
+            if mailbox is None:
+                mailbox = self._mailboxes[device] = Mailbox(device)
+            superseded = self._remove_superseded(mailbox, key) if key is not None else None
+            if superseded is not None:
+                mailbox.coalesced += 1
+                _finish(superseded[3], "coalesced")
+            elif len(mailbox.queue) >= self.max_depth:
+                mailbox.dropped += 1
+                if self.overflow == DROP_NEWEST:
+                    logger.warning("Mailbox of %s full, dropping command '%s'", device.identifier(), command)
+                    _finish(trace, "dropped")
+                    return
+                dropped = mailbox.queue.popleft()
+                logger.warning("Mailbox of %s full, dropping command '%s'", device.identifier(), dropped[1])
+                _finish(dropped[3], "dropped")
+            mailbox.queue.append((key, command, time.perf_counter(), trace))
+            if not mailbox.scheduled:
+                mailbox.scheduled = True
+                self._ready.append(mailbox)
+                self._condition.notify()
+
+    def forget(self, device):
+        """
+        Drop the mailbox of a device that was removed or replaced, with its queued commands: they would run against
+        a closed device. A command already running completes. Suitable as an MQTTService removal hook.
+        """
+        with self._condition:
+            mailbox = self._mailboxes.pop(device, None)
+            if mailbox is None:
+                return
+            if mailbox in self._ready:
+                self._ready.remove(mailbox)
+                mailbox.scheduled = False
+            if mailbox.queue:
+                logger.info("Dropping %d queued commands of %s", len(mailbox.queue), device.identifier())
+            while mailbox.queue:
+                _finish(mailbox.queue.popleft()[3], "dropped")
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, dict]:
+        """Queue depth and processed/coalesced/dropped counts per device identifier."""
+        with self._condition:
+            return {
+                mailbox.device.identifier(): {
+                    "depth": len(mailbox.queue),
+                    "processed": mailbox.processed,
+                    "coalesced": mailbox.coalesced,
+                    "dropped": mailbox.dropped,
+                }
+                for mailbox in self._mailboxes.values()
+            }
+
+    def collect_metrics(self):
+        """Metrics collector, see MetricsRegistry.add_collector."""
+        for identifier, stats in self.stats().items():
+            labels = {"device": identifier}
+            yield "connector_mailbox_depth", "gauge", "Commands queued per device.", labels, stats["depth"]
+            for counter in ("processed", "coalesced", "dropped"):
+                yield f"connector_commands_{counter}_total", "counter", f"Commands {counter} per device.", labels, \
+                    stats[counter]
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until every queued command has been executed. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._ready and not self._running, timeout)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop accepting commands, let the workers finish the queued ones and join them."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    @staticmethod
+    def _remove_superseded(mailbox: Mailbox, key):
+        """Remove and return the queued entry with the same coalesce key, if any."""
+        for entry in mailbox.queue:
+            if entry[0] == key:
+                # The new command is appended at the end, so it keeps its order relative to the other commands
+                mailbox.queue.remove(entry)
+                return entry
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._ready:
+                    if self._stopped:
+                        return
+                    self._condition.wait()
+                mailbox = self._ready.popleft()
+                _, command, submitted_at, trace = mailbox.queue.popleft()
+                self._running += 1
+            try:
+                with execution(trace):
+                    mailbox.device.handle_command(command)
+            except Exception:
+                logger.exception(f"Command '{command}' failed for {mailbox.device.identifier()}")
+            COMMAND_LATENCY.labels(mailbox.device.device_class).observe(time.perf_counter() - submitted_at)
+            with self._condition:
+                self._running -= 1
+                mailbox.processed += 1
+                if mailbox.queue:
+                    # Back of the line, so a busy device cannot starve the others
+                    self._ready.append(mailbox)
+                else:
+                    mailbox.scheduled = False
+                self._condition.notify_all()
+
+
+def _finish(trace, status: str):
+    if trace is not None:
+        trace.finish(status)
@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+from collections.abc import Callable
+from typing import List
+
+from src.services.device_service import DeviceService
+from src.services.timer_service import TimerService
+from src.utils.config import DEFAULT_PATH, changed_sections, get_config, owned_config
+
+logger = logging.getLogger("ConfigReloader")
+
+
+class ConfigReloader:
+    """
+    Apply changes of the configuration file without a restart, on demand (SIGHUP) or when the file changes.
+    Devices are reconfigured by DeviceService.reload; other sections need a restart and are only reported.
+    """
+
+    def __init__(self, device_service: DeviceService, timers: TimerService, path=DEFAULT_PATH, cache_path=None,
+                 node: str = None, schedule_reload: Callable[[], None] = None):
+        """
+        Initialize ConfigReloader.
+        :param device_service: Devices to reconfigure, holding the configuration currently applied.
+        :param timers: Timer service polling the file when watching it.
+        :param path: Configuration file.
+        :param cache_path: Compiled configuration cache, see get_config.
+        :param node: Only apply the devices of this node, see owned_config. All devices if None.
+        :param schedule_reload: Called when the watched file changed to run reload() off the timer thread, e.g. on
+                                the supervisor loop. Every reload runs on a thread of its own if None.
+        """
+        self.device_service = device_service
+        self.timers = timers
+        self.path = path
+        self.cache_path = cache_path
+        self.node = node
+        self.schedule_reload = schedule_reload
+        # Called with the changes returned by DeviceService.reload after every reload that changed devices
+        self.reload_hooks: List[Callable[[dict], None]] = []
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._watch_timer = None
+        self._mtime = self._stat()
+
+    def reload(self) -> bool:
+        """Load the configuration file again and apply it. An invalid file is reported and ignored."""
+        with self._lock:
+            self._mtime = self._stat()
+            try:
+                config = get_config(self.path, self.cache_path)
+                if self.node is not None:
+                    config = owned_config(config, self.node)
+            except Exception as e:
+                logger.error(f"Configuration not reloaded, {self.path} is invalid: {e}")
+                return False
+            restart = changed_sections(self.device_service.config, config)
+            if restart:
+                logger.warning(f"Configuration sections {restart} changed, restart to apply them.")
+            try:
+                changes = self.device_service.reload(config)
+            except Exception:
+                logger.exception("Failed to apply the reloaded configuration.")
+                return False
+            self.reloads += 1
+        if any(changes.values()):
+            for hook in self.reload_hooks:
+                try:
+                    hook(changes)
+                except Exception:
+                    logger.exception(f"Reload hook {hook!r} failed.")
+        return True
+
+    def watch(self, interval: float):
+        """Reload whenever the file modification time changes, checking every `interval` seconds."""
+        self._watch_timer = self.timers.call_later(interval, self._check, interval)
+
+    def stop(self):
+        if self._watch_timer is not None:
+            self._watch_timer.cancel()
+            self._watch_timer = None
+
+    def _check(self, interval: float):
+        mtime = self._stat()
+        if mtime != self._mtime:
+            logger.info(f"{self.path} changed, reloading the configuration.")
+            # Stopping and rebuilding devices blocks, which timer callbacks must not do
+            self._mtime = mtime
+            if self.schedule_reload is not None:
+                self.schedule_reload()
+            else:
+                threading.Thread(target=self.reload, name="config-reload", daemon=True).start()
+        if self._watch_timer is not None:
+            self._watch_timer = self.timers.call_later(interval, self._check, interval)
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
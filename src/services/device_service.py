@@ -1,4 +1,9 @@
+import logging
+
 from src.enums.device_class import DEVICE_CLASSES
+from src.utils.config import device_key, diff_devices
+
+logger = logging.getLogger("DeviceService")
 
 
 class DeviceService:
@@ -6,7 +11,7 @@ class DeviceService:
     Manages the initialization and interactions of all devices based on the configuration.
     """
 
-    def __init__(self, config, gpio_service, mqtt_service):
+    def __init__(self, config, gpio_service, mqtt_service, availability_topic=None):
         """
         Initializes the device manager.
 
@@ -14,29 +19,132 @@ class DeviceService:
             config (dict): Configuration for all devices.
             gpio_service (GPIOService): The GPIO service instance for hardware control.
             mqtt_service (MQTTService): The MQTT service instance for message routing.
+            availability_topic (str): Availability topic of the whole connector, used by the devices without an
+                availability topic of their own. None if every device has its own.
         """
         self.devices = []
+        self.config = config
         self.gpio_service = gpio_service
         self.mqtt_service = mqtt_service
+        self.availability_topic = availability_topic
 
         # Initialize devices based on configuration
         for device_config in config["devices"]:
-            device_class = device_config["class"]
-            device_id = device_config["id"]
-            custom_vars = device_config.get("env", [])
-
-            # Look up the corresponding device class
-            device_type = DEVICE_CLASSES.get(device_class)
-            if device_type:
-                # Instantiate the device
-                device = device_type(
-                    device_id=device_id,
-                    device_class=device_class,
-                    gpio_service=gpio_service,
-                    mqtt_service=mqtt_service,
-                    on_state_change=mqtt_service.handle_device_state_change,
-                    custom_vars=custom_vars,
-                )
-                self.devices.append(device)
-            else:
-                raise ValueError(f"Unsupported device class: {device_class}")
\ No newline at end of file
+            self.devices.append(self.create_device(device_config))
+
+    def create_device(self, device_config):
+        device_class = device_config["class"]
+        device_id = device_config["id"]
+        custom_vars = device_config.get("env", {})
+
+        # Look up the corresponding device class
+        device_type = DEVICE_CLASSES.get(device_class)
+        if device_type is None:
+            raise ValueError(f"Unsupported device class: {device_class}")
+        # Instantiate the device
+        device = device_type(
+            device_id=device_id,
+            device_class=device_class,
+            gpio_service=self.gpio_service,
+            mqtt_service=self.mqtt_service,
+            on_state_change=self.mqtt_service.handle_device_state_change,
+            custom_vars=custom_vars,
+        )
+        if self.availability_topic is not None:
+            device.bridge_availability_topic = self.availability_topic
+            if device_config.get("availability", "bridge") == "bridge":
+                device.topics["availability"] = self.availability_topic
+        return device
+
+    def check_device(self, device_config):
+        """Raise ValueError if the device cannot be built: unsupported class or missing required pin."""
+        device_type = DEVICE_CLASSES.get(device_config["class"])
+        if device_type is None:
+            raise ValueError(f"Unsupported device class: {device_config['class']}")
+        names = {gpio["name"] for gpio in device_config["gpio"]}
+        for pin_name in device_type.required_pins:
+            if pin_name not in names:
+                raise ValueError(f"Pin '{pin_name}' not found for device {device_config['id']}.")
+
+    def reload(self, config) -> dict:
+        """
+        Apply a new configuration, rebuilding only the devices whose configuration changed. Unchanged devices keep
+        their state and pins, and the MQTT session is kept: only the command topics of added and removed devices
+        are (un)subscribed. `self.devices` is updated in place. Returns the keys (class, id) of the devices added,
+        removed and changed.
+
+        The new devices are checked before anything is torn down. If building one fails anyway, the previous
+        configuration is restored and the error raised.
+        """
+        added, removed, changed = diff_devices(self.config, config)
+        new_configs = {device_key(device_config): device_config for device_config in config["devices"]}
+        for key in added + changed:
+            self.check_device(new_configs[key])
+        previous = {(device.device_class, device.device_id): device for device in self.devices}
+        # Devices registered to the MQTT service, as the reload goes
+        registered = dict(previous)
+
+        try:
+            # Devices first let go of their pins, then the pins are switched to the new configuration
+            gone = [previous[key] for key in removed]
+            for device in gone:
+                self.mqtt_service.remove_device(device)
+                del registered[device.device_class, device.device_id]
+                device.close()
+            for key in changed:
+                previous[key].close()
+            if gone:
+                self.mqtt_service.publish_availability("offline", gone)
+            self.gpio_service.reconfigure(config["devices"])
+
+            for key in changed:
+                device = self.create_device(new_configs[key])
+                self.mqtt_service.replace_device(registered[key], device)
+                registered[key] = device
+            created = []
+            for key in added:
+                device = self.create_device(new_configs[key])
+                self.mqtt_service.add_device(device)
+                registered[key] = device
+                created.append(device)
+        except Exception:
+            logger.error("Failed to apply the new devices, restoring the previous ones.")
+            self._restore(previous, registered, set(removed + changed))
+            raise
+        if created:
+            self.mqtt_service.publish_availability("online", created)
+
+        self.devices[:] = [registered[key] for key in new_configs]
+        self.config = config
+        logger.info(f"Devices reloaded: {len(added)} added, {len(removed)} removed, {len(changed)} changed.")
+        return {"added": added, "removed": removed, "changed": changed}
+
+    def _restore(self, previous: dict, registered: dict, closed: set):
+        """
+        Go back to the devices of `self.config` after a failed reload.
+        :param previous: Devices before the reload, by key.
+        :param registered: Devices registered to the MQTT service when the reload failed, by key.
+        :param closed: Keys of the previous devices closed by the reload, rebuilt from their configuration.
+        """
+        for key, device in registered.items():
+            if device is not previous.get(key):
+                device.close()
+        self.gpio_service.reconfigure(self.config["devices"])
+        old_configs = {device_key(device_config): device_config for device_config in self.config["devices"]}
+        restored = []
+        for key, device in previous.items():
+            if key in closed:
+                device = self.create_device(old_configs[key])
+            current = registered.pop(key, None)
+            if current is None:
+                self.mqtt_service.add_device(device)
+                restored.append(device)
+            elif current is not device:
+                self.mqtt_service.replace_device(current, device)
+            previous[key] = device
+        for device in registered.values():
+            # Added by the failed reload
+            self.mqtt_service.remove_device(device)
+        if restored:
+            self.mqtt_service.publish_availability("online", restored)
+        self.devices[:] = list(previous.values())
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import Dict
+
+from src.services.mqtt_service import DISCOVERY, MQTTService
+
+logger = logging.getLogger("DiscoveryService")
+
+
+def digest(payload) -> str:
+    """Content hash of a discovery payload, as published (str) or as received (bytes)."""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class DiscoveryService:
+    """
+    Publish Home Assistant MQTT discovery configs for the devices, so they do not have to be declared in HA too.
+
+    Every config is serialized canonically and hashed. On each connection the retained configs of this node are
+    read back from the broker, then only the configs whose hash differs are published, and the retained configs of
+    devices that no longer exist are cleared. The hashes are also kept in a local cache file: the sync starts as
+    soon as the broker has returned every cached config unchanged instead of waiting `settle` seconds, and the
+    cache is trusted on its own when `verify_retained` is False. The retained configs are subscribed along with the
+    command topics, in the single SUBSCRIBE of each connection, and ignored once the sync is done.
+    """
+
+    def __init__(self, mqtt_service: MQTTService, devices: list, prefix: str = "homeassistant", node_id: str = None,
+                 cache_path: str = None, settle: float = 1.0, verify_retained: bool = True):
+        """
+        Initialize DiscoveryService.
+        :param mqtt_service: The MQTT service publishing the configs.
+        :param devices: List of device instances.
+        :param prefix: Home Assistant discovery prefix.
+        :param node_id: Identifier of this connector in the discovery topics, the host name if None.
+        :param cache_path: File keeping the hashes of the published configs, conf/discovery_cache.json if None.
+        :param settle: Maximum time (seconds) to wait for the retained configs after connecting.
+        :param verify_retained: If False, skip reading the retained configs back and only trust the local cache.
+        """
+        self.mqtt_service = mqtt_service
+        self.devices = devices
+        self.prefix = prefix
+        self.node_id = node_id or socket.gethostname().replace(".", "_")
+        self.cache_path = Path(cache_path) if cache_path else Path(os.getcwd(), "conf", "discovery_cache.json")
+        self.settle = settle
+        self.verify_retained = verify_retained
+        self.wildcard = f"{self.prefix}/+/{self.node_id}/+/config"
+        self._lock = threading.Lock()
+        self._retained: Dict[str, str] = {}
+        # Cached configs not yet seen retained on the broker since the connection
+        self._awaiting = set()
+        self._sync_timer = None
+        # Whether the retained configs are being read back
+        self._collecting = False
+        self._configs = None
+        self.cache = self._load_cache()
+
+    def start(self):
+        """Sync the configs on every connection to the broker."""
+        self.mqtt_service.client.message_callback_add(self.wildcard, self.on_retained)
+        if self.verify_retained:
+            self.mqtt_service.subscriptions.append(self.wildcard)
+        self.mqtt_service.connect_hooks.append(self.on_connect)
+
+    def configs(self) -> Dict[str, str]:
+        """Serialized discovery config per discovery topic, built once."""
+        if self._configs is None:
+            configs = {}
+            for device in self.devices:
+                if device.discovery_component is None:
+                    continue
+                topic = f"{self.prefix}/{device.discovery_component}/{self.node_id}/{device.identifier()}/config"
+                # Canonical form, so the hash only changes when the content does
+                configs[topic] = json.dumps(device.discovery_config(self.node_id), sort_keys=True,
+                                            separators=(",", ":"))
+            self._configs = configs
+        return self._configs
+
+    def on_connect(self):
+        if not self.verify_retained:
+            self.sync()
+            return
+        with self._lock:
+            self._retained = {}
+            self._awaiting = set(self.cache)
+            self._collecting = True
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+            self._sync_timer = self.mqtt_service.timers.call_later(self.settle, self.sync)
+
+    def on_retained(self, client, userdata, msg):
+        """Record the configs the broker retains for this node."""
+        if not msg.retain:
+            return
+        with self._lock:
+            if not self._collecting:
+                return
+            # An empty retained payload is a deleted config
+            if msg.payload:
+                self._retained[msg.topic] = digest(msg.payload)
+            else:
+                self._retained.pop(msg.topic, None)
+            if self._retained.get(msg.topic) == self.cache.get(msg.topic):
+                self._awaiting.discard(msg.topic)
+            if not self._awaiting and self.cache and self._sync_timer is not None:
+                # The broker holds everything the cache knows about, no need to wait any longer
+                self._sync_timer.cancel()
+                self._sync_timer = self.mqtt_service.timers.call_later(0, self.sync)
+
+    def sync(self) -> int:
+        """Publish the configs that changed and clear the removed ones. Returns the number of messages sent."""
+        configs = self.configs()
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            known = dict(self._retained) if self.verify_retained else dict(self.cache)
+            self._collecting = False
+        return self._publish(configs, known)
+
+    def refresh(self) -> int:
+        """
+        Rebuild the configs after devices were added, removed or changed, and publish the differences with the
+        last synced ones. Returns the number of messages sent.
+        """
+        with self._lock:
+            self._configs = None
+            known = dict(self.cache)
+        return self._publish(self.configs(), known)
+
+    def _publish(self, configs: Dict[str, str], known: Dict[str, str]) -> int:
+        sent = 0
+        hashes = {}
+        for topic, payload in configs.items():
+            hashes[topic] = digest(payload)
+            if known.get(topic) != hashes[topic]:
+                self.mqtt_service.publish(topic, payload, kind=DISCOVERY)
+                sent += 1
+        for topic in set(known) - set(configs):
+            self.mqtt_service.publish(topic, "", kind=DISCOVERY)
+            sent += 1
+
+        logger.info(f"Discovery synced: {sent} of {len(configs)} configs published or cleared.")
+        if hashes != self.cache:
+            self.cache = hashes
+            self._save_cache()
+        return sent
+
+    def _load_cache(self) -> Dict[str, str]:
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable discovery cache {self.cache_path}: {e}")
+            return {}
+
+    def _save_cache(self):
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.cache, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to write discovery cache {self.cache_path}: {e}")
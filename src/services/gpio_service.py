@@ -1,90 +1,289 @@
 import logging
 import time
-from typing import Dict, List, Tuple
+from array import array
+from collections.abc import Callable
+from typing import Dict, List, Sequence, Tuple, Union
 
 from src.enums.gpio_enums import GPIOType, GPIOState
+from src.services.metrics import REGISTRY
+from src.services.pulse_scheduler import PulseScheduler
+from src.services.timer_service import TimerService
+from src.services.tracing import span
 
-try:
-    import RPi.GPIO as GPIO
-except ImportError:
-    # Fallback for environments without GPIO
-    GPIO = None
-try:
-    from rpi_ws281x import PixelStrip, Color
-except ImportError:
-    # Fallback for environments without GPIO
-    PixelStrip = None
-    Color = None
+# Hardware libraries, imported on first use so that mocked setups never load them, and rpi_ws281x only on nodes
+# driving an LED strip
+GPIO = None
+PixelStrip = None
 
 logger = logging.getLogger("GPIOService")
 
+DEFAULT_DEBOUNCE_MS = 50
+
+GPIO_DURATION = REGISTRY.histogram("connector_gpio_operation_seconds", "Duration of GPIO operations.",
+                                   labels=("operation",))
+_READ_DURATION = GPIO_DURATION.labels("read")
+_WRITE_DURATION = GPIO_DURATION.labels("write")
+_SHOW_DURATION = GPIO_DURATION.labels("strip_show")
+
+
+def _import_gpio():
+    global GPIO
+    if GPIO is None:
+        try:
+            import RPi.GPIO as gpio_module
+        except ImportError:
+            # Fallback for environments without GPIO
+            return None
+        GPIO = gpio_module
+    return GPIO
+
+
+def _import_pixel_strip():
+    global PixelStrip
+    if PixelStrip is None:
+        from rpi_ws281x import PixelStrip as pixel_strip
+        PixelStrip = pixel_strip
+    return PixelStrip
+
 
 class GPIOService:
     """Service to manage GPIO operations."""
 
-    def __init__(self, devices: List[Dict], mock_gpio: bool = False):
+    def __init__(self, devices: List[Dict], mock_gpio: bool = False, timers: TimerService = None):
         """
         Initialize GPIOService.
         :param devices: List of device configurations.
         :param mock_gpio: If True, GPIO operations are mocked.
+        :param timers: Timer service shared with the devices for delayed work. A private one is created if None.
         """
         self.devices = devices
         self.mock_gpio = mock_gpio
         self.objects = {}
+        # Strip frame buffers: one packed 0xRRGGBB value per LED, pushed to the strip by show_strip()
+        self.frames: Dict[int, array] = {}
+        self.show_counts: Dict[int, int] = {}
+        self.mock_levels: Dict[int, int] = {}
+        self._debounce_ms: Dict[int, int] = {}
+        self._edge_callbacks: Dict[int, List[Callable[[int, int], None]]] = {}
+        self._last_edge: Dict[int, float] = {}
+        self.timers = timers if timers is not None else TimerService()
+        self.pulses = PulseScheduler(self._write_level, self.timers)
 
-        if not self.mock_gpio and GPIO:
+        if not self.mock_gpio and _import_gpio():
             GPIO.setmode(GPIO.BCM)
         for device in devices:
             for gpio in device["gpio"]:
-                logger.debug(f"Configuring pin {gpio['gpio']} as {gpio['type']} for device ID {device['id']}")
-                if not self.mock_gpio and GPIO:
-                    mode = GPIO.IN if gpio["type"] == GPIOType.INPUT else GPIO.OUT
-                    GPIO.setup(gpio["gpio"], mode)
-                    if "default" in gpio:
-                        default_state = GPIO.HIGH if gpio["default"] == GPIOState.HIGH else GPIO.LOW
-                        GPIO.output(gpio["gpio"], default_state)
+                self._setup_pin(device, gpio)
+
+    def _setup_pin(self, device, gpio):
+        logger.debug(f"Configuring pin {gpio['gpio']} as {gpio['type']} for device ID {device['id']}")
+        self._debounce_ms[gpio["gpio"]] = gpio.get("debounce", DEFAULT_DEBOUNCE_MS)
+        if not self.mock_gpio and GPIO:
+            mode = GPIO.IN if gpio["type"] == GPIOType.INPUT else GPIO.OUT
+            GPIO.setup(gpio["gpio"], mode)
+            if "default" in gpio:
+                default_state = GPIO.HIGH if gpio["default"] == GPIOState.HIGH else GPIO.LOW
+                GPIO.output(gpio["gpio"], default_state)
+
+    def reconfigure(self, devices: List[Dict]) -> Tuple[List[int], List[int]]:
+        """
+        Switch to a new device configuration, touching only the pins whose configuration changed: pins that are
+        gone or changed are released, new or changed ones are set up. Unchanged pins keep their level, watchers
+        and strips. Returns the released and the set up pins.
+        """
+        def pin_table(configs):
+            return {gpio["gpio"]: (device["class"], device["id"], gpio) for device in configs
+                    for gpio in device["gpio"]}
+
+        old_pins, new_pins = pin_table(self.devices), pin_table(devices)
+        released = [pin for pin in old_pins if new_pins.get(pin) != old_pins[pin]]
+        configured = [pin for pin in new_pins if old_pins.get(pin) != new_pins[pin]]
+        for pin in released:
+            self.release_pin(pin)
+        owners = {(device["class"], device["id"]): device for device in devices}
+        for pin in configured:
+            device_class, device_id, gpio = new_pins[pin]
+            self._setup_pin(owners[device_class, device_id], gpio)
+        self.devices = devices
+        return released, configured
+
+    def release_pin(self, gpio: int):
+        """Stop watching a pin, drop its strip and return it to its power-on state."""
+        logger.debug("Releasing GPIO pin %s", gpio)
+        watched = self._edge_callbacks.pop(gpio, None)
+        self._last_edge.pop(gpio, None)
+        self._debounce_ms.pop(gpio, None)
+        self.mock_levels.pop(gpio, None)
+        self.frames.pop(gpio, None)
+        self.show_counts.pop(gpio, None)
+        self.objects.pop(gpio, None)
+        if not self.mock_gpio and GPIO:
+            if watched:
+                GPIO.remove_event_detect(gpio)
+            GPIO.cleanup(gpio)
 
     def read_pin(self, gpio: int) -> int:
         """Read the status of a GPIO pin."""
-        if self.mock_gpio:
-            logger.debug(f"Mock read GPIO pin {gpio}")
-            return 0  # Return default mock value
-        return GPIO.input(gpio)
+        start = time.perf_counter()
+        with span("gpio.read", pin=gpio):
+            if self.mock_gpio:
+                logger.debug("Mock read GPIO pin %s", gpio)
+                level = self.mock_levels.get(gpio, 0)  # Default mock value is 0
+            else:
+                level = GPIO.input(gpio)
+        _READ_DURATION.observe(time.perf_counter() - start)
+        return level
 
     def write_pin(self, gpio: int, state: str):
         """Write a state (HIGH/LOW) to a GPIO pin."""
-        if self.mock_gpio:
-            logger.debug(f"Mock write GPIO pin {gpio} to {state}")
-            return
-        GPIO.output(gpio, GPIO.HIGH if state == "high" else GPIO.LOW)
+        with span("gpio.write", pin=gpio):
+            if self.mock_gpio:
+                logger.debug("Mock write GPIO pin %s to %s", gpio, state)
+            self._write_level(gpio, state == "high")
 
     def toggle_pin(self, gpio: int, duration: float = 0.5):
-        """Toggle a GPIO pin (HIGH -> LOW -> HIGH)."""
+        """
+        Toggle a GPIO pin (HIGH -> LOW -> HIGH) without blocking the caller.
+        The restore edge is driven by the pulse scheduler; pulses on the same pin are played one after the other.
+        """
         if self.mock_gpio:
-            logger.debug(f"Mock toggle GPIO pin {gpio}")
+            logger.debug("Mock toggle GPIO pin %s", gpio)
+        with span("gpio.pulse", pin=gpio, duration=duration):
+            self.pulses.pulse(gpio, duration)
+
+    def _write_level(self, gpio: int, high: bool):
+        start = time.perf_counter()
+        if self.mock_gpio:
+            self.mock_levels[gpio] = 1 if high else 0
+        else:
+            GPIO.output(gpio, GPIO.HIGH if high else GPIO.LOW)
+        _WRITE_DURATION.observe(time.perf_counter() - start)
+
+    def add_edge_callback(self, gpio: int, callback: Callable[[int, int], None], debounce_ms: int = None):
+        """
+        Call `callback(gpio, level)` whenever an input pin changes level.
+        :param gpio: Input pin to watch.
+        :param callback: Called from the GPIO event thread (or the caller's thread in mock mode).
+        :param debounce_ms: Edges closer than this are ignored. Defaults to the pin's `debounce` setting.
+        """
+        if debounce_ms is not None:
+            self._debounce_ms[gpio] = debounce_ms
+        callbacks = self._edge_callbacks.setdefault(gpio, [])
+        callbacks.append(callback)
+        if len(callbacks) > 1:
             return
-        GPIO.output(gpio, GPIO.LOW)
-        time.sleep(duration)
-        GPIO.output(gpio, GPIO.HIGH)
+        bouncetime = self._debounce_ms.get(gpio, DEFAULT_DEBOUNCE_MS)
+        logger.debug(f"Watching edges on GPIO pin {gpio} with {bouncetime} ms debounce")
+        if not self.mock_gpio and GPIO:
+            if bouncetime > 0:
+                GPIO.add_event_detect(gpio, GPIO.BOTH, callback=self._on_edge, bouncetime=bouncetime)
+            else:
+                GPIO.add_event_detect(gpio, GPIO.BOTH, callback=self._on_edge)
+
+    def remove_edge_callback(self, gpio: int, callback: Callable[[int, int], None]):
+        """Stop calling `callback` on edges of `gpio`, and stop watching the pin if it was the last callback."""
+        callbacks = self._edge_callbacks.get(gpio, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks and self._edge_callbacks.pop(gpio, None) is not None:
+            if not self.mock_gpio and GPIO:
+                GPIO.remove_event_detect(gpio)
+
+    def set_mock_level(self, gpio: int, level: int):
+        """Simulate an input level change in mock mode, firing edge callbacks like the hardware would."""
+        previous = self.mock_levels.get(gpio, 0)
+        self.mock_levels[gpio] = level
+        if previous == level or gpio not in self._edge_callbacks:
+            return
+        now = time.monotonic()
+        last_edge = self._last_edge.get(gpio)
+        if last_edge is not None and (now - last_edge) * 1000 < self._debounce_ms.get(gpio, DEFAULT_DEBOUNCE_MS):
+            return
+        self._last_edge[gpio] = now
+        self._dispatch_edge(gpio, level)
+
+    def _on_edge(self, gpio: int):
+        """RPi.GPIO event callback: debouncing is already done by the library."""
+        self._dispatch_edge(gpio, GPIO.input(gpio))
+
+    def _dispatch_edge(self, gpio: int, level: int):
+        for callback in self._edge_callbacks.get(gpio, []):
+            try:
+                callback(gpio, level)
+            except Exception:
+                logger.exception(f"Edge callback for GPIO pin {gpio} failed")
 
     def initialize_strip(self, gpio_pin: int, led_count: int, led_frequency = 800000, led_dma = 10, led_invert = False, led_brightness = 255, led_channel = 0):
+        if gpio_pin in self.frames and len(self.frames[gpio_pin]) == led_count:
+            # Already running, e.g. a device rebuilt by a configuration reload: keep it rather than begin() again
+            return
+        self.frames[gpio_pin] = array("I", [0]) * led_count
+        self.show_counts[gpio_pin] = 0
         if self.mock_gpio:
             logger.debug(f"Mock initialize LED strip with {led_count} LEDs on GPIO pin {gpio_pin}")
             return
-        strip = PixelStrip(led_count, gpio_pin, led_frequency, led_dma, led_invert, led_brightness, led_channel)
+        strip = _import_pixel_strip()(led_count, gpio_pin, led_frequency, led_dma, led_invert, led_brightness, led_channel)
         strip.begin()
         self.objects[gpio_pin] = strip
 
-    def set_strip_color(self, gpio: int, position: int, color: Tuple[int, int, int]):
+    def set_strip_color(self, gpio: int, position: int, color: Tuple[int, int, int], show: bool = True):
+        """Set a single LED. Prefer the buffered methods below when painting more than one pixel."""
+        self.frames[gpio][position] = pack_color(color)
+        if show:
+            self.show_strip(gpio)
+
+    def fill_strip(self, gpio: int, color: Tuple[int, int, int]):
+        """Set every LED of the frame buffer to the same color. Call show_strip() to display it."""
+        frame = self.frames[gpio]
+        frame[:] = array("I", [pack_color(color)]) * len(frame)
+
+    def set_strip_range(self, gpio: int, start: int, stop: int, color: Tuple[int, int, int]):
+        """Set LEDs [start, stop) of the frame buffer to the same color. Call show_strip() to display it."""
+        frame = self.frames[gpio]
+        start, stop, _ = slice(start, stop).indices(len(frame))
+        if stop > start:
+            frame[start:stop] = array("I", [pack_color(color)]) * (stop - start)
+
+    def set_strip_frame(self, gpio: int, pixels: Union[bytes, bytearray, memoryview, array, Sequence[int]]):
+        """
+        Replace the whole frame buffer. Call show_strip() to display it.
+        :param pixels: Either RGB bytes (3 bytes per LED) or one packed 0xRRGGBB integer per LED.
+        """
+        frame = self.frames[gpio]
+        if isinstance(pixels, (bytes, bytearray, memoryview)):
+            raw = bytes(pixels)
+            if len(raw) != 3 * len(frame):
+                raise ValueError(f"Expected {3 * len(frame)} bytes for strip on GPIO pin {gpio}, got {len(raw)}.")
+            channels = iter(raw)
+            pixels = array("I", [(r << 16) | (g << 8) | b for r, g, b in zip(channels, channels, channels)])
+        elif not isinstance(pixels, array) or pixels.typecode != "I":
+            pixels = array("I", pixels)
+        if len(pixels) != len(frame):
+            raise ValueError(f"Expected {len(frame)} pixels for strip on GPIO pin {gpio}, got {len(pixels)}.")
+        frame[:] = pixels
+
+    def show_strip(self, gpio: int):
+        """Push the frame buffer to the strip with a single show()."""
+        self.show_counts[gpio] += 1
         if self.mock_gpio:
-            logger.debug(f"Mock set LED strip color at position {position} to {color}")
+            logger.debug("Mock show LED strip on GPIO pin %s", gpio)
             return
-        strip = self.objects[gpio]
-        strip.setPixelColor(position, Color(*color))
-        strip.show()
+        start = time.perf_counter()
+        with span("gpio.strip_show", pin=gpio):
+            strip = self.objects[gpio]
+            strip[0:len(self.frames[gpio])] = self.frames[gpio]
+            strip.show()
+        _SHOW_DURATION.observe(time.perf_counter() - start)
 
     def cleanup(self):
         """Clean up GPIO resources."""
         logger.debug("Cleaning up GPIO resources")
+        self.pulses.stop()
         if not self.mock_gpio and GPIO:
             GPIO.cleanup()
+
+
+def pack_color(color: Tuple[int, int, int]) -> int:
+    """Pack an (r, g, b) tuple the way rpi_ws281x's Color() does."""
+    r, g, b = color
+    return (r << 16) | (g << 8) | b
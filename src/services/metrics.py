@@ -0,0 +1,211 @@
+import logging
+import threading
+from bisect import bisect_left
+from collections.abc import Callable
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger("Metrics")
+
+# Seconds, from GPIO register writes (~µs) to commands queued behind slow devices (~s)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram. Observing only bumps pre-allocated counters."""
+
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus the +Inf one, non-cumulative (made cumulative on export)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Cumulative bucket counts, sum and count, read consistently."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class HistogramFamily:
+    """Histograms sharing a name and buckets, one per combination of label values."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...], label_names: Tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = label_names
+        self._children: Dict[tuple, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Histogram:
+        """Histogram for the given label values. Callers on hot paths should keep the result."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def observe(self, value: float):
+        """Observe on the unlabelled histogram."""
+        self.labels().observe(value)
+
+    def children(self) -> List[Tuple[tuple, Histogram]]:
+        with self._lock:
+            return list(self._children.items())
+
+
+class MetricsRegistry:
+    """
+    Histograms updated by the instrumented code, plus collectors sampled at export time.
+
+    A collector is a callable returning (name, type, help, labels, value) tuples, with type "gauge" or "counter"
+    and labels a dict; it exposes counters the services already keep instead of duplicating them.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, HistogramFamily] = {}
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+                  labels: Tuple[str, ...] = ()) -> HistogramFamily:
+        """Register a histogram, or return the one already registered under `name`."""
+        with self._lock:
+            family = self._histograms.get(name)
+            if family is None:
+                family = self._histograms[name] = HistogramFamily(name, help_text, buckets, tuple(labels))
+            return family
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], Iterable[tuple]]):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            families = list(self._histograms.values())
+            collectors = list(self._collectors)
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} histogram")
+            for values, histogram in family.children():
+                labels = list(zip(family.label_names, values))
+                cumulative, total, count = histogram.snapshot()
+                for bound, bucket_count in zip(family.buckets + (float("inf"),), cumulative):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{family.name}_bucket{_labels(labels + [('le', le)])} {bucket_count}")
+                lines.append(f"{family.name}_sum{_labels(labels)} {total!r}")
+                lines.append(f"{family.name}_count{_labels(labels)} {count}")
+        described = set()
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                logger.exception(f"Metrics collector {collector!r} failed")
+                continue
+            for name, metric_type, help_text, labels, value in samples:
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                lines.append(f"{name}{_labels(sorted(labels.items()))} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def collect_process():
+    """Process-level gauges."""
+    yield "connector_threads", "gauge", "Number of live threads.", {}, threading.active_count()
+
+
+# Process-wide registry, like the logging module's loggers: instrumented modules register their histograms at import
+REGISTRY = MetricsRegistry()
+
+# Observed by every command execution path (inline, dispatcher workers, asyncio runtime)
+COMMAND_LATENCY = REGISTRY.histogram(
+    "connector_command_latency_seconds", "Time from command receipt to the end of its handler.",
+    labels=("device_class",))
+
+
+class MetricsServer:
+    """Serve the registry as a Prometheus text endpoint (GET /metrics) from a background thread."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9108):
+        """
+        Initialize MetricsServer.
+        :param registry: Metrics to expose.
+        :param host: Interface to listen on, localhost only by default.
+        :param port: Port to listen on, a free one if 0 (see `port` once started).
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        # Imported here, most nodes run without the endpoint
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
@@ -1,18 +1,48 @@
 import logging
-from datetime import datetime, timedelta
+import time
+from collections import namedtuple
 
 import paho.mqtt.client as mqtt
-import time
 import socket
-from threading import Thread, Event
+from threading import Lock, Thread, Event
+
+from src.services.backoff import Backoff
+from src.services.metrics import COMMAND_LATENCY, REGISTRY
+from src.services.outbound_spool import OutboundSpool
+from src.services.state_store import StateStore
+from src.services.tracing import Tracer, execution, span
+from src.services.timer_service import TimerService
 
 logger = logging.getLogger("MQTTService")
 
+COMMAND_WILDCARD = "+/+/set"
+
+READY_LATENCY = REGISTRY.histogram(
+    "connector_mqtt_ready_seconds",
+    "Time from the connection loss (or the start) to the subscriptions being acknowledged again.")
+
+PublishPolicy = namedtuple("PublishPolicy", ["qos", "retain"])
+
+# Topic kinds: periodic status sweeps, availability, and the state published in answer to a command or an input edge
+STATUS = "status"
+AVAILABILITY = "availability"
+ACK = "ack"
+DISCOVERY = "discovery"
+DEFAULT_PUBLISH_POLICY = {
+    STATUS: PublishPolicy(qos=1, retain=True),
+    AVAILABILITY: PublishPolicy(qos=1, retain=True),
+    ACK: PublishPolicy(qos=1, retain=False),
+    DISCOVERY: PublishPolicy(qos=1, retain=True),
+}
+
 
 class MQTTService:
     """Service to manage MQTT communication."""
 
-    def __init__(self, host: str, port: int, username: str, password: str, devices: list, interval: int = 10):
+    def __init__(self, host: str, port: int, username: str, password: str, devices: list, interval: int = 10,
+                 subscribe_wildcard: bool = False, timers: TimerService = None, publish_policy: dict = None,
+                 max_inflight: int = 20, max_queued: int = 0, tracer: Tracer = None, client_id: str = None,
+                 spool: OutboundSpool = None, backoff: Backoff = None, availability_topic: str = None):
         """
         Initialize MQTTService.
         :param host: MQTT broker host.
@@ -21,49 +51,243 @@ class MQTTService:
         :param password: MQTT password.
         :param devices: List of device instances.
         :param interval: Interval for periodic status publishing (seconds).
+        :param subscribe_wildcard: If True, subscribe once to `+/+/set` instead of once per device.
+        :param timers: Timer service used to end update delays. A private one is created if None.
+        :param publish_policy: QoS and retain flag per topic kind ("status", "availability", "ack",
+                               "discovery"), as dicts overriding DEFAULT_PUBLISH_POLICY.
+        :param max_inflight: Number of QoS 1/2 messages that may be unacknowledged at once.
+        :param max_queued: Number of messages queued behind a full inflight window, 0 for unlimited.
+        :param tracer: If set, every routed command is traced from its receipt to the end of its handler.
+        :param client_id: MQTT client identifier, the host name if None. Must be unique per broker.
+        :param spool: If set, messages published while disconnected are spooled to disk and replayed on the next
+                      connection, instead of queued in memory by the client.
+        :param backoff: Delays between connection attempts, Backoff() if None.
+        :param availability_topic: Availability topic of the whole connector, registered as the last will so the
+                                   broker marks it offline if the process dies. Every device has its own
+                                   availability topic if None.
         """
         self.host = host
         self.port = port
         self.username = username
         self.password = password
-        self.devices = devices
         self.interval = interval
+        self.subscribe_wildcard = subscribe_wildcard
+        self._routes = {}
+        self.state_store = StateStore()
+        self.devices = devices
+        # How routed commands are executed: inline on the network thread by default, replaced by the runtime in use.
+        # Called as dispatch(device, command, trace=None)
+        self.dispatch = self.run_command
+        self.tracer = tracer
+        # Called without arguments on every successful (re)connection, after the command subscriptions
+        self.connect_hooks = []
+        # Called with a device once it is removed or replaced by a rebuilt one, to release what dispatch kept of it
+        self.removal_hooks = []
+        # Topic filters subscribed on every connection, in the same SUBSCRIBE as the command topics
+        self.subscriptions = []
+        self.connects = 0
+        self.backoff = backoff if backoff is not None else Backoff()
+        # Set once connected and subscribed, cleared on disconnection
+        self.ready = Event()
+        self.last_ready_latency = None
+        self._down_since = None
+        self._ready_mid = None
+        # Whether paho's network thread (re)connects, rather than the asyncio runtime
+        self._paho_reconnects = False
 
-        self.client = mqtt.Client(client_id=socket.gethostname(), clean_session=False)
+        self.client = mqtt.Client(client_id=client_id or socket.gethostname(), clean_session=False)
         self.stop_event = Event()
-        self.delay_end_times = {}
+        self.timers = timers if timers is not None else TimerService()
+        # Devices whose updates are suppressed, with the timer lifting the suppression
+        self.delayed_devices = {}
+
+        self.publish_policy = self.build_publish_policy(publish_policy)
+        self.published = {kind: 0 for kind in self.publish_policy}
+        self.acknowledged = 0
+        self.rejected = 0
+        self.spool = spool
+        self.spooled = 0
+        self.replayed = 0
+        self._publish_lock = Lock()
+
+        self.availability_topic = availability_topic
+        if availability_topic is not None:
+            policy = self.publish_policy[AVAILABILITY]
+            self.client.will_set(availability_topic, "offline", qos=policy.qos, retain=policy.retain)
 
         self.client.username_pw_set(username, password)
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.max_queued_messages_set(max_queued)
         self.client.on_connect = self.on_connect
+        self.client.on_connect_fail = self.on_connect_fail
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_subscribe = self.on_subscribe
         self.client.on_message = self.on_message
-        self.last_status = {}
+        self.client.on_publish = self.on_publish
+
+    @staticmethod
+    def build_publish_policy(overrides: dict = None) -> dict:
+        """Merge the `publish` config section into the default policy, validating QoS levels and topic kinds."""
+        policy = dict(DEFAULT_PUBLISH_POLICY)
+        for kind, values in (overrides or {}).items():
+            if kind not in policy:
+                raise ValueError(f"Unknown publish topic kind: {kind}")
+            merged = policy[kind]._replace(**values)
+            if merged.qos not in (0, 1, 2):
+                raise ValueError(f"Invalid QoS {merged.qos} for {kind} messages.")
+            policy[kind] = merged
+        return policy
+
+    @property
+    def devices(self) -> list:
+        return self._devices
+
+    @devices.setter
+    def devices(self, devices: list):
+        """Replace the device list and rebuild the command routing index and the state store."""
+        self._devices = list(devices)
+        self._routes = {self._route_key(device): device for device in self._devices}
+        self.state_store.clear()
+        for device in self._devices:
+            self.state_store.register(device)
+
+    def add_device(self, device):
+        """Register a device and subscribe to its command topic if already connected."""
+        self._devices.append(device)
+        self._routes[self._route_key(device)] = device
+        self.state_store.register(device)
+        if not self.subscribe_wildcard and self.client.is_connected():
+            self.client.subscribe(device.get_topic("command"))
+
+    def remove_device(self, device):
+        """Unregister a device and stop listening to its command topic."""
+        self._devices.remove(device)
+        self._routes.pop(self._route_key(device), None)
+        self.state_store.unregister(device)
+        if not self.subscribe_wildcard and self.client.is_connected():
+            self.client.unsubscribe(device.get_topic("command"))
+        self._removed(device)
+
+    def replace_device(self, old_device, new_device):
+        """Swap a device for a rebuilt one with the same topics, without touching the subscriptions."""
+        self._devices[self._devices.index(old_device)] = new_device
+        self._routes[self._route_key(new_device)] = new_device
+        self.state_store.unregister(old_device)
+        self.state_store.register(new_device)
+        self._removed(old_device)
+
+    def _removed(self, device):
+        for hook in self.removal_hooks:
+            try:
+                hook(device)
+            except Exception:
+                logger.exception(f"Removal hook {hook!r} failed.")
+
+    @staticmethod
+    def _route_key(device) -> str:
+        return f"{device.device_class}/{device.device_id}/set"
+
+    def connecting(self):
+        """Mark the start of the connection attempts, from which the time to ready is measured."""
+        self._down_since = time.monotonic()
 
     def on_connect(self, client, userdata, flags, rc):
         """Handle connection to MQTT broker."""
         if rc == 0:
             logger.info("Connected to MQTT broker.")
-            for device in self.devices:
-                topic = device.get_topic("command")
-                client.subscribe(topic)
-                logger.info(f"Subscribed to {topic}")
+            self.connects += 1
+            self.backoff.reset()
+            topics = [COMMAND_WILDCARD] if self.subscribe_wildcard else \
+                [device.get_topic("command") for device in self.devices]
+            topics += self.subscriptions
+            if topics:
+                # One SUBSCRIBE for every topic, ready once it is acknowledged
+                self._ready_mid = client.subscribe([(topic, 0) for topic in topics])[1]
+                logger.info("Subscribing to %d topics", len(topics))
+            else:
+                self._mark_ready()
+            if self.availability_topic is not None and self.connects > 1:
+                # The broker published the will when the connection dropped. On the first connection, the online
+                # state published by start() is on its way
+                self.publish(self.availability_topic, "online", kind=AVAILABILITY)
+            if self.spool is not None:
+                self.replay_spool()
+            for hook in self.connect_hooks:
+                hook()
         else:
             logger.error(f"Failed to connect to MQTT broker: {rc}")
+            self._retry_later()
+
+    def on_connect_fail(self, client, userdata):
+        logger.warning("Connection to MQTT broker %s:%s failed.", self.host, self.port)
+        self._retry_later()
+
+    def on_disconnect(self, client, userdata, rc):
+        self.ready.clear()
+        if rc == 0:
+            return
+        logger.warning(f"Disconnected from MQTT broker: {mqtt.error_string(rc)}")
+        if self._down_since is None:
+            self._down_since = time.monotonic()
+        self._retry_later()
+
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        if mid == self._ready_mid:
+            self._mark_ready()
+
+    def _retry_later(self):
+        if self._paho_reconnects:
+            # paho waits the minimum delay before its next attempt: one jittered delay per failure
+            delay = self.backoff.next_delay()
+            self.client.reconnect_delay_set(delay, delay)
+
+    def _mark_ready(self):
+        self._ready_mid = None
+        if self._down_since is not None:
+            self.last_ready_latency = time.monotonic() - self._down_since
+            self._down_since = None
+            READY_LATENCY.observe(self.last_ready_latency)
+            logger.info(f"MQTT ready {self.last_ready_latency * 1000:.0f} ms after the connection attempts started.")
+        self.ready.set()
 
     def on_message(self, client, userdata, msg):
         """Route incoming MQTT messages to the correct device."""
         logger.debug("Received message: %s", msg.payload)
-        topic_parts = msg.topic.split("/")
-        if len(topic_parts) == 3 and topic_parts[-1] == "set":
-            device_class, device_id, _ = topic_parts
-            for device in self.devices:
-                if device.device_class == device_class and str(device.device_id) == device_id:
-                    device.handle_command(msg.payload.decode())
-                    return
+        device = self._routes.get(msg.topic)
+        if device is not None:
+            try:
+                # Payload bytes to the device's command, before queueing so unknown commands are dropped here
+                command = device.decode_command(msg.payload)
+            except ValueError as e:
+                logger.warning("Ignoring message on %s: %s", msg.topic, e)
+                return
+            if self.tracer is None:
+                self.dispatch(device, command)
+            else:
+                trace = self.tracer.start(device.identifier(), msg.payload.decode(errors="replace"), msg.timestamp)
+                self.dispatch(device, command, trace=trace)
+        elif msg.topic.endswith("/set"):
             logger.warning(f"No matching device for topic: {msg.topic}")
 
+    @staticmethod
+    def run_command(device, command, trace=None):
+        """Execute a command on a device in the calling thread."""
+        start = time.perf_counter()
+        try:
+            with execution(trace):
+                device.handle_command(command)
+        finally:
+            COMMAND_LATENCY.labels(device.device_class).observe(time.perf_counter() - start)
+
     def start(self):
-        """Start the MQTT service and the status publishing thread."""
-        self.client.connect(self.host, self.port)
+        """
+        Start the MQTT service and the status publishing thread. The network thread connects in the background,
+        retrying with backoff while the broker is unreachable; messages published meanwhile are queued or spooled.
+        """
+        self.connecting()
+        self._paho_reconnects = True
+        self.client.reconnect_delay_set(self.backoff.initial, self.backoff.initial)
+        self.client.connect_async(self.host, self.port)
         self.client.loop_start()
         self.publish_availability("online")
         if self.interval > 0:
@@ -72,42 +296,124 @@ class MQTTService:
 
     def stop(self):
         """Stop the MQTT service and threads."""
-        self.publish_availability("offline")
+        info = self.publish_availability("offline")
+        if info is not None and info.rc == mqtt.MQTT_ERR_SUCCESS:
+            # A clean disconnection discards the will: the offline state must reach the broker first
+            info.wait_for_publish(timeout=1)
         self.stop_event.set()
         if self.interval > 0:
-            self.status_thread.join()
+            self.status_thread.join(timeout=self.interval)
         self.client.loop_stop()
         self.client.disconnect()
         logger.info("MQTT service stopped.")
 
     def delay_updates(self, device_identifier: str, delay_seconds: int):
         """Delay updates for a specific device for a given amount of time."""
-        self.delay_end_times[device_identifier] = datetime.now() + timedelta(seconds=delay_seconds)
-        logger.info(f"Updates for device {device_identifier} delayed for {delay_seconds} seconds.")
+        previous = self.delayed_devices.get(device_identifier)
+        if previous is not None:
+            previous.cancel()
+        self.delayed_devices[device_identifier] = self.timers.call_later(
+            delay_seconds, self._end_delay, device_identifier)
+        logger.info("Updates for device %s delayed for %s seconds.", device_identifier, delay_seconds)
 
-    def publish(self, topic: str, payload: str, retain: bool = False):
-        """Publish a message to a specific topic."""
-        self.client.publish(topic, payload, retain=retain, qos=2)
-        logger.info(f"Published to {topic}: {payload}")
+    def _end_delay(self, device_identifier: str):
+        timer = self.delayed_devices.get(device_identifier)
+        # A newer delay may have replaced the timer that just fired
+        if timer is not None and timer.done:
+            del self.delayed_devices[device_identifier]
+            # State changes may have been missed while suppressed, read the device again on the next sweep
+            self.state_store.invalidate(device_identifier)
+
+    def publish(self, topic: str, payload: str, retain: bool = None, kind: str = ACK) -> mqtt.MQTTMessageInfo:
+        """
+        Queue a message on the client with the QoS and retain flag of its topic kind, without waiting for the
+        broker. `retain` overrides the policy when given. Returns None if the message was spooled.
+        """
+        policy = self.publish_policy[kind]
+        retain = policy.retain if retain is None else retain
+        if self.spool is not None:
+            if not self.client.is_connected():
+                self.spool.put(topic, payload, policy.qos, retain)
+                with self._publish_lock:
+                    self.spooled += 1
+                logger.debug("Spooled %s: %s", topic, payload)
+                return None
+            # The spooled message of this topic is out of date, it must not be replayed after this one
+            self.spool.discard(topic)
+        info = self.client.publish(topic, payload, retain=retain, qos=policy.qos)
+        # While disconnected, the client keeps QoS 1/2 messages for the next connection but drops QoS 0 ones
+        accepted = info.rc == mqtt.MQTT_ERR_SUCCESS or (info.rc == mqtt.MQTT_ERR_NO_CONN and policy.qos > 0)
+        with self._publish_lock:
+            if accepted:
+                self.published[kind] += 1
+            else:
+                self.rejected += 1
+        if accepted:
+            logger.debug("Published to %s: %s", topic, payload)
+        else:
+            logger.debug("Message to %s dropped by the client: %s", topic, mqtt.error_string(info.rc))
+        return info
+
+    def replay_spool(self):
+        """Publish the spooled messages, called once connected."""
+        def publish(topic, payload, qos, retain):
+            return self.client.publish(topic, payload, retain=retain, qos=qos)
+
+        replayed = self.spool.replay(publish)
+        with self._publish_lock:
+            self.replayed += replayed
+
+    def on_publish(self, client, userdata, mid):
+        """Count messages handed to the broker (QoS 0) or acknowledged by it (QoS 1/2)."""
+        with self._publish_lock:
+            self.acknowledged += 1
+        if self.spool is not None:
+            self.spool.acknowledge(mid)
+
+    def publish_stats(self) -> dict:
+        """Messages published per topic kind, acknowledged, dropped by the client and still in flight."""
+        with self._publish_lock:
+            stats = dict(self.published)
+            stats["acknowledged"] = self.acknowledged
+            stats["rejected"] = self.rejected
+            stats["spooled"] = self.spooled
+            stats["replayed"] = self.replayed
+            stats["inflight"] = sum(self.published.values()) + self.replayed - self.acknowledged
+        return stats
+
+    def collect_metrics(self):
+        """Metrics collector, see MetricsRegistry.add_collector."""
+        stats = self.publish_stats()
+        for kind in self.publish_policy:
+            yield "connector_mqtt_published_total", "counter", "Messages published, by topic kind.", \
+                {"kind": kind}, stats[kind]
+        yield "connector_mqtt_acknowledged_total", "counter", "Published messages acknowledged.", {}, \
+            stats["acknowledged"]
+        yield "connector_mqtt_rejected_total", "counter", "Messages dropped by the client: disconnected (QoS 0) or " \
+            "queue full.", {}, stats["rejected"]
+        yield "connector_mqtt_inflight", "gauge", "Published messages not acknowledged yet.", {}, stats["inflight"]
+        yield "connector_mqtt_connects_total", "counter", "Successful connections to the broker.", {}, self.connects
+        yield "connector_mqtt_reconnects_total", "counter", "Connections after the first one.", {}, \
+            max(0, self.connects - 1)
+        yield "connector_mqtt_ready", "gauge", "Connected with the subscriptions acknowledged.", {}, \
+            int(self.ready.is_set())
+        yield "connector_status_dirty", "gauge", "Devices with an unpublished state.", {}, \
+            self.state_store.stats()["dirty"]
 
     def publish_status(self):
-        """Publish the current status of all devices."""
-        for device in self.devices:
-            if device.identifier() in self.delay_end_times and datetime.now() < self.delay_end_times[device.identifier()]:
-                continue
-            status = device.get_status()
-            if device.identifier() in self.last_status and self.last_status[device.identifier()] == status:
-                continue
-            topic = device.get_topic("status")
-            self.last_status[device.identifier()] = status
-            self.client.publish(topic, status, retain=True, qos=2)
-            logger.info(f"Published status for {device.device_class} {device.device_id}: {status}")
+        """Publish the status of the devices whose state changed since the last call."""
+        delayed = self.delayed_devices
+        # Consistency sweep of the inputs: the edge back to the current level may have been debounced away
+        self.state_store.invalidate_watched()
+        self.state_store.refresh(skip=delayed)
+        for topic, status in self.state_store.take_dirty(skip=delayed):
+            self.publish(topic, status, kind=STATUS)
 
     def publish_status_periodically(self):
         """Publish status at regular intervals."""
         while not self.stop_event.is_set():
             self.publish_status()
-            time.sleep(self.interval)
+            self.stop_event.wait(self.interval)
 
     def register_device_state_change_callback(self, device):
         """Register a state change callback for a device."""
@@ -116,14 +422,30 @@ class MQTTService:
     def handle_device_state_change(self, device_class, device_id, status):
         """Handle a state change event from a device."""
         identifier = f"{device_class}_{device_id}"
-        if identifier in self.delay_end_times and datetime.now() < self.delay_end_times[identifier]:
+        # Recorded even while delayed, the status sweep publishes it once the delay is over
+        self.state_store.record(identifier, status)
+        if identifier in self.delayed_devices:
             return
         topic = f"{device_class}/{device_id}/status"
-        self.publish(topic, status)
-
-    def publish_availability(self, state: str):
-        """Publish the availability status of all devices to Home Assistant."""
-        for device in self.devices:
-            topic = device.get_topic("availability")
-            self.publish(topic, state, retain=True)
-            logger.info(f"Published availability for {device.device_class} {device.device_id}: {state}")
+        with span("mqtt.publish_state", topic=topic):
+            self.publish(topic, status)
+
+    def publish_availability(self, state: str, devices: list = None):
+        """
+        Publish the availability status of `devices` to Home Assistant. For all devices (None), the bridge
+        availability topic is published too; devices only publish the availability topics of their own.
+        Returns the MQTTMessageInfo of the bridge availability message, None if not published.
+        """
+        info = None
+        if devices is None:
+            devices = self.devices
+            if self.availability_topic is not None:
+                info = self.publish(self.availability_topic, state, kind=AVAILABILITY)
+        topics = [device.get_topic("availability") for device in devices]
+        topics = [topic for topic in topics if topic != self.availability_topic]
+        for topic in topics:
+            self.publish(topic, state, kind=AVAILABILITY)
+        if info is not None or topics:
+            logger.info(f"Published availability {state}: {'bridge and ' if info is not None else ''}"
+                        f"{len(topics)} device topics")
+        return info
@@ -0,0 +1,154 @@
+import json
+import logging
+import threading
+import time
+from typing import Dict
+
+from src.services.mqtt_service import AVAILABILITY, MQTTService
+from src.services.timer_service import TimerService
+
+logger = logging.getLogger("NodeService")
+
+DEFAULT_PREFIX = "ha-rpi-connector/nodes"
+
+
+class NodeService:
+    """
+    Announce the devices this node owns, and that it is alive, on a retained topic per node. Several nodes can then
+    share one device configuration, each running the devices assigned to it.
+
+    The announcement is published on every connection, after a configuration reload and every `heartbeat`
+    seconds. The other nodes' announcements are followed: a node is alive while its last heartbeat is less than
+    three heartbeats old, and a device claimed by another live node is reported as a conflict.
+    """
+
+    def __init__(self, mqtt_service: MQTTService, node: str, devices: list, timers: TimerService,
+                 heartbeat: float = 30, prefix: str = DEFAULT_PREFIX, clock=time.time):
+        """
+        Initialize NodeService.
+        :param mqtt_service: The MQTT service publishing the announcements.
+        :param node: Name of this node.
+        :param devices: Devices run by this node, updated in place on reloads.
+        :param timers: Timer service scheduling the heartbeats.
+        :param heartbeat: Seconds between announcements, 0 to only announce on connections and reloads.
+        :param prefix: Topic prefix, the announcements are published on `<prefix>/<node>`.
+        :param clock: Wall clock, shared by the nodes to judge liveness. For tests.
+        """
+        self.mqtt_service = mqtt_service
+        self.node = node
+        self.devices = devices
+        self.timers = timers
+        self.heartbeat = heartbeat
+        self.prefix = prefix
+        self.clock = clock
+        self.topic = f"{prefix}/{node}"
+        # Last announcement of every other node
+        self.nodes: Dict[str, dict] = {}
+        self._conflicts = set()
+        self._lock = threading.Lock()
+        self._heartbeat_timer = None
+
+    def start(self):
+        self.mqtt_service.client.message_callback_add(f"{self.prefix}/+", self.on_announcement)
+        self.mqtt_service.subscriptions.append(f"{self.prefix}/+")
+        self.mqtt_service.connect_hooks.append(self.on_connect)
+        if self.heartbeat > 0:
+            self._heartbeat_timer = self.timers.call_later(self.heartbeat, self._beat)
+
+    def stop(self):
+        """Announce that this node went offline."""
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer.cancel()
+            self._heartbeat_timer = None
+        self.announce("offline")
+
+    def on_connect(self):
+        self.announce()
+
+    def announcement(self, status: str = "online") -> dict:
+        return {
+            "node": self.node,
+            "status": status,
+            "devices": sorted(device.identifier() for device in self.devices) if status == "online" else [],
+            "heartbeat": self.heartbeat,
+            "timestamp": self.clock(),
+        }
+
+    def announce(self, status: str = "online"):
+        """Publish the devices of this node, retained."""
+        announcement = self.announcement(status)
+        self.mqtt_service.publish(self.topic, json.dumps(announcement), retain=True, kind=AVAILABILITY)
+        logger.debug("Announced %s with %d devices: %s", self.node, len(announcement["devices"]), status)
+
+    def _beat(self):
+        self.announce()
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer = self.timers.call_later(self.heartbeat, self._beat)
+
+    def on_announcement(self, client, userdata, msg):
+        node = msg.topic[len(self.prefix) + 1:]
+        if node == self.node:
+            return
+        if not msg.payload:
+            # Retained announcement cleared
+            with self._lock:
+                self.nodes.pop(node, None)
+            self._check_conflicts(node, set())
+            return
+        try:
+            announcement = json.loads(msg.payload)
+            devices = set(announcement["devices"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring invalid announcement of node {node}: {e}")
+            return
+        with self._lock:
+            previous = self.nodes.get(node)
+            self.nodes[node] = announcement
+        if previous is None or (previous.get("status"), previous.get("devices")) != \
+                (announcement.get("status"), announcement["devices"]):
+            logger.info(f"Node {node} is {announcement.get('status')} with {len(devices)} devices.")
+        self._check_conflicts(node, devices)
+
+    def _check_conflicts(self, node: str, devices: set):
+        claimed = devices & {device.identifier() for device in self.devices} if self.is_alive(node) else set()
+        with self._lock:
+            known = {identifier for other, identifier in self._conflicts if other == node}
+            self._conflicts -= {(node, identifier) for identifier in known - claimed}
+            self._conflicts |= {(node, identifier) for identifier in claimed}
+        for identifier in sorted(claimed - known):
+            logger.error(f"Device {identifier} is also run by node {node}: assign it to a single node.")
+
+    def is_alive(self, node: str) -> bool:
+        with self._lock:
+            announcement = self.nodes.get(node)
+        if announcement is None or announcement.get("status") != "online":
+            return False
+        heartbeat = announcement.get("heartbeat") or 0
+        # Without heartbeats, an online announcement holds until the node says otherwise
+        return heartbeat <= 0 or self.clock() - announcement.get("timestamp", 0) < 3 * heartbeat
+
+    def owners(self) -> Dict[str, str]:
+        """Node running each device, as announced by the live nodes and this one."""
+        with self._lock:
+            nodes = list(self.nodes.items())
+        owners = {}
+        for node, announcement in nodes:
+            if self.is_alive(node):
+                for identifier in announcement["devices"]:
+                    owners[identifier] = node
+        for device in self.devices:
+            owners[device.identifier()] = self.node
+        return owners
+
+    def conflicts(self) -> list:
+        """(node, device identifier) of the devices also claimed by another live node."""
+        return sorted(conflict for conflict in self._conflicts if self.is_alive(conflict[0]))
+
+    def collect_metrics(self):
+        """Metrics collector, see MetricsRegistry."""
+        with self._lock:
+            nodes = list(self.nodes)
+        yield "connector_nodes_alive", "gauge", "Other nodes announcing themselves alive.", {}, \
+            sum(1 for node in nodes if self.is_alive(node))
+        yield "connector_device_conflicts", "gauge", "Devices also run by another live node.", {}, \
+            len(self.conflicts())
@@ -0,0 +1,254 @@
+import logging
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Dict, Tuple
+
+from src.services.timer_service import TimerService
+
+logger = logging.getLogger("OutboundSpool")
+
+MAGIC = b"HASPOOL1"
+# crc32, flags, qos, topic length, payload length; the crc covers everything after itself
+_RECORD = struct.Struct("<IBBHI")
+_RETAIN = 0x01
+_TOMBSTONE = 0x02
+
+
+class _Message:
+    __slots__ = ("payload", "qos", "retain", "generation", "size")
+
+    def __init__(self, payload: bytes, qos: int, retain: bool, generation: int, size: int):
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.generation = generation
+        self.size = size
+
+
+def _encode(topic: bytes, payload: bytes, qos: int, flags: int) -> bytes:
+    body = _RECORD.pack(0, flags, qos, len(topic), len(payload))[4:] + topic + payload
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+class OutboundSpool:
+    """
+    Messages published while disconnected from the broker, kept in an append-only file until the broker
+    acknowledges them, so they survive restarts.
+
+    Messages are coalesced per topic: only the latest one of each topic is kept, and replayed. The file only ever
+    grows by appended records, written and fsynced in batches every `sync_interval` seconds to spare SD cards; it is
+    compacted down to the pending messages when it reaches `max_bytes`, dropping the oldest ones if they alone do
+    not fit, and truncated once every message has been acknowledged.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1048576, sync_interval: float = 1.0, timers: TimerService = None):
+        """
+        Initialize OutboundSpool and load the messages left by the previous run.
+        :param path: Spool file.
+        :param max_bytes: Maximum size of the file.
+        :param sync_interval: Seconds between batched writes, a message spooled during this time is lost on power
+                              failure. Every record is written and fsynced at once if 0 or without `timers`.
+        :param timers: Timer service scheduling the batched writes.
+        """
+        if max_bytes <= len(MAGIC) + _RECORD.size:
+            raise ValueError(f"Spool size {max_bytes} is too small.")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sync_interval = sync_interval
+        self.timers = timers
+        # Pending messages by topic, oldest first
+        self._pending: "OrderedDict[str, _Message]" = OrderedDict()
+        # Replayed messages waiting for the broker: mid -> (topic, generation)
+        self._sent: Dict[int, Tuple[str, int]] = {}
+        self._generation = 0
+        self._buffer = bytearray()
+        self._file_size = 0
+        self._sync_timer = None
+        self._lock = threading.RLock()
+        self.coalesced = 0
+        self.dropped = 0
+        self.syncs = 0
+        self._load()
+        self._file = open(self.path, "ab")
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, topic: str, payload, qos: int, retain: bool):
+        """Spool a message, replacing the pending message of the same topic."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        record = _encode(topic.encode(), payload, qos, _RETAIN if retain else 0)
+        if len(MAGIC) + len(record) > self.max_bytes:
+            logger.warning("Dropping a %d bytes message to %s, larger than the spool", len(payload), topic)
+            self.dropped += 1
+            return
+        with self._lock:
+            if self._pending.pop(topic, None) is not None:
+                self.coalesced += 1
+            self._generation += 1
+            self._pending[topic] = _Message(payload, qos, retain, self._generation, len(record))
+            self._append(record)
+
+    def discard(self, topic: str):
+        """Forget the pending message of `topic`, superseded by a newer one published directly."""
+        if topic not in self._pending:
+            return
+        with self._lock:
+            if self._pending.pop(topic, None) is not None:
+                self._remove(topic)
+
+    def replay(self, publish: Callable[[str, bytes, int, bool], object]) -> int:
+        """
+        Publish the pending messages, oldest first, with `publish(topic, payload, qos, retain)` returning the
+        client's MQTTMessageInfo. They stay spooled until acknowledge() is called with their mid.
+        """
+        with self._lock:
+            self._sent.clear()
+            for topic, message in list(self._pending.items()):
+                info = publish(topic, message.payload, message.qos, message.retain)
+                self._sent[info.mid] = (topic, message.generation)
+            count = len(self._sent)
+        if count:
+            logger.info(f"Replaying {count} spooled messages.")
+        return count
+
+    def acknowledge(self, mid: int):
+        """Called for every message the broker acknowledged: removes it if it was replayed from the spool."""
+        if not self._sent:
+            return
+        with self._lock:
+            sent = self._sent.pop(mid, None)
+            if sent is None:
+                return
+            topic, generation = sent
+            message = self._pending.get(topic)
+            # Unless spooled again meanwhile
+            if message is not None and message.generation == generation:
+                del self._pending[topic]
+                self._remove(topic)
+
+    def sync(self):
+        """Write and fsync the buffered records."""
+        with self._lock:
+            self._sync_timer = None
+            if not self._buffer:
+                return
+            self._file.write(self._buffer)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._buffer.clear()
+            self.syncs += 1
+
+    def close(self):
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+            self.sync()
+            self._file.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "bytes": self._file_size, "coalesced": self.coalesced,
+                    "dropped": self.dropped}
+
+    def collect_metrics(self):
+        """Metrics collector, see MetricsRegistry."""
+        stats = self.stats()
+        yield "connector_spool_messages", "gauge", "Messages waiting in the offline spool.", {}, stats["pending"]
+        yield "connector_spool_bytes", "gauge", "Size of the offline spool file.", {}, stats["bytes"]
+        yield "connector_spool_coalesced_total", "counter", "Spooled messages replaced by a newer one.", {}, \
+            stats["coalesced"]
+        yield "connector_spool_dropped_total", "counter", "Messages dropped from a full spool.", {}, \
+            stats["dropped"]
+
+    def _remove(self, topic: str):
+        if not self._pending:
+            # Nothing left to replay: start the file over rather than recording the removal
+            self._reset()
+        else:
+            self._append(_encode(topic.encode(), b"", 0, _TOMBSTONE))
+
+    def _append(self, record: bytes):
+        if self._file_size + len(record) > self.max_bytes:
+            # The compacted file already reflects this record: the message is pending, or no longer is
+            self._compact()
+            return
+        self._buffer += record
+        self._file_size += len(record)
+        if not self.sync_interval or self.timers is None:
+            self.sync()
+        elif self._sync_timer is None:
+            self._sync_timer = self.timers.call_later(self.sync_interval, self.sync)
+
+    def _compact(self):
+        """Rewrite the file with the pending messages only, dropping the oldest ones beyond `max_bytes`."""
+        size = len(MAGIC) + sum(message.size for message in self._pending.values())
+        while size > self.max_bytes:
+            topic, message = self._pending.popitem(last=False)
+            size -= message.size
+            self.dropped += 1
+            logger.warning("Spool full, dropping the message to %s", topic)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            for topic, message in self._pending.items():
+                f.write(_encode(topic.encode(), message.payload, message.qos, _RETAIN if message.retain else 0))
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "ab")
+        self._buffer.clear()
+        self._file_size = size
+        self.syncs += 1
+
+    def _reset(self):
+        self._buffer.clear()
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(MAGIC)
+        self._file.flush()
+        # Acknowledged messages must not come back after a power failure, and override newer states
+        os.fsync(self._file.fileno())
+        self._file_size = len(MAGIC)
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        if not data.startswith(MAGIC):
+            if data:
+                logger.warning(f"Ignoring {self.path}, not a spool file.")
+            with open(self.path, "wb") as f:
+                f.write(MAGIC)
+            self._file_size = len(MAGIC)
+            return
+
+        offset = len(MAGIC)
+        while offset + _RECORD.size <= len(data):
+            crc, flags, qos, topic_length, payload_length = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + topic_length + payload_length
+            if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+                break
+            topic = data[offset + _RECORD.size:offset + _RECORD.size + topic_length].decode()
+            self._pending.pop(topic, None)
+            if not flags & _TOMBSTONE:
+                self._generation += 1
+                self._pending[topic] = _Message(data[end - payload_length:end], qos, bool(flags & _RETAIN),
+                                                self._generation, end - offset)
+            offset = end
+        if offset < len(data):
+            # Torn write of the last batch
+            logger.warning(f"Truncating {len(data) - offset} bytes of incomplete records from {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        self._file_size = offset
+        if self._pending:
+            logger.info(f"Loaded {len(self._pending)} spooled messages from {self.path}")
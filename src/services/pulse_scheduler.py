@@ -0,0 +1,95 @@
+import logging
+import threading
+from collections import deque
+from collections.abc import Callable
+from typing import Deque, Dict
+
+from src.services.timer_service import Timer, TimerService
+
+logger = logging.getLogger("PulseScheduler")
+
+
+class PulseScheduler:
+    """
+    Drive relay pulses (LOW for `duration`, then back to HIGH) with the restore edge scheduled on a timer service.
+
+    Callers return immediately. Pulses on the same pin are queued and played one after the other, separated by
+    `gap` seconds so the relay sees distinct presses. Pulses on different pins overlap freely.
+    """
+
+    def __init__(self, write: Callable[[int, bool], None], timers: TimerService, gap: float = 0.1):
+        """
+        Initialize PulseScheduler.
+        :param write: Called as `write(gpio, high)` to drive a pin.
+        :param timers: Timer service running the delayed edges.
+        :param gap: Time (seconds) a pin stays HIGH between two queued pulses.
+        """
+        self._write = write
+        self.timers = timers
+        self.gap = gap
+        self._condition = threading.Condition()
+        self._pending: Dict[int, Deque[float]] = {}
+        self._timers: Dict[int, Timer] = {}
+        self._stopped = False
+
+    def pulse(self, gpio: int, duration: float):
+        """Queue a pulse on `gpio` and return without waiting for it."""
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("PulseScheduler is stopped.")
+            queue = self._pending.setdefault(gpio, deque())
+            queue.append(duration)
+            if len(queue) == 1:
+                self._arm(gpio)
+
+    def is_busy(self, gpio: int) -> bool:
+        """Whether a pulse is active or queued on `gpio`."""
+        with self._condition:
+            return gpio in self._pending
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until every queued pulse has completed. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending, timeout)
+
+    def stop(self):
+        """Restore every pin that is mid-pulse and cancel the queued pulses."""
+        with self._condition:
+            self._stopped = True
+            for timer in self._timers.values():
+                timer.cancel()
+            for gpio in self._pending:
+                self._safe_write(gpio, True)
+            self._pending.clear()
+            self._timers.clear()
+            self._condition.notify_all()
+
+    def _arm(self, gpio: int):
+        """Start the pulse at the head of the pin queue. Called with the condition held."""
+        self._safe_write(gpio, False)
+        self._timers[gpio] = self.timers.call_later(self._pending[gpio][0], self._restore, gpio)
+
+    def _restore(self, gpio: int):
+        with self._condition:
+            queue = self._pending.get(gpio)
+            if not queue:
+                return
+            self._safe_write(gpio, True)
+            queue.popleft()
+            if queue:
+                self._timers[gpio] = self.timers.call_later(self.gap, self._rearm, gpio)
+            else:
+                del self._pending[gpio]
+                del self._timers[gpio]
+                self._condition.notify_all()
+
+    def _rearm(self, gpio: int):
+        with self._condition:
+            if self._pending.get(gpio):
+                self._arm(gpio)
+
+    def _safe_write(self, gpio: int, high: bool):
+        try:
+            self._write(gpio, high)
+        except Exception:
+            logger.exception(f"Failed to drive GPIO pin {gpio} {'HIGH' if high else 'LOW'}")
@@ -0,0 +1,122 @@
+import threading
+from typing import Dict, List, Tuple
+
+
+class _Entry:
+    """Last known state of a device and what was last published for it."""
+
+    __slots__ = ("device", "topic", "payload", "published")
+
+    def __init__(self, device):
+        self.device = device
+        # Resolved once, the sweep publishes straight from the entry
+        self.topic = device.get_topic("status")
+        self.payload = None
+        self.published = None
+
+
+class StateStore:
+    """
+    Central record of device states, fed by the devices' state change notifications.
+
+    Recording a state that differs from the last published one marks the device dirty, so a status sweep only
+    touches the devices that changed. Devices whose state is unknown (never read, or changes were missed while
+    their updates were delayed) are marked stale and read again with `get_status()` on the next sweep. Devices
+    watching input pins can miss an edge swallowed by the debounce, they are read again on every sweep.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._dirty = set()
+        self._stale = set()
+        # Devices watching input pins
+        self._watched = set()
+        self._lock = threading.Lock()
+
+    def register(self, device):
+        """Track a device. Its state is read on the next sweep."""
+        identifier = device.identifier()
+        with self._lock:
+            self._entries[identifier] = _Entry(device)
+            self._stale.add(identifier)
+            if getattr(device, "watched_pins", ()):
+                self._watched.add(identifier)
+
+    def unregister(self, device):
+        identifier = device.identifier()
+        with self._lock:
+            self._entries.pop(identifier, None)
+            self._dirty.discard(identifier)
+            self._stale.discard(identifier)
+            self._watched.discard(identifier)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty.clear()
+            self._stale.clear()
+            self._watched.clear()
+
+    def record(self, identifier: str, payload: str) -> bool:
+        """Record the new state of a device. Returns True if it differs from the published one."""
+        with self._lock:
+            entry = self._entries.get(identifier)
+            if entry is None:
+                return False
+            entry.payload = payload
+            self._stale.discard(identifier)
+            if payload == entry.published:
+                self._dirty.discard(identifier)
+                return False
+            self._dirty.add(identifier)
+            return True
+
+    def invalidate(self, identifier: str = None):
+        """Have a device (every device if None) read again on the next sweep."""
+        with self._lock:
+            if identifier is None:
+                self._stale.update(self._entries)
+            elif identifier in self._entries:
+                self._stale.add(identifier)
+
+    def invalidate_watched(self):
+        """Have the devices watching input pins read again on the next sweep."""
+        with self._lock:
+            self._stale |= self._watched
+
+    def refresh(self, skip=()):
+        """Read the state of the stale devices, except the ones in `skip`."""
+        with self._lock:
+            devices = [(identifier, self._entries[identifier].device)
+                       for identifier in self._stale if identifier not in skip]
+        # get_status() may touch GPIO, keep it out of the lock
+        for identifier, device in devices:
+            self.record(identifier, device.get_status())
+
+    def take_dirty(self, skip=()) -> List[Tuple[str, str]]:
+        """
+        Return the (topic, payload) pairs of the dirty devices, except the ones in `skip`, and consider them
+        published.
+        """
+        with self._lock:
+            if not self._dirty:
+                return []
+            changes = []
+            for identifier in list(self._dirty):
+                if identifier in skip:
+                    continue
+                entry = self._entries[identifier]
+                entry.published = entry.payload
+                changes.append((entry.topic, entry.payload))
+                self._dirty.discard(identifier)
+            return changes
+
+    def snapshot(self) -> Dict[str, str]:
+        """Consistent copy of the known state of every device, by identifier."""
+        with self._lock:
+            return {identifier: entry.payload for identifier, entry in self._entries.items()
+                    if entry.payload is not None}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"devices": len(self._entries), "dirty": len(self._dirty), "stale": len(self._stale)}
@@ -0,0 +1,121 @@
+import logging
+import signal
+import socket
+import threading
+import time
+from collections.abc import Callable
+from typing import Dict, List
+
+logger = logging.getLogger("Supervisor")
+
+
+class Supervisor:
+    """Keep the daemon alive without busy-waiting and shut it down on signals."""
+
+    def __init__(self, shutdown_timeout: float = 5.0, stop_signals=(signal.SIGTERM, signal.SIGINT)):
+        """
+        Initialize Supervisor.
+        :param shutdown_timeout: Maximum time (seconds) given to the shutdown hooks.
+        :param stop_signals: Signals that request a shutdown.
+        """
+        self.shutdown_timeout = shutdown_timeout
+        self.stop_signals = tuple(stop_signals)
+        self.stop_event = threading.Event()
+        self._hooks: List[Callable[[], None]] = []
+        self._signal_handlers: Dict[int, Callable[[], None]] = {}
+        self._reader, self._writer = socket.socketpair()
+        self._writer.setblocking(False)
+        self._started_wall = None
+        self._started_cpu = None
+
+    def add_shutdown_hook(self, hook: Callable[[], None]):
+        """Register a callable run on shutdown. Hooks run in reverse registration order."""
+        self._hooks.append(hook)
+
+    def add_signal_handler(self, signum: int, handler: Callable[[], None]):
+        """Run `handler` from the supervisor loop (not from signal context) when `signum` is received."""
+        self._signal_handlers[signum] = handler
+
+    def request_stop(self):
+        """Ask the supervisor to stop. Safe to call from any thread."""
+        self.stop_event.set()
+        self._wake(0)
+
+    def send_signal(self, signum: int):
+        """Handle `signum` from the supervisor loop as if the process received it. Safe to call from any thread."""
+        self._wake(signum)
+
+    def cpu_usage(self) -> float:
+        """Fraction of one CPU consumed by the process since `run()` started."""
+        if self._started_wall is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started_wall
+        if elapsed <= 0:
+            return 0.0
+        return (time.process_time() - self._started_cpu) / elapsed
+
+    def run(self):
+        """Block until a stop is requested, then run the shutdown hooks."""
+        previous = self._install_signal_handlers()
+        self._started_wall = time.monotonic()
+        self._started_cpu = time.process_time()
+        try:
+            while not self.stop_event.is_set():
+                for signum in self._reader.recv(64):
+                    self._handle_signal(signum)
+        finally:
+            self._restore_signal_handlers(previous)
+        logger.info(f"Shutdown requested, process CPU usage while running: {self.cpu_usage():.2%}")
+        self.shutdown()
+
+    def shutdown(self):
+        """Run the shutdown hooks, giving up after `shutdown_timeout` seconds."""
+        worker = threading.Thread(target=self._run_hooks, name="supervisor-shutdown", daemon=True)
+        worker.start()
+        worker.join(self.shutdown_timeout)
+        if worker.is_alive():
+            logger.error(f"Shutdown hooks did not complete within {self.shutdown_timeout} seconds.")
+
+    def _run_hooks(self):
+        for hook in reversed(self._hooks):
+            try:
+                hook()
+            except Exception:
+                logger.exception(f"Shutdown hook {hook!r} failed.")
+
+    def _handle_signal(self, signum: int):
+        if signum in self.stop_signals:
+            logger.info(f"Received signal {signum}.")
+            self.stop_event.set()
+        elif signum in self._signal_handlers:
+            try:
+                self._signal_handlers[signum]()
+            except Exception:
+                logger.exception(f"Handler for signal {signum} failed.")
+
+    def _wake(self, value: int):
+        try:
+            self._writer.send(bytes([value]))
+        except (BlockingIOError, OSError):
+            # The loop is already awake with pending bytes to read
+            pass
+
+    def _install_signal_handlers(self):
+        """Route signals through the wake-up socket. Only possible from the main thread."""
+        if threading.current_thread() is not threading.main_thread():
+            return None
+        previous_fd = signal.set_wakeup_fd(self._writer.fileno(), warn_on_full_buffer=False)
+        previous_handlers = {}
+        for signum in self.stop_signals + tuple(self._signal_handlers):
+            # The handler itself does nothing: the C-level handler writes the signal number to the wake-up fd
+            previous_handlers[signum] = signal.signal(signum, lambda *_: None)
+        return previous_fd, previous_handlers
+
+    @staticmethod
+    def _restore_signal_handlers(previous):
+        if previous is None:
+            return
+        previous_fd, previous_handlers = previous
+        signal.set_wakeup_fd(previous_fd)
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
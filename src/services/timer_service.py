@@ -0,0 +1,257 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+from src.services.metrics import REGISTRY
+
+logger = logging.getLogger("TimerService")
+
+TIMER_LAG = REGISTRY.histogram("connector_timer_lag_seconds", "Delay between a timer deadline and its callback.")
+
+
+class Timer:
+    """Handle on a scheduled callback."""
+
+    __slots__ = ("deadline", "callback", "args", "done", "_service")
+
+    def __init__(self, service, deadline: float, callback: Callable, args: tuple):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        # Set once the callback has run or has been cancelled
+        self.done = False
+        self._service = service
+
+    @property
+    def active(self) -> bool:
+        return not self.done
+
+    def cancel(self):
+        """Cancel the callback in O(1). Does nothing if it already ran."""
+        self._service._cancel(self)
+
+
+class _TimerStats:
+    """Counters shared by the timer service implementations."""
+
+    def __init__(self):
+        self._pending = 0
+        self._fired = 0
+        self._cancelled = 0
+        self._lateness_total = 0.0
+        self._lateness_max = 0.0
+        self._stats_lock = threading.Lock()
+
+    def pending(self) -> int:
+        """Number of scheduled callbacks that are neither run nor cancelled."""
+        return self._pending
+
+    def stats(self) -> dict:
+        """Pending/fired/cancelled counts and how late callbacks ran compared to their deadline."""
+        with self._stats_lock:
+            return {
+                "pending": self._pending,
+                "fired": self._fired,
+                "cancelled": self._cancelled,
+                "lateness_ms_avg": self._lateness_total / self._fired * 1000 if self._fired else 0.0,
+                "lateness_ms_max": self._lateness_max * 1000,
+            }
+
+    def collect_metrics(self):
+        """Metrics collector, see MetricsRegistry.add_collector."""
+        stats = self.stats()
+        yield "connector_timers_pending", "gauge", "Scheduled timers not yet run.", {}, stats["pending"]
+        yield "connector_timers_fired_total", "counter", "Timer callbacks run.", {}, stats["fired"]
+        yield "connector_timers_cancelled_total", "counter", "Timers cancelled.", {}, stats["cancelled"]
+
+    def _count_scheduled(self):
+        with self._stats_lock:
+            self._pending += 1
+
+    def _cancel(self, timer: Timer):
+        with self._stats_lock:
+            if timer.done:
+                return
+            timer.done = True
+            self._pending -= 1
+            self._cancelled += 1
+        self._on_cancel(timer)
+
+    def _on_cancel(self, timer: Timer):
+        pass
+
+    def _fire(self, timer: Timer):
+        with self._stats_lock:
+            if timer.done:
+                return
+            timer.done = True
+            lateness = max(0.0, time.monotonic() - timer.deadline)
+            self._pending -= 1
+            self._fired += 1
+            self._lateness_total += lateness
+            self._lateness_max = max(self._lateness_max, lateness)
+        TIMER_LAG.observe(lateness)
+        try:
+            timer.callback(*timer.args)
+        except Exception:
+            logger.exception(f"Timer callback {timer.callback!r} failed")
+
+
+class TimerService(_TimerStats):
+    """
+    Run delayed callbacks from a single thread, ordered by a heap of `time.monotonic()` deadlines.
+
+    Cancelled timers are only flagged and dropped when they reach the top of the heap (or on compaction), so
+    cancelling is O(1). Callbacks run on the timer thread and must not block.
+    """
+
+    def __init__(self, name: str = "timer-service"):
+        """
+        Initialize TimerService.
+        :param name: Name of the timer thread.
+        """
+        super().__init__()
+        self.name = name
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._dead = 0
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Timer:
+        """Run `callback(*args)` in `delay` seconds."""
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_at(self, deadline: float, callback: Callable, *args) -> Timer:
+        """Run `callback(*args)` once `time.monotonic()` reaches `deadline`."""
+        timer = Timer(self, deadline, callback, args)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("TimerService is stopped.")
+            heapq.heappush(self._heap, (deadline, next(self._sequence), timer))
+            self._count_scheduled()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            if self._heap[0][2] is timer:
+                self._condition.notify()
+        return timer
+
+    def stop(self):
+        """Drop every pending callback and stop the timer thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _on_cancel(self, timer: Timer):
+        with self._condition:
+            self._dead += 1
+            # Keep the heap from filling up with cancelled entries
+            if self._dead > 64 and self._dead > len(self._heap) // 2:
+                self._heap = [entry for entry in self._heap if not entry[2].done]
+                heapq.heapify(self._heap)
+                self._dead = 0
+
+    def _run(self):
+        while True:
+            with self._condition:
+                timer = None
+                while timer is None:
+                    if self._stopped:
+                        return
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    deadline, _, candidate = self._heap[0]
+                    if candidate.done:
+                        heapq.heappop(self._heap)
+                        self._dead = max(0, self._dead - 1)
+                        continue
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        self._condition.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    timer = candidate
+            self._fire(timer)
+
+
+class AsyncioTimerService(_TimerStats):
+    """
+    TimerService interface backed by an asyncio loop's `call_at`, used by the asyncio runtime.
+    Cancelled timers keep their loop handle, which skips the callback when it fires.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+        self._waiting = []
+        # Pending timers, with their loop handle once scheduled on the loop
+        self._handles = {}
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def attach(self, loop):
+        """Bind to the running loop and schedule the callbacks registered before it started."""
+        with self._lock:
+            self.loop = loop
+            waiting, self._waiting = self._waiting, []
+        for timer in waiting:
+            self._schedule(timer)
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Timer:
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_at(self, deadline: float, callback: Callable, *args) -> Timer:
+        timer = Timer(self, deadline, callback, args)
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("TimerService is stopped.")
+            self._count_scheduled()
+            self._handles[timer] = None
+            if self.loop is None:
+                self._waiting.append(timer)
+                return timer
+        self._schedule(timer)
+        return timer
+
+    def stop(self):
+        """Drop every pending callback and cancel their loop handles."""
+        with self._lock:
+            self._stopped = True
+            pending = list(self._handles.items())
+            self._handles.clear()
+            self._waiting = []
+        for timer, _ in pending:
+            timer.cancel()
+        handles = [handle for _, handle in pending if handle is not None]
+        if handles and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(lambda: [handle.cancel() for handle in handles])
+            except RuntimeError:
+                # Closed meanwhile, the handles will never run
+                pass
+
+    def _on_cancel(self, timer: Timer):
+        with self._lock:
+            self._handles.pop(timer, None)
+
+    def _schedule(self, timer: Timer):
+        self.loop.call_soon_threadsafe(self._call_at, timer)
+
+    def _call_at(self, timer: Timer):
+        with self._lock:
+            if timer in self._handles:
+                # The default event loop clock is time.monotonic(), so deadlines can be used as-is
+                self._handles[timer] = self.loop.call_at(timer.deadline, self._run, timer)
+
+    def _run(self, timer: Timer):
+        with self._lock:
+            self._handles.pop(timer, None)
+        self._fire(timer)
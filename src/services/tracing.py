@@ -0,0 +1,161 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import List, Optional
+
+# Trace of the command being executed. A context variable rather than a thread local, so it follows commands into
+# asyncio tasks and the executor threads they hand blocking calls to (see BaseDevice.handle_command_async)
+_current: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "thread", "args")
+
+    def __init__(self, name: str, start: float, end: float, args: dict):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.thread = threading.current_thread().name
+        self.args = args
+
+
+class Trace:
+    """Spans of one command, from its receipt by the MQTT client to the end of its handler."""
+
+    __slots__ = ("trace_id", "tracer", "device", "command", "start", "end", "status", "spans")
+
+    def __init__(self, tracer: "Tracer", trace_id: int, device: str, command: str, start: float):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.device = device
+        self.command = command
+        # time.monotonic(), the clock paho timestamps received messages with
+        self.start = start
+        self.end = None
+        self.status = None
+        self.spans: List[Span] = []
+
+    def add_span(self, name: str, start: float, end: float, **args):
+        self.spans.append(Span(name, start, end, args))
+
+    def finish(self, status: str = "ok"):
+        """Close the trace and move it to the tracer's ring buffer."""
+        if self.end is not None:
+            return
+        self.end = time.monotonic()
+        self.status = status
+        self.tracer._store(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "device": self.device,
+            "command": self.command,
+            "status": self.status,
+            "duration_ms": ((self.end or time.monotonic()) - self.start) * 1000,
+            "spans": [{"name": span.name, "offset_ms": (span.start - self.start) * 1000,
+                       "duration_ms": (span.end - span.start) * 1000, "thread": span.thread, **span.args}
+                      for span in self.spans],
+        }
+
+
+class Tracer:
+    """Keep the traces of the last `capacity` commands in a ring buffer."""
+
+    def __init__(self, capacity: int = 256):
+        self._traces = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, device: str, command: str, received_at: float = None) -> Trace:
+        """
+        Open the trace of a command.
+        :param device: Identifier of the target device.
+        :param command: Command payload.
+        :param received_at: time.monotonic() at which the MQTT client read the message, if known.
+        """
+        now = time.monotonic()
+        trace = Trace(self, next(self._ids), device, command, received_at if received_at else now)
+        if received_at:
+            trace.add_span("mqtt.receive", received_at, now)
+        return trace
+
+    def traces(self) -> List[Trace]:
+        """Completed traces, oldest first."""
+        with self._lock:
+            return list(self._traces)
+
+    def dump(self) -> List[dict]:
+        return [trace.to_dict() for trace in self.traces()]
+
+    def chrome_trace(self) -> dict:
+        """Completed traces in the Chrome trace event format (chrome://tracing, Perfetto), one row per command."""
+        events = []
+        for trace in self.traces():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": trace.trace_id,
+                           "args": {"name": f"{trace.device} {trace.command}"}})
+            events.append({"name": "command", "cat": trace.status, "ph": "X", "pid": 1, "tid": trace.trace_id,
+                           "ts": trace.start * 1e6, "dur": (trace.end - trace.start) * 1e6,
+                           "args": {"device": trace.device, "command": trace.command, "status": trace.status}})
+            for span in trace.spans:
+                events.append({"name": span.name, "ph": "X", "pid": 1, "tid": trace.trace_id,
+                               "ts": span.start * 1e6, "dur": (span.end - span.start) * 1e6,
+                               "args": {"thread": span.thread, **span.args}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        os.replace(tmp_path, path)
+
+    def _store(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def _execute(trace: Trace):
+    started = time.monotonic()
+    trace.add_span("queue", trace.start, started)
+    token = _current.set(trace)
+    status = "error"
+    try:
+        yield trace
+        status = "ok"
+    finally:
+        _current.reset(token)
+        trace.add_span("device.handle_command", started, time.monotonic())
+        trace.finish(status)
+
+
+def execution(trace: Optional[Trace]):
+    """
+    Context manager around a command handler: makes `trace` current for span(), records the time the command
+    waited and the handler duration, then finishes the trace. Does nothing if `trace` is None.
+    """
+    return _execute(trace) if trace is not None else nullcontext()
+
+
+@contextmanager
+def _span(trace: Trace, name: str, args: dict):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.monotonic(), **args)
+
+
+def span(name: str, **args):
+    """Record a span in the current trace, if a traced command is being executed."""
+    trace = _current.get()
+    return _span(trace, name, args) if trace is not None else nullcontext()
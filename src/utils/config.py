@@ -1,9 +1,231 @@
+import json
+import logging
 import os
+import socket
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
 
 import yaml
-from pathlib import Path
 
-def get_config():
-    with open(Path(os.getcwd(), "conf", "default.yaml"), 'r') as f:
-        config = yaml.load(f, Loader=yaml.Loader)
-    return config
\ No newline at end of file
+try:
+    # libyaml bindings, several times faster than the pure Python loader
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+logger = logging.getLogger("Config")
+
+DEFAULT_PATH = Path(os.getcwd(), "conf", "default.yaml")
+
+# Overrides the node name, e.g. to run several nodes of a shared configuration on one machine
+NODE_ENV = "HA_RPI_NODE"
+
+# Bumped whenever compile_config() changes its output, invalidating the cached compiled configs
+CACHE_VERSION = 4
+
+# Top-level sections and the type of their value
+SECTIONS = {
+    "devices": list,
+    "mqtt": dict,
+    "mock_gpio": bool,
+    "runtime": str,
+    "shutdown_timeout": (int, float),
+    "status_interval": (int, float),
+    "executor_workers": int,
+    "commands": dict,
+    "logging": dict,
+    "tracing": dict,
+    "discovery": dict,
+    "metrics": dict,
+    "reload": dict,
+    "node": dict,
+}
+RUNTIMES = ("threaded", "asyncio")
+DEVICE_KEYS = {"id", "class", "gpio", "env", "node", "availability"}
+PIN_KEYS = {"name", "type", "gpio", "default", "debounce"}
+PIN_TYPES = ("input", "output")
+PIN_LEVELS = ("high", "low")
+# Availability of a device: the bridge availability topic, or a topic of its own
+AVAILABILITY_MODES = ("bridge", "device")
+
+
+def get_config(path=DEFAULT_PATH, cache_path=None) -> Mapping[str, Any]:
+    """
+    Load, validate and freeze the configuration file.
+    :param path: YAML configuration file.
+    :param cache_path: File keeping the compiled configuration, reused while `path` is unchanged. `.<name>.cache`
+                       next to `path` if None, no cache if False.
+    """
+    path = Path(path)
+    if cache_path is None:
+        cache_path = path.with_name(f".{path.name}.cache")
+    stat = os.stat(path)
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size, CACHE_VERSION)
+    compiled = _load_cache(cache_path, key) if cache_path else None
+    if compiled is None:
+        with open(path, "r") as f:
+            compiled = compile_config(yaml.load(f, Loader=SafeLoader))
+        if cache_path:
+            _save_cache(cache_path, key, compiled)
+    return freeze(compiled)
+
+
+def compile_config(raw) -> Dict[str, Any]:
+    """Validate a parsed configuration and fill in the defaults. Raises ValueError naming the offending entry."""
+    if not isinstance(raw, dict):
+        raise ValueError("Configuration must be a mapping.")
+    config = dict(raw)
+    for section, value in config.items():
+        if section not in SECTIONS:
+            raise ValueError(f"Unknown configuration section '{section}'.")
+        _check_type(section, value, SECTIONS[section])
+    for section in ("devices", "mqtt"):
+        if section not in config:
+            raise ValueError(f"Missing configuration section '{section}'.")
+    if config.get("runtime", "threaded") not in RUNTIMES:
+        raise ValueError(f"runtime: expected one of {RUNTIMES}, got '{config['runtime']}'.")
+
+    mqtt = config["mqtt"]
+    _check_type("mqtt.host", mqtt.get("host"), str)
+    _check_type("mqtt.port", mqtt.get("port"), int)
+    config["mqtt"] = {"username": "", "password": "", **mqtt}
+
+    node = config.get("node", {})
+    if "name" in node:
+        _check_type("node.name", node["name"], str)
+    if "heartbeat" in node:
+        _check_type("node.heartbeat", node["heartbeat"], (int, float))
+
+    devices = [_compile_device(f"devices[{index}]", device) for index, device in enumerate(config["devices"])]
+    seen, owners = set(), {}
+    for index, device in enumerate(devices):
+        key = (device["class"], device["id"])
+        if key in seen:
+            raise ValueError(f"devices[{index}]: duplicate device {device['class']} {device['id']}.")
+        seen.add(key)
+        for pin in device["gpio"]:
+            # Pin numbers only clash on one node; devices without a node run on every node
+            for owner_node, owner in owners.setdefault(pin["gpio"], []):
+                if owner != key and (owner_node is None or device["node"] is None or owner_node == device["node"]):
+                    raise ValueError(f"devices[{index}]: GPIO pin {pin['gpio']} is already used by "
+                                     f"{owner[0]} {owner[1]}.")
+            owners[pin["gpio"]].append((device["node"], key))
+    config["devices"] = devices
+    return config
+
+
+def _compile_device(where: str, device) -> Dict[str, Any]:
+    _check_type(where, device, dict)
+    unknown = set(device) - DEVICE_KEYS
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {sorted(unknown)}.")
+    _check_type(f"{where}.id", device.get("id"), (int, str))
+    _check_type(f"{where}.class", device.get("class"), str)
+    _check_type(f"{where}.gpio", device.get("gpio", []), list)
+    _check_type(f"{where}.env", device.get("env", {}), dict)
+    if device.get("node") is not None:
+        _check_type(f"{where}.node", device["node"], str)
+    if device.get("availability", "bridge") not in AVAILABILITY_MODES:
+        raise ValueError(f"{where}.availability: expected one of {AVAILABILITY_MODES}, got {device['availability']!r}.")
+
+    pins, names = [], set()
+    for index, pin in enumerate(device.get("gpio", [])):
+        pin_where = f"{where}.gpio[{index}]"
+        _check_type(pin_where, pin, dict)
+        unknown = set(pin) - PIN_KEYS
+        if unknown:
+            raise ValueError(f"{pin_where}: unknown keys {sorted(unknown)}.")
+        _check_type(f"{pin_where}.name", pin.get("name"), str)
+        _check_type(f"{pin_where}.gpio", pin.get("gpio"), int)
+        if pin.get("type") not in PIN_TYPES:
+            raise ValueError(f"{pin_where}.type: expected one of {PIN_TYPES}, got {pin.get('type')!r}.")
+        if "default" in pin and pin["default"] not in PIN_LEVELS:
+            raise ValueError(f"{pin_where}.default: expected one of {PIN_LEVELS}, got {pin['default']!r}.")
+        if "debounce" in pin:
+            _check_type(f"{pin_where}.debounce", pin["debounce"], int)
+        if pin["name"] in names:
+            raise ValueError(f"{pin_where}: duplicate pin name '{pin['name']}'.")
+        names.add(pin["name"])
+        pins.append(dict(pin))
+    return {"id": device["id"], "class": device["class"], "gpio": pins, "env": dict(device.get("env", {})),
+            "node": device.get("node"), "availability": device.get("availability", "bridge")}
+
+
+def _check_type(where: str, value, expected):
+    # bool is an int subclass, but never a valid number of seconds or pin
+    if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+        names = " or ".join(t.__name__ for t in (expected if isinstance(expected, tuple) else (expected,)))
+        raise ValueError(f"{where}: expected {names}, got {value!r}.")
+
+
+def freeze(value):
+    """Read-only copy of a compiled configuration: mappings become mapping proxies and lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def node_name(config: Mapping[str, Any]) -> str:
+    """Name of this node: $HA_RPI_NODE, else `node.name`, else the host name."""
+    return os.environ.get(NODE_ENV) or config.get("node", {}).get("name") or socket.gethostname()
+
+
+def owned_config(config: Mapping[str, Any], node: str) -> Mapping[str, Any]:
+    """The configuration restricted to the devices of `node`, and those not assigned to any node."""
+    devices = tuple(device for device in config["devices"] if device.get("node") in (None, node))
+    return MappingProxyType({**config, "devices": devices})
+
+
+def device_key(device: Mapping[str, Any]) -> Tuple[str, Any]:
+    return device["class"], device["id"]
+
+
+def diff_devices(old: Mapping[str, Any], new: Mapping[str, Any]):
+    """Keys (class, id) of the devices added, removed and changed between two configurations."""
+    old_devices = {device_key(device): device for device in old["devices"]}
+    new_devices = {device_key(device): device for device in new["devices"]}
+    added = [key for key in new_devices if key not in old_devices]
+    removed = [key for key in old_devices if key not in new_devices]
+    changed = [key for key in new_devices if key in old_devices and new_devices[key] != old_devices[key]]
+    return added, removed, changed
+
+
+def changed_sections(old: Mapping[str, Any], new: Mapping[str, Any]) -> list:
+    """Top-level sections, devices excepted, that differ between two configurations."""
+    return sorted(section for section in set(old) | set(new)
+                  if section != "devices" and old.get(section) != new.get(section))
+
+
+def _load_cache(cache_path, key):
+    # JSON rather than pickle: whoever can write next to the configuration must not get to run code
+    try:
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable config cache {cache_path}: {e}")
+        return None
+    return cached["config"] if isinstance(cached, dict) and cached.get("key") == list(key) else None
+
+
+def _save_cache(cache_path, key, compiled: dict):
+    try:
+        data = json.dumps({"key": list(key), "config": compiled})
+    except (TypeError, ValueError):
+        # Values JSON cannot hold, e.g. YAML timestamps
+        return
+    if json.loads(data)["config"] != compiled:
+        # Non-string mapping keys would come back as strings
+        return
+    # Per process, nodes sharing the configuration on one machine may write the cache at the same time
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Failed to write config cache {cache_path}: {e}")
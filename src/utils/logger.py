@@ -1,17 +1,184 @@
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+FORMAT = '%(asctime)s :: %(levelname)s :: %(message)s'
+
+# The pipeline installed on the root logger, set up once per process
+_pipeline = None
+_setup_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per call site: at most `burst` records of one logging call at once, refilled at `rate` records per
+    second. Suppressed records are counted, and reported on the next record of the same call site let through.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 20, sample: int = 0, exempt_level: int = logging.ERROR,
+                 clock=time.monotonic):
+        """
+        Initialize RateLimitFilter.
+        :param rate: Records per second and call site let through once the burst is spent.
+        :param burst: Records of one call site let through at once.
+        :param sample: Also let through one in `sample` suppressed records, 0 to only rate limit.
+        :param exempt_level: Records at or above this level are never suppressed.
+        :param clock: Time source, for tests.
+        """
+        super().__init__()
+        if rate <= 0 or burst < 1 or sample < 0:
+            raise ValueError(f"Invalid rate limit: rate {rate}, burst {burst}, sample {sample}")
+        self.rate = rate
+        self.burst = burst
+        self.sample = sample
+        self.exempt_level = exempt_level
+        self.clock = clock
+        self.suppressed = 0
+        # (pathname, lineno) -> [tokens, last refill, suppressed since the last record let through]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.exempt_level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                if not self.sample or bucket[2] % self.sample:
+                    self.suppressed += 1
+                    return False
+                # Sampled: let this one through, reporting the ones suppressed before it
+                bucket[2] -= 1
+            else:
+                bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed and isinstance(record.msg, str):
+            record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Hand records to the writer thread without blocking: records arriving while the queue is full are dropped."""
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The writer thread formats the record, QueueHandler.prepare would do it here on the caller's thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Called under the handler lock, the counter needs no lock of its own
+            self.dropped += 1
+
+
+class _DrainingListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than failing on a full queue, so stop() flushes every queued record
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    Root logger handler queueing records for a background writer thread, which formats them and writes them to the
+    log file and the console. Logging calls never wait on the disk: records beyond the queue size are dropped and
+    high-frequency call sites are rate limited.
+    """
+
+    def __init__(self, handlers, queue_size: int = 10000, rate_limit: RateLimitFilter = None):
+        """
+        Initialize LogPipeline.
+        :param handlers: Handlers run on the writer thread, each with its own level and formatter.
+        :param queue_size: Records waiting for the writer beyond which new ones are dropped.
+        :param rate_limit: Filter applied before queueing, none if None.
+        """
+        self.handlers = list(handlers)
+        self.handler = DroppingQueueHandler(queue.Queue(queue_size))
+        self.rate_limit = rate_limit
+        if rate_limit is not None:
+            self.handler.addFilter(rate_limit)
+        self._listener = _DrainingListener(self.handler.queue, *self.handlers, respect_handler_level=True)
+
+    def start(self):
+        self._listener.start()
+
+    def stop(self):
+        """Write the queued records and stop the writer thread."""
+        if self._listener._thread is not None:
+            self._listener.stop()
+        for handler in self.handlers:
+            handler.flush()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "suppressed": self.rate_limit.suppressed if self.rate_limit is not None else 0,
+        }
+
+    def collect_metrics(self):
+        """Metrics collector, see MetricsRegistry."""
+        stats = self.stats()
+        yield "connector_log_records_queued", "gauge", "Log records waiting for the writer thread.", {}, \
+            stats["queued"]
+        yield "connector_log_records_dropped_total", "counter", "Log records dropped on a full queue.", {}, \
+            stats["dropped"]
+        yield "connector_log_records_suppressed_total", "counter", "Log records suppressed by the rate limit.", {}, \
+            stats["suppressed"]
+
+
+def setup_logging(name: str, config: dict = None) -> LogPipeline:
+    """
+    Route the root logger through a LogPipeline writing to `<name>.log` and the console. Only the first call
+    configures logging, later ones return the pipeline already installed.
+    :param name: Base name of the log file.
+    :param config: `logging` configuration section, see the README.
+    """
+    global _pipeline
+    with _setup_lock:
+        if _pipeline is not None:
+            return _pipeline
+        config = config or {}
+        formatter = logging.Formatter(FORMAT)
+        file_handler = RotatingFileHandler(config.get("file", f"{name}.log"), 'a', config.get("max_bytes", 1000000),
+                                           config.get("backup_count", 3))
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        rate_limit = config.get("rate_limit", {})
+        pipeline = LogPipeline(
+            [file_handler, stream_handler],
+            queue_size=config.get("queue_size", 10000),
+            rate_limit=RateLimitFilter(rate=rate_limit.get("rate", 5.0), burst=rate_limit.get("burst", 20),
+                                       sample=rate_limit.get("sample", 0))
+            if rate_limit.get("enabled", True) else None,
+        )
+        root = logging.getLogger()
+        root.setLevel(config.get("level", "INFO").upper())
+        # Per subsystem levels, keyed by logger name (MQTTService, GPIOService...)
+        for logger_name, level in config.get("levels", {}).items():
+            logging.getLogger(logger_name).setLevel(level.upper())
+        root.addHandler(pipeline.handler)
+        pipeline.start()
+        _pipeline = pipeline
+        return pipeline
 
 
 def get_logger(name: str) -> logging.Logger:
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s :: %(levelname)s :: %(message)s')
-    file_handler = RotatingFileHandler(f"{name}.log", 'a', 1000000, 3)
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-    stream_handler = logging.StreamHandler()
-    stream_handler.setLevel(logging.DEBUG)
-    if len(logger.handlers) == 0:
-        logger.addHandler(file_handler)
-        logger.addHandler(stream_handler)
-    return logger
\ No newline at end of file
+    setup_logging(name)
+    return logging.getLogger(name)
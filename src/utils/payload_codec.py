@@ -0,0 +1,77 @@
+from enum import Enum
+from types import MappingProxyType
+from typing import Callable, Optional, Type, Union
+
+from src.utils.payload_loader import PayloadLoader
+
+
+class PayloadCodec:
+    """
+    Payloads of one device class, compiled once from payloads.yaml: incoming command payloads (bytes or str) map
+    directly to members of a command enum, and every state has its payload encoded to bytes ready to publish.
+    """
+
+    __slots__ = ("category", "commands", "states", "state_format", "payloads", "_decode", "_encoded")
+
+    def __init__(self, category: str, commands: Type[Enum] = None, states: Type[Enum] = None,
+                 state_format: Callable[[str], str] = None):
+        """
+        Initialize PayloadCodec and register it with PayloadLoader.
+        :param category: Section of payloads.yaml.
+        :param commands: Enum of the accepted commands, valued with their payload keys.
+        :param states: Enum of the published states, valued with their payload keys.
+        :param state_format: Builds the published document from a state payload, the payload itself if None.
+        """
+        self.category = category
+        self.commands = commands
+        self.states = states
+        self.state_format = state_format
+        self.payloads = None
+        self._decode = None
+        self._encoded = None
+        PayloadLoader.register(self)
+
+    def compile(self, payloads: dict):
+        """Build the lookup tables from the loaded payloads. Raises ValueError if a payload is missing."""
+        section = payloads.get(self.category) or {}
+        members = list(self.commands or ()) + list(self.states or ())
+        missing = sorted({member.value for member in members if section.get(member.value) is None})
+        if missing:
+            raise ValueError(f"Missing payloads {missing} in section '{self.category}' of payloads.yaml.")
+        # Bare ON/OFF/yes/no values are read as booleans by YAML
+        booleans = sorted({member.value for member in members if isinstance(section[member.value], bool)})
+        if booleans:
+            raise ValueError(f"Payloads {booleans} in section '{self.category}' of payloads.yaml must be quoted.")
+
+        decode = {}
+        for command in self.commands or ():
+            payload = str(section[command.value])
+            if payload in decode:
+                raise ValueError(f"Payload '{payload}' of '{self.category}' is used by more than one command.")
+            decode[payload] = command
+            decode[payload.encode()] = command
+        state_format = self.state_format or str
+        self.payloads = MappingProxyType({member.value: str(section[member.value]) for member in members})
+        self._encoded = MappingProxyType({state: state_format(str(section[state.value])).encode()
+                                          for state in self.states or ()})
+        self._decode = MappingProxyType(decode)
+
+    def decode(self, payload: Union[bytes, str, Enum]) -> Optional[Enum]:
+        """Command of a payload, None if the payload is not a known command. Commands are returned as is."""
+        if type(payload) is self.commands:
+            return payload
+        if self._decode is None:
+            PayloadLoader.load_payloads()
+        return self._decode.get(payload)
+
+    def encode(self, state: Enum) -> bytes:
+        """Payload of a state, ready to publish."""
+        if self._encoded is None:
+            PayloadLoader.load_payloads()
+        return self._encoded[state]
+
+    def payload(self, member: Enum) -> str:
+        """Text payload of a command or state, for discovery configs."""
+        if self.payloads is None:
+            PayloadLoader.load_payloads()
+        return self.payloads[member.value]
@@ -5,13 +5,18 @@ import yaml
 
 class PayloadLoader:
     _payloads = None
+    # PayloadCodec instances, compiled when the payloads are loaded
+    _codecs = []
 
     @classmethod
     def load_payloads(cls, file_path=Path(os.getcwd(), "conf", "payloads.yaml")):
-        """Load payloads from the YAML file."""
+        """Load payloads from the YAML file and compile the registered codecs, failing on missing payloads."""
         if cls._payloads is None:
             with open(file_path, "r") as f:
-                cls._payloads = yaml.safe_load(f)
+                payloads = yaml.safe_load(f)
+            for codec in cls._codecs:
+                codec.compile(payloads)
+            cls._payloads = payloads
         return cls._payloads
 
     @classmethod
@@ -19,3 +24,10 @@ class PayloadLoader:
         """Retrieve a specific payload."""
         payloads = cls.load_payloads()
         return payloads.get(category, {}).get(key)
+
+    @classmethod
+    def register(cls, codec):
+        """Compile `codec` with the payloads, now if they are already loaded or else when they are."""
+        cls._codecs.append(codec)
+        if cls._payloads is not None:
+            codec.compile(cls._payloads)
@@ -1,3 +1,6 @@
 # config.py
-MQTT_BROKER_URL = 'localhost'
-MQTT_BROKER_PORT = 1883
\ No newline at end of file
+import os
+
+# External broker (e.g. mosquitto from docker-compose.yml), the in-process tests.mqtt_broker is used if unset
+MQTT_BROKER_URL = os.environ.get("MQTT_BROKER_URL")
+MQTT_BROKER_PORT = int(os.environ.get("MQTT_BROKER_PORT", 1883))
@@ -0,0 +1,22 @@
+import time
+
+import pytest
+
+from tests.mqtt_broker import MQTTBroker
+
+
+def wait_until(predicate, timeout=5, interval=0.02) -> bool:
+    """Poll `predicate` until it holds or `timeout` seconds passed. Returns whether it held."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return False
+
+
+@pytest.fixture
+def mqtt_broker():
+    """In-process MQTT broker on a free port."""
+    with MQTTBroker() as broker:
+        yield broker
@@ -0,0 +1,44 @@
+from unittest.mock import Mock
+
+from src.services.mqtt_service import MQTTService
+from tests.integration.conftest import wait_until
+from tests.mqtt_broker import MQTTBroker
+
+BRIDGE = "ha-rpi-connector/pi-a/availability"
+
+
+def device(device_id, availability_topic):
+    device = Mock()
+    device.device_class = "light"
+    device.device_id = device_id
+    device.identifier.return_value = f"light_{device_id}"
+    device.get_topic.side_effect = lambda kind: availability_topic if kind == "availability" else \
+        f"light/{device_id}/{kind}"
+    device.get_status.return_value = "ON"
+    return device
+
+
+def test_bridge_availability_is_the_last_will():
+    """Test one availability message per start and stop, and the broker marking the bridge offline on a crash."""
+    devices = [device(index, BRIDGE) for index in range(1, 11)] + [device(11, "light/11/availability")]
+    with MQTTBroker() as broker:
+        published = []
+        broker.add_hook(lambda event, client_id, topic, payload, timestamp:
+                        published.append((topic, payload)) if event == "received" else None)
+        service = MQTTService(broker.host, broker.port, "", "", devices=devices, interval=0, client_id="pi-a",
+                              availability_topic=BRIDGE)
+        service.start()
+        try:
+            assert service.ready.wait(5)
+            assert wait_until(lambda: len(published) == 2)
+            assert sorted(published) == [(BRIDGE, b"online"), ("light/11/availability", b"online")]
+
+            # Connection lost without a goodbye, as if the process died: the broker publishes the will
+            broker.disconnect_client("pi-a")
+            assert wait_until(lambda: broker.retained.get(BRIDGE, (None,))[0] == b"offline")
+            assert wait_until(lambda: broker.retained[BRIDGE][0] == b"online")
+        finally:
+            service.stop()
+
+        assert broker.retained[BRIDGE][0] == b"offline"
+        assert broker.retained["light/11/availability"][0] == b"offline"
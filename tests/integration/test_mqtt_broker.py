@@ -0,0 +1,187 @@
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from src.services.mqtt_service import MQTTService
+from tests.mqtt_broker import MQTTBroker, topic_matches
+
+
+class Client:
+    """paho client collecting the messages it receives."""
+
+    def __init__(self, broker, client_id="", clean_session=True, will=None):
+        self.messages = []
+        self.received = threading.Condition()
+        self.client = mqtt.Client(client_id=client_id, clean_session=clean_session)
+        self.client.on_message = self._on_message
+        if will:
+            self.client.will_set(*will)
+        self.broker = broker
+
+    def connect(self):
+        connected = threading.Event()
+        self.client.on_connect = lambda *args: connected.set()
+        self.client.connect(self.broker.host, self.broker.port)
+        self.client.loop_start()
+        assert connected.wait(2)
+        return self
+
+    def disconnect(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def wait_for(self, count, timeout=2):
+        with self.received:
+            return self.received.wait_for(lambda: len(self.messages) >= count, timeout)
+
+    def _on_message(self, client, userdata, msg):
+        with self.received:
+            self.messages.append((msg.topic, msg.payload, msg.qos, msg.retain))
+            self.received.notify_all()
+
+
+@pytest.mark.parametrize("topic_filter, topic, expected", [
+    ("garage/+/set", "garage/1/set", True),
+    ("garage/#", "garage/1/set", True),
+    ("#", "garage", True),
+    ("+/+/set", "garage/1/status", False),
+    ("garage/+", "garage/1/set", False),
+    ("#", "$SYS/uptime", False),
+])
+def test_topic_matches(topic_filter, topic, expected):
+    assert topic_matches(topic_filter, topic) is expected
+
+
+@pytest.mark.parametrize("qos", [0, 1, 2])
+def test_broker_delivers_each_qos(mqtt_broker, qos):
+    subscriber = Client(mqtt_broker).connect()
+    publisher = Client(mqtt_broker).connect()
+    subscriber.client.subscribe("+/+/set", qos=qos)
+    time.sleep(0.1)
+
+    for i in range(10):
+        publisher.client.publish(f"light/{i}/set", str(i), qos=qos)
+
+    assert subscriber.wait_for(10)
+    assert [payload for _, payload, _, _ in subscriber.messages] == [str(i).encode() for i in range(10)]
+    assert {message_qos for _, _, message_qos, _ in subscriber.messages} == {qos}
+    subscriber.disconnect()
+    publisher.disconnect()
+
+
+def test_broker_retained_messages(mqtt_broker):
+    publisher = Client(mqtt_broker).connect()
+    publisher.client.publish("light/1/status", "ON", qos=1, retain=True).wait_for_publish(2)
+    publisher.client.publish("light/2/status", "OFF", qos=1, retain=True).wait_for_publish(2)
+    publisher.client.publish("light/2/status", "", qos=1, retain=True).wait_for_publish(2)
+
+    subscriber = Client(mqtt_broker).connect()
+    subscriber.client.subscribe("light/+/status", qos=1)
+
+    assert subscriber.wait_for(1)
+    time.sleep(0.1)
+    assert subscriber.messages == [("light/1/status", b"ON", 1, True)]
+
+
+def test_broker_persistent_session(mqtt_broker):
+    """Test QoS 1 messages published while a persistent client is offline are delivered when it comes back."""
+    subscriber = Client(mqtt_broker, client_id="connector", clean_session=False).connect()
+    subscriber.client.subscribe("garage/1/set", qos=1)
+    time.sleep(0.1)
+    subscriber.disconnect()
+
+    publisher = Client(mqtt_broker).connect()
+    publisher.client.publish("garage/1/set", "OPEN", qos=1).wait_for_publish(2)
+
+    subscriber = Client(mqtt_broker, client_id="connector", clean_session=False).connect()
+    assert subscriber.wait_for(1)
+    assert subscriber.messages[0][:2] == ("garage/1/set", b"OPEN")
+
+
+def test_broker_last_will(mqtt_broker):
+    observer = Client(mqtt_broker).connect()
+    observer.client.subscribe("connector/availability", qos=1)
+    Client(mqtt_broker, client_id="connector", will=("connector/availability", "offline", 1, True)).connect()
+    time.sleep(0.1)
+
+    mqtt_broker.disconnect_client("connector")
+
+    assert observer.wait_for(1)
+    assert observer.messages[0][:2] == ("connector/availability", b"offline")
+    assert mqtt_broker.retained["connector/availability"] == (b"offline", 1)
+
+
+def test_broker_drops_and_retries():
+    """Test dropped QoS 1 deliveries are retried, dropped QoS 0 ones are lost."""
+    with MQTTBroker(drop_rate=0.5, retry_interval=0.05, seed=1) as broker:
+        subscriber = Client(broker).connect()
+        subscriber.client.subscribe("qos1/#", qos=1)
+        subscriber.client.subscribe("qos0/#", qos=0)
+        publisher = Client(broker).connect()
+        time.sleep(0.1)
+
+        for i in range(20):
+            publisher.client.publish(f"qos1/{i}", str(i), qos=1)
+            publisher.client.publish(f"qos0/{i}", str(i), qos=0)
+        time.sleep(1)
+
+        topics = [topic for topic, _, _, _ in subscriber.messages]
+        assert len([topic for topic in topics if topic.startswith("qos1/")]) == 20
+        assert len([topic for topic in topics if topic.startswith("qos0/")]) < 20
+        assert broker.dropped > 0
+
+
+def test_broker_latency():
+    with MQTTBroker(latency=0.1) as broker:
+        subscriber = Client(broker).connect()
+        subscriber.client.subscribe("ping", qos=0)
+        time.sleep(0.3)
+
+        start = time.perf_counter()
+        subscriber.client.publish("ping", "1")
+        assert subscriber.wait_for(1)
+        assert time.perf_counter() - start >= 0.1
+
+
+def test_mqtt_service_command_latency(mqtt_broker):
+    """Test a command goes end-to-end over TCP, timed with the broker hooks."""
+    timings = {}
+    mqtt_broker.add_hook(lambda event, client_id, topic, payload, timestamp:
+                         timings.setdefault(event, timestamp) if topic == "light/1/set" else None)
+    handled = threading.Event()
+
+    class Light:
+        device_class = "light"
+        device_id = 1
+        topics = {"command": "light/1/set", "status": "light/1/status", "availability": "light/1/availability"}
+
+        def get_topic(self, topic_type):
+            return self.topics[topic_type]
+
+        def identifier(self):
+            return "light_1"
+
+        def get_status(self):
+            return "OFF"
+
+        def decode_command(self, payload):
+            return payload.decode()
+
+        def handle_command(self, command):
+            timings["handled"] = time.perf_counter()
+            handled.set()
+
+    service = MQTTService(host=mqtt_broker.host, port=mqtt_broker.port, username="", password="", devices=[Light()],
+                          interval=0)
+    service.start()
+    time.sleep(0.3)
+    publisher = Client(mqtt_broker).connect()
+    publisher.client.publish("light/1/set", '{"state": "ON"}', qos=1)
+
+    assert handled.wait(2)
+    assert timings["received"] <= timings["delivered"] <= timings["handled"]
+    assert timings["handled"] - timings["received"] < 0.5
+    service.stop()
+    publisher.disconnect()
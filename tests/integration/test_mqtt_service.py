@@ -5,25 +5,43 @@ from unittest.mock import MagicMock, Mock
 import paho.mqtt.client as mqtt
 
 from src.devices.garage import GarageDevice
+from src.enums.payload_enums import GarageCommand
 from src.services.gpio_service import GPIOService
 from src.services.mqtt_service import MQTTService
+from tests.mqtt_broker import MQTTBroker
 from .config import MQTT_BROKER_URL, MQTT_BROKER_PORT
 
 class TestMQTTServiceIntegration(unittest.TestCase):
 
     def setUp(self):
+        self.broker = None
+        if MQTT_BROKER_URL:
+            self.broker_host, self.broker_port = MQTT_BROKER_URL, MQTT_BROKER_PORT
+        else:
+            self.broker = MQTTBroker().start()
+            self.broker_host, self.broker_port = self.broker.host, self.broker.port
+
         # Set up MQTT client
         self.mqtt_client = mqtt.Client()
         self.mqtt_client.on_message = self.on_message
-        self.mqtt_client.connect(MQTT_BROKER_URL, MQTT_BROKER_PORT, 60)
+        self.mqtt_client.connect(self.broker_host, self.broker_port, 60)
         self.mqtt_client.loop_start()
 
-        self.gpio_service = GPIOService(devices=[], mock_gpio=True)
+        self.gpio_service = GPIOService(devices=[{
+            "id": 1,
+            "class": "garage",
+            "gpio": [
+                {"name": "status", "type": "input", "gpio": 18},
+                {"name": "control", "type": "output", "gpio": 20, "default": "high"},
+            ],
+        }], mock_gpio=True)
         self.received_messages = []
 
     def tearDown(self):
         self.mqtt_client.loop_stop()
         self.mqtt_client.disconnect()
+        if self.broker is not None:
+            self.broker.stop()
 
     def on_message(self, client, userdata, message):
         # Handle incoming MQTT messages
@@ -35,12 +53,12 @@ class TestMQTTServiceIntegration(unittest.TestCase):
         """Test if commands from the broker are handled correctly by the service."""
 
         command_topic = "garage/1/set"
-        command_payload = "toggle"
+        command_payload = "OPEN"
 
         # Setup service with the device
         service = MQTTService(
-            host=MQTT_BROKER_URL,
-            port=MQTT_BROKER_PORT,
+            host=self.broker_host,
+            port=self.broker_port,
             username="",
             password="",
             devices=[],
@@ -62,8 +80,8 @@ class TestMQTTServiceIntegration(unittest.TestCase):
         self.mqtt_client.publish(command_topic, command_payload, qos=2)
 
         time.sleep(2)
-        # Check if the device received the correct command
-        assert device.handle_command.call_count == 1
+        # Check if the device received the correct command, decoded
+        device.handle_command.assert_called_once_with(GarageCommand.OPEN)
 
         service.stop()
 
@@ -74,8 +92,8 @@ class TestMQTTServiceIntegration(unittest.TestCase):
 
         # Setup service with the device
         service = MQTTService(
-            host=MQTT_BROKER_URL,
-            port=MQTT_BROKER_PORT,
+            host=self.broker_host,
+            port=self.broker_port,
             username="",
             password="",
             devices=[],
@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from tests.integration.conftest import wait_until
+
+ROOT = Path(__file__).resolve().parents[2]
+
+CONFIG = """
+mock_gpio: true
+status_interval: 0
+node: {{heartbeat: 1}}
+mqtt: {{host: {host}, port: {port}}}
+devices:
+  - id: 1
+    class: garage
+    node: pi-a
+    gpio: [{{name: status, type: input, gpio: 18}}, {{name: control, type: output, gpio: 20}}]
+  - id: 2
+    class: garage
+    node: pi-b
+    gpio: [{{name: status, type: input, gpio: 18}}, {{name: control, type: output, gpio: 20}}]
+"""
+
+
+def announcement(broker, node):
+    retained = broker.retained.get(f"ha-rpi-connector/nodes/{node}")
+    return json.loads(retained[0]) if retained else None
+
+
+@pytest.fixture
+def shared_config(tmp_path, mqtt_broker):
+    (tmp_path / "conf").mkdir()
+    shutil.copy(ROOT / "conf" / "payloads.yaml", tmp_path / "conf" / "payloads.yaml")
+    (tmp_path / "conf" / "default.yaml").write_text(CONFIG.format(host=mqtt_broker.host, port=mqtt_broker.port))
+    return tmp_path
+
+
+def test_nodes_share_one_configuration(shared_config, mqtt_broker):
+    """Test two connector processes on one machine each run their own devices of a shared configuration."""
+    nodes = {
+        node: subprocess.Popen([sys.executable, "-m", "src.main"], cwd=shared_config,
+                               env={**os.environ, "PYTHONPATH": str(ROOT), "HA_RPI_NODE": node},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for node in ("pi-a", "pi-b")
+    }
+    try:
+        assert wait_until(lambda: all(announcement(mqtt_broker, node) for node in nodes), timeout=10)
+        assert announcement(mqtt_broker, "pi-a")["devices"] == ["garage_1"]
+        assert announcement(mqtt_broker, "pi-b")["devices"] == ["garage_2"]
+        bridges = {f"ha-rpi-connector/{node}/availability" for node in nodes}
+        assert wait_until(lambda: bridges <= set(mqtt_broker.retained), timeout=10)
+        assert "garage/1/availability" not in mqtt_broker.retained
+    finally:
+        for process in nodes.values():
+            process.send_signal(signal.SIGTERM)
+        for process in nodes.values():
+            assert process.wait(10) == 0
+
+    assert announcement(mqtt_broker, "pi-a")["status"] == "offline"
+    assert mqtt_broker.retained["ha-rpi-connector/pi-b/availability"][0] == b"offline"
@@ -0,0 +1,36 @@
+from src.services.mqtt_service import MQTTService
+from src.services.outbound_spool import OutboundSpool
+from tests.integration.conftest import wait_until
+from tests.mqtt_broker import MQTTBroker
+
+
+def test_spooled_messages_are_replayed_after_a_restart(tmp_path):
+    """Test states published during an outage reach the broker after a restart, coalesced per topic."""
+    path = str(tmp_path / "outbound.spool")
+    broker = MQTTBroker().start()
+    port = broker.port
+    broker.stop()
+
+    # Outage: the broker is down, the process stops before it comes back
+    spool = OutboundSpool(path, sync_interval=0)
+    service = MQTTService("127.0.0.1", port, "", "", devices=[], interval=0, spool=spool, client_id="spool-test")
+    for state in ("opening", "open"):
+        service.publish("garage/1/status", state, kind="status")
+    service.publish("light/1/status", "ON", kind="status")
+    spool.close()
+
+    with MQTTBroker(port=port) as broker:
+        spool = OutboundSpool(path, sync_interval=0)
+        service = MQTTService("127.0.0.1", port, "", "", devices=[], interval=0, spool=spool, client_id="spool-test")
+        received = []
+        broker.add_hook(lambda event, client_id, topic, payload, timestamp:
+                        received.append((topic, payload)) if event == "received" else None)
+        service.start()
+        try:
+            assert wait_until(lambda: len(spool) == 0)
+        finally:
+            service.stop()
+            spool.close()
+
+    assert received == [("garage/1/status", b"open"), ("light/1/status", b"ON")]
+    assert broker.retained["garage/1/status"][0] == b"open"
@@ -0,0 +1,65 @@
+import time
+from unittest.mock import Mock
+
+import paho.mqtt.client as mqtt
+
+from src.services.backoff import Backoff
+from src.services.mqtt_service import MQTTService
+from tests.integration.conftest import wait_until
+from tests.mqtt_broker import MQTTBroker
+
+
+def command_device():
+    device = Mock()
+    device.device_class = "light"
+    device.device_id = 1
+    device.identifier.return_value = "light_1"
+    device.get_topic.side_effect = lambda kind: f"light/1/{'set' if kind == 'command' else kind}"
+    device.get_status.return_value = "ON"
+    device.decode_command.side_effect = bytes.decode
+    return device
+
+
+def send_command(port, payload):
+    client = mqtt.Client()
+    client.connect("127.0.0.1", port)
+    client.loop_start()
+    client.publish("light/1/set", payload, qos=1).wait_for_publish(2)
+    client.loop_stop()
+    client.disconnect()
+
+
+def test_service_starts_before_the_broker_and_resubscribes():
+    """Test the service starts with the broker down, and is ready for commands again after each outage."""
+    broker = MQTTBroker().start()
+    port = broker.port
+    broker.stop()
+
+    device = command_device()
+    service = MQTTService("127.0.0.1", port, "", "", devices=[device], interval=0, client_id="reconnect-test",
+                          backoff=Backoff(initial=0.1, maximum=0.4))
+    started = time.monotonic()
+    service.start()
+    try:
+        # start() returns at once, the connection is attempted in the background
+        assert time.monotonic() - started < 0.5
+        time.sleep(0.5)
+        assert not service.ready.is_set()
+
+        broker = MQTTBroker(port=port).start()
+        assert service.ready.wait(5)
+        assert 0.5 <= service.last_ready_latency < 5
+        send_command(port, "OFF")
+        assert wait_until(lambda: device.handle_command.call_count == 1)
+
+        broker.stop()
+        assert wait_until(lambda: not service.ready.is_set())
+        broker = MQTTBroker(port=port).start()
+        assert service.ready.wait(5)
+        assert service.last_ready_latency < 5
+        send_command(port, "ON")
+        assert wait_until(lambda: device.handle_command.call_count == 2)
+        assert service.connects == 2
+    finally:
+        service.stop()
+        broker.stop()
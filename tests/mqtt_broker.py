@@ -0,0 +1,453 @@
+"""
+Minimal in-process MQTT 3.1.1 broker, standing in for mosquitto in integration and load tests.
+
+Supports QoS 0-2, retained messages, `+`/`#` wildcards, persistent sessions (clean_session=False) and last wills.
+Latency and dropped deliveries can be injected, and hooks observe every message received from and delivered to
+the clients with a `time.perf_counter()` timestamp. Authentication is not checked and there is no TLS.
+"""
+import itertools
+import logging
+import queue
+import random
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("MQTTBroker")
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """Whether `topic` matches a subscription filter, with MQTT wildcard rules."""
+    if topic.startswith("$") and topic_filter[:1] in ("+", "#"):
+        return False
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def _encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _encode_string(value) -> bytes:
+    data = value.encode() if isinstance(value, str) else value
+    return struct.pack("!H", len(data)) + data
+
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([packet_type << 4 | flags]) + _encode_length(len(body)) + body
+
+
+def _publish_packet(topic: str, payload: bytes, qos: int, retain: bool, packet_id: int = None,
+                    dup: bool = False) -> bytes:
+    body = _encode_string(topic)
+    if qos:
+        body += struct.pack("!H", packet_id)
+    return _packet(PUBLISH, dup << 3 | qos << 1 | retain, body + payload)
+
+
+class _Reader:
+    """Field decoder over a packet body."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def uint16(self) -> int:
+        value = struct.unpack_from("!H", self.data, self.offset)[0]
+        self.offset += 2
+        return value
+
+    def byte(self) -> int:
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def binary(self) -> bytes:
+        length = self.uint16()
+        value = self.data[self.offset:self.offset + length]
+        self.offset += length
+        return value
+
+    def string(self) -> str:
+        return self.binary().decode()
+
+    def rest(self) -> bytes:
+        return self.data[self.offset:]
+
+
+class _Session:
+    """Subscriptions and undelivered messages of a client id, kept across connections unless clean."""
+
+    def __init__(self, client_id: str, clean: bool):
+        self.client_id = client_id
+        self.clean = clean
+        self.subscriptions: Dict[str, int] = {}
+        # Messages for an offline persistent session: (topic, payload, qos)
+        self.pending = deque()
+        # packet id -> [topic, payload, qos, state] where state is "publish" or "pubrel"
+        self.inflight: Dict[int, list] = {}
+        self.inbound_qos2 = set()
+        self.connection: Optional["_Connection"] = None
+        self._packet_ids = itertools.cycle(range(1, 65536))
+
+    def next_packet_id(self) -> int:
+        while True:
+            packet_id = next(self._packet_ids)
+            if packet_id not in self.inflight:
+                return packet_id
+
+
+class _Connection:
+    """One client socket: a reader thread handling packets and a writer thread applying the injected latency."""
+
+    def __init__(self, broker: "MQTTBroker", sock: socket.socket):
+        self.broker = broker
+        self.sock = sock
+        self.session: Optional[_Session] = None
+        self.will = None
+        self.closed = False
+        self._outbox = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="mqtt-broker-writer", daemon=True)
+        self._reader = threading.Thread(target=self._read_loop, name="mqtt-broker-reader", daemon=True)
+
+    def start(self):
+        self._writer.start()
+        self._reader.start()
+
+    def send(self, data: bytes):
+        self._outbox.put((time.monotonic() + self.broker.latency, data))
+
+    def close(self, publish_will: bool = False):
+        with self.broker.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.broker._connections.discard(self)
+            will, self.will = self.will, None
+            session = self.session
+            if session is not None and session.connection is self:
+                session.connection = None
+                if session.clean:
+                    self.broker.sessions.pop(session.client_id, None)
+        self._outbox.put(None)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        if publish_will and will is not None:
+            self.broker.route(*will, client_id=session.client_id if session else "")
+
+    def _recv_exact(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Connection closed by client")
+            data.extend(chunk)
+        return bytes(data)
+
+    def _read_packet(self):
+        header = self._recv_exact(1)[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = self._recv_exact(1)[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        return header >> 4, header & 0x0F, self._recv_exact(length) if length else b""
+
+    def _read_loop(self):
+        graceful = False
+        try:
+            packet_type, flags, body = self._read_packet()
+            if packet_type != CONNECT:
+                raise ConnectionError("First packet is not CONNECT")
+            self._on_connect(_Reader(body))
+            while not self.closed:
+                packet_type, flags, body = self._read_packet()
+                if packet_type == DISCONNECT:
+                    graceful = True
+                    return
+                self.broker.handle(self, packet_type, flags, _Reader(body))
+        except (OSError, ConnectionError, struct.error, IndexError, UnicodeDecodeError):
+            pass
+        finally:
+            self.close(publish_will=not graceful)
+
+    def _write_loop(self):
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                return
+            due, data = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                return
+
+    def _on_connect(self, reader: _Reader):
+        reader.string()  # Protocol name
+        reader.byte()  # Protocol level
+        flags = reader.byte()
+        keepalive = reader.uint16()
+        client_id = reader.string()
+        if flags & 0x04:
+            will_topic = reader.string()
+            will_payload = reader.binary()
+            self.will = (will_topic, will_payload, flags >> 3 & 0x03, bool(flags & 0x20))
+        if keepalive:
+            # The client is considered gone after 1.5 keepalive periods without a packet
+            self.sock.settimeout(keepalive * 1.5)
+        self.broker.connect(self, client_id or f"auto-{id(self)}", clean=bool(flags & 0x02))
+
+
+class MQTTBroker:
+    """
+    MQTT 3.1.1 broker running in background threads on 127.0.0.1.
+
+    :param port: Port to listen on, a free one if 0 (see `port` once started).
+    :param latency: Delay (seconds) added to every packet sent to the clients.
+    :param drop_rate: Probability of dropping a message delivered to a subscriber. Dropped QoS 1/2 messages are
+                      sent again, flagged DUP, after `retry_interval` seconds.
+    :param retry_interval: Time (seconds) before a dropped QoS 1/2 delivery is retried.
+    :param seed: Seed of the drop decisions, for reproducible runs.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, drop_rate: float = 0.0,
+                 retry_interval: float = 0.5, seed: int = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.retry_interval = retry_interval
+        self.lock = threading.RLock()
+        self.sessions: Dict[str, _Session] = {}
+        self.retained: Dict[str, tuple] = {}
+        self.dropped = 0
+        self._hooks: List[Callable] = []
+        self._random = random.Random(seed)
+        self._connections = set()
+        self._server = None
+        self._thread = None
+
+    def start(self) -> "MQTTBroker":
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept_loop, name="mqtt-broker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Close the listening socket and every client connection, without publishing the wills."""
+        if self._server is not None:
+            try:
+                # Wakes up the blocked accept(), close() alone does not
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._server.close()
+        with self.lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.close()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add_hook(self, hook: Callable):
+        """
+        Observe messages: `hook(event, client_id, topic, payload, timestamp)` where event is "received" (PUBLISH
+        from a client) or "delivered" (PUBLISH written for a subscriber) and timestamp is `time.perf_counter()`.
+        """
+        self._hooks.append(hook)
+
+    def disconnect_client(self, client_id: str):
+        """Drop a client's connection as if the network failed: its will is published."""
+        with self.lock:
+            session = self.sessions.get(client_id)
+            connection = session.connection if session else None
+        if connection is not None:
+            connection.close(publish_will=True)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = _Connection(self, sock)
+            with self.lock:
+                self._connections.add(connection)
+            connection.start()
+
+    def _emit(self, event: str, client_id: str, topic: str, payload: bytes):
+        timestamp = time.perf_counter()
+        for hook in self._hooks:
+            hook(event, client_id, topic, payload, timestamp)
+
+    def connect(self, connection: _Connection, client_id: str, clean: bool):
+        with self.lock:
+            session = self.sessions.get(client_id)
+            previous = session.connection if session else None
+            if session is None or clean or session.clean:
+                session_present = session is not None and not clean and not session.clean
+                session = self.sessions[client_id] = _Session(client_id, clean)
+            else:
+                session_present = True
+            session.connection = connection
+            connection.session = session
+            connection.send(_packet(CONNACK, 0, bytes([session_present, 0])))
+            if session_present:
+                # Resume the unacknowledged deliveries, then the messages queued while offline
+                for packet_id, (topic, payload, qos, state) in sorted(session.inflight.items()):
+                    if state == "pubrel":
+                        connection.send(_packet(PUBREL, 0x02, struct.pack("!H", packet_id)))
+                    else:
+                        connection.send(_publish_packet(topic, payload, qos, False, packet_id, dup=True))
+                while session.pending:
+                    self._deliver(session, *session.pending.popleft())
+        if previous is not None and previous is not connection:
+            previous.close()
+
+    def handle(self, connection: _Connection, packet_type: int, flags: int, reader: _Reader):
+        session = connection.session
+        if packet_type == PUBLISH:
+            qos = flags >> 1 & 0x03
+            topic = reader.string()
+            packet_id = reader.uint16() if qos else None
+            payload = reader.rest()
+            self._emit("received", session.client_id, topic, payload)
+            if qos == 2:
+                with self.lock:
+                    duplicate = packet_id in session.inbound_qos2
+                    session.inbound_qos2.add(packet_id)
+                if not duplicate:
+                    self.route(topic, payload, qos, bool(flags & 0x01), client_id=session.client_id)
+                connection.send(_packet(PUBREC, 0, struct.pack("!H", packet_id)))
+                return
+            self.route(topic, payload, qos, bool(flags & 0x01), client_id=session.client_id)
+            if qos == 1:
+                connection.send(_packet(PUBACK, 0, struct.pack("!H", packet_id)))
+        elif packet_type == PUBREL:
+            packet_id = reader.uint16()
+            with self.lock:
+                session.inbound_qos2.discard(packet_id)
+            connection.send(_packet(PUBCOMP, 0, struct.pack("!H", packet_id)))
+        elif packet_type in (PUBACK, PUBCOMP):
+            with self.lock:
+                session.inflight.pop(reader.uint16(), None)
+        elif packet_type == PUBREC:
+            packet_id = reader.uint16()
+            with self.lock:
+                if packet_id in session.inflight:
+                    session.inflight[packet_id][3] = "pubrel"
+            connection.send(_packet(PUBREL, 0x02, struct.pack("!H", packet_id)))
+        elif packet_type == SUBSCRIBE:
+            self._subscribe(connection, reader)
+        elif packet_type == UNSUBSCRIBE:
+            packet_id = reader.uint16()
+            with self.lock:
+                while reader.offset < len(reader.data):
+                    session.subscriptions.pop(reader.string(), None)
+            connection.send(_packet(UNSUBACK, 0, struct.pack("!H", packet_id)))
+        elif packet_type == PINGREQ:
+            connection.send(_packet(PINGRESP, 0, b""))
+
+    def _subscribe(self, connection: _Connection, reader: _Reader):
+        session = connection.session
+        packet_id = reader.uint16()
+        granted = []
+        with self.lock:
+            filters = []
+            while reader.offset < len(reader.data):
+                topic_filter = reader.string()
+                qos = min(reader.byte() & 0x03, 2)
+                session.subscriptions[topic_filter] = qos
+                filters.append((topic_filter, qos))
+                granted.append(qos)
+            connection.send(_packet(SUBACK, 0, struct.pack("!H", packet_id) + bytes(granted)))
+            for topic_filter, qos in filters:
+                for topic, (payload, retained_qos) in self.retained.items():
+                    if topic_matches(topic_filter, topic):
+                        self._deliver(session, topic, payload, min(qos, retained_qos), retain=True)
+
+    def route(self, topic: str, payload: bytes, qos: int, retain: bool, client_id: str = ""):
+        """Publish a message to the matching subscriptions, as if received from `client_id`."""
+        with self.lock:
+            if retain:
+                if payload:
+                    self.retained[topic] = (payload, qos)
+                else:
+                    self.retained.pop(topic, None)
+            for session in self.sessions.values():
+                granted = [sub_qos for topic_filter, sub_qos in session.subscriptions.items()
+                           if topic_matches(topic_filter, topic)]
+                if granted:
+                    self._deliver(session, topic, payload, min(qos, max(granted)))
+
+    def _deliver(self, session: _Session, topic: str, payload: bytes, qos: int, retain: bool = False):
+        connection = session.connection
+        if connection is None:
+            if qos and not session.clean:
+                session.pending.append((topic, payload, qos))
+            return
+        packet_id = None
+        if qos:
+            packet_id = session.next_packet_id()
+            session.inflight[packet_id] = [topic, payload, qos, "publish"]
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            self.dropped += 1
+            if qos:
+                timer = threading.Timer(self.retry_interval, self._retry, (session, packet_id, retain))
+                timer.daemon = True
+                timer.start()
+            return
+        connection.send(_publish_packet(topic, payload, qos, retain, packet_id))
+        self._emit("delivered", session.client_id, topic, payload)
+
+    def _retry(self, session: _Session, packet_id: int, retain: bool):
+        with self.lock:
+            message = session.inflight.get(packet_id)
+            connection = session.connection
+            if message is None or message[3] != "publish" or connection is None:
+                return
+            topic, payload, qos, _ = message
+            if self.drop_rate and self._random.random() < self.drop_rate:
+                self.dropped += 1
+                timer = threading.Timer(self.retry_interval, self._retry, (session, packet_id, retain))
+                timer.daemon = True
+                timer.start()
+                return
+            connection.send(_publish_packet(topic, payload, qos, retain, packet_id, dup=True))
+        self._emit("delivered", session.client_id, topic, payload)
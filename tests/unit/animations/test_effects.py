@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from src.animations.effects import EFFECTS, ChaserEffect, CometEffect, FadeEffect, GradientEffect, create_effect
+
+
+@pytest.mark.parametrize("name", sorted(EFFECTS))
+def test_effects_render_whole_frames(name):
+    """Every effect renders one RGB triplet per LED."""
+    effect = create_effect(name, 600)
+    for elapsed in (0.0, 0.3, 1.7):
+        frame = effect.render(elapsed)
+        assert frame.shape == (600, 3)
+        assert frame.dtype == np.uint8
+
+
+def test_create_effect_unknown():
+    with pytest.raises(ValueError) as excinfo:
+        create_effect("unknown", 10)
+    assert "Unsupported animation: unknown" in str(excinfo.value)
+
+
+def test_chaser_moves_one_pixel():
+    effect = ChaserEffect(10, color=(255, 0, 0), speed=10)
+    assert effect.duration == 1.0
+
+    frame = effect.render(0.35)
+    assert frame.any(axis=1).nonzero()[0].tolist() == [3]
+    assert frame[3].tolist() == [255, 0, 0]
+
+
+def test_gradient_endpoints():
+    frame = GradientEffect(5, start=(0, 0, 0), end=(200, 100, 0)).render(0)
+    assert frame[0].tolist() == [0, 0, 0]
+    assert frame[-1].tolist() == [200, 100, 0]
+
+
+def test_comet_head_is_brightest():
+    frame = CometEffect(50, color=(255, 255, 255), speed=10, tail=3).render(2.0)
+    assert int(frame.sum(axis=1).argmax()) == 20
+
+
+def test_fade_reaches_end_color():
+    effect = FadeEffect(3, start=(0, 0, 0), end=(255, 128, 0), duration=1.0)
+    assert effect.render(0).tolist() == [[0, 0, 0]] * 3
+    assert effect.render(2.0).tolist() == [[255, 128, 0]] * 3
+    # Halfway in linear light is brighter than halfway in channel values
+    assert effect.render(0.5)[0, 0] > 128
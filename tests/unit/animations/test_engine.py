@@ -0,0 +1,122 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from src.animations.effects import ChaserEffect, Effect, FadeEffect, RainbowEffect
+from src.animations.engine import AnimationEngine, to_packed
+from src.services.gpio_service import GPIOService
+
+
+class SlowEffect(Effect):
+    """Takes longer to render than a frame lasts."""
+
+    def render(self, elapsed: float) -> np.ndarray:
+        time.sleep(0.03)
+        return self.blank()
+
+
+@pytest.fixture
+def gpio_service():
+    service = GPIOService(devices=[], mock_gpio=True)
+    service.initialize_strip(12, 600)
+    return service
+
+
+def test_to_packed():
+    frame = to_packed(np.array([[1, 2, 3], [255, 0, 128]], dtype=np.uint8))
+    assert list(frame) == [0x010203, 0xFF0080]
+
+
+def test_engine_runs_at_fixed_rate(gpio_service):
+    """Test the engine keeps its frame rate and commits one show() per frame."""
+    engine = AnimationEngine(gpio_service, 12, fps=50)
+    engine.start(RainbowEffect(600))
+    time.sleep(0.5)
+    engine.stop()
+
+    stats = engine.stats()
+    assert not engine.is_running()
+    assert 35 <= stats["fps"] <= 55
+    assert stats["frames"] == gpio_service.show_counts[12]
+    assert stats["render_ms_avg"] > 0
+
+
+def test_engine_skips_late_frames(gpio_service):
+    """Test frames that cannot be rendered in time are skipped instead of drifting."""
+    engine = AnimationEngine(gpio_service, 12, fps=100)
+    engine.start(SlowEffect(600))
+    time.sleep(0.3)
+    engine.stop()
+
+    stats = engine.stats()
+    assert stats["skipped_frames"] > 0
+    assert stats["frames"] + stats["skipped_frames"] >= 25
+
+
+def test_engine_stops_finite_effects(gpio_service):
+    """Test effects with a duration end on their own."""
+    effect = RainbowEffect(600)
+    effect.duration = 0.1
+    finished = []
+    engine = AnimationEngine(gpio_service, 12, fps=50, on_finish=lambda: finished.append(engine.is_running()))
+    engine.start(effect)
+    time.sleep(0.3)
+
+    assert not engine.is_running()
+    assert engine.stats()["frames"] >= 4
+    assert finished == [False]
+
+
+def test_engine_restart_replaces_animation(gpio_service):
+    engine = AnimationEngine(gpio_service, 12, fps=50)
+    first = RainbowEffect(600)
+    engine.start(first)
+    engine.start(RainbowEffect(600))
+    time.sleep(0.1)
+
+    assert engine.is_running()
+    assert engine.effect is not first
+    assert engine.timers.pending() == 1
+    engine.stop()
+    assert engine.timers.pending() == 0
+
+
+def test_engine_renders_off_the_timer_thread(gpio_service):
+    """Test frames run on the animation thread, leaving the GPIO timers free for pulses and flashes."""
+    threads = []
+
+    class ThreadEffect(Effect):
+        def render(self, elapsed: float) -> np.ndarray:
+            threads.append(threading.current_thread().name)
+            return self.blank()
+
+    engine = AnimationEngine(gpio_service, 12, fps=50)
+    engine.start(ThreadEffect(600))
+    time.sleep(0.1)
+    engine.stop()
+
+    assert engine.timers is not gpio_service.timers
+    assert threads and set(threads) == {"animation"}
+
+
+def test_engine_clears_the_strip_when_an_effect_ends(gpio_service):
+    """Test the pixel of a chaser does not stay lit once it ran along the strip."""
+    engine = AnimationEngine(gpio_service, 12, fps=50)
+    engine.start(ChaserEffect(600, speed=6000))
+    time.sleep(0.3)
+
+    assert not engine.is_running()
+    assert not any(gpio_service.frames[12])
+    assert gpio_service.show_counts[12] == engine.stats()["frames"] + 1
+
+
+def test_engine_holds_the_color_of_a_fade(gpio_service):
+    """Test a fade keeps the strip on its target color once faded, instead of ending dark."""
+    engine = AnimationEngine(gpio_service, 12, fps=50)
+    engine.start(FadeEffect(600, start=(0, 0, 0), end=(255, 255, 255), duration=0.1))
+    time.sleep(0.3)
+
+    assert engine.is_running()
+    assert set(gpio_service.frames[12]) == {0xFFFFFF}
+    engine.stop()
@@ -1,8 +1,8 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
 from src.devices.garage import GarageDevice
 from src.enums.gpio_enums import GPIOType, GPIOState
-from src.utils.payload_loader import PayloadLoader
+from src.enums.payload_enums import GarageCommand
 
 
 class TestGarageDevice(unittest.TestCase):
@@ -37,38 +37,34 @@ class TestGarageDevice(unittest.TestCase):
             on_state_change=self.mock_state_change_callback,
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_generate_identifier(self, mock_payload_loader):
+    def test_generate_identifier(self):
         assert self.garage_device.identifier() == f"{self.device_class}_{self.device_id}"
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_open(self, mock_payload_loader):
+    def test_handle_command_open(self):
         # Simulate the "open" command
-        self.garage_device.handle_command(PayloadLoader.get("garage", "open"))
+        self.garage_device.handle_command(b"OPEN")
 
         # Assert that the GPIO control pin is toggled
         self.mock_gpio_service.toggle_pin.assert_called_once_with(self.control_pin, 0.5)
 
         # Assert that state change is notified
         self.mock_state_change_callback.assert_called_once_with(
-            self.device_class, self.device_id, "garage_state_opening"
+            self.device_class, self.device_id, b"opening"
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_close(self, mock_payload_loader):
+    def test_handle_command_close(self):
         # Simulate the "close" command
-        self.garage_device.handle_command(PayloadLoader.get("garage", "close"))
+        self.garage_device.handle_command("CLOSE")
 
         # Assert that the GPIO control pin is toggled
         self.mock_gpio_service.toggle_pin.assert_called_once_with(self.control_pin, 0.5)
 
         # Assert that state change is notified
         self.mock_state_change_callback.assert_called_once_with(
-            self.device_class, self.device_id, "garage_state_closing"
+            self.device_class, self.device_id, b"closing"
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_invalid(self, mock_payload_loader):
+    def test_handle_command_invalid(self):
         # Simulate an invalid command
         with self.assertRaises(ValueError) as context:
             self.garage_device.handle_command("invalid_command")
@@ -76,8 +72,7 @@ class TestGarageDevice(unittest.TestCase):
             str(context.exception), "Unknown command 'invalid_command' for GarageDevice 1."
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_get_status_open(self, mock_payload_loader):
+    def test_get_status_open(self):
         # Simulate the GPIO service returning HIGH (1) for the status pin
         self.mock_gpio_service.read_pin.return_value = 1
 
@@ -85,13 +80,12 @@ class TestGarageDevice(unittest.TestCase):
         status = self.garage_device.get_status()
 
         # Assert the correct state is returned
-        self.assertEqual(status, "garage_state_open")
+        self.assertEqual(status, b"open")
 
         # Assert the status pin is read
         self.mock_gpio_service.read_pin.assert_called_once_with(self.status_pin)
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_get_status_close(self, mock_payload_loader):
+    def test_get_status_close(self):
         # Simulate the GPIO service returning LOW (0) for the status pin
         self.mock_gpio_service.read_pin.return_value = 0
 
@@ -99,24 +93,47 @@ class TestGarageDevice(unittest.TestCase):
         status = self.garage_device.get_status()
 
         # Assert the correct state is returned
-        self.assertEqual(status, "garage_state_closed")
+        self.assertEqual(status, b"closed")
 
         # Assert the status pin is read
         self.mock_gpio_service.read_pin.assert_called_once_with(self.status_pin)
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_close(self, mock_payload_loader):
+    def test_handle_command_close(self):
         # Simulate the "close" command
-        self.garage_device.handle_command(PayloadLoader.get("garage", "close"))
+        self.garage_device.handle_command(GarageCommand.CLOSE)
 
         # Assert that the GPIO control pin is toggled
         self.mock_gpio_service.toggle_pin.assert_called_once_with(self.control_pin, 0.5)
 
         # Assert that state change is notified
         self.mock_state_change_callback.assert_called_once_with(
-            self.device_class, self.device_id, "garage_state_closing"
+            self.device_class, self.device_id, b"closing"
         )
 
+    def test_pins_are_resolved_at_construction(self):
+        self.assertEqual(self.garage_device.pins.control, self.control_pin)
+        self.assertEqual(self.garage_device.pins.status, self.status_pin)
+
+        # Later lookups do not go through the configuration anymore
+        self.mock_gpio_service.devices = []
+        self.assertEqual(self.garage_device._get_gpio("control"), self.control_pin)
+
+    def test_unknown_pin_raises(self):
+        with self.assertRaises(ValueError) as context:
+            self.garage_device._get_gpio("missing")
+        self.assertEqual(str(context.exception), "Pin 'missing' not found for device 1.")
+
+    def test_missing_required_pin_fails_at_construction(self):
+        self.config[0]["gpio"] = [gpio for gpio in self.config[0]["gpio"] if gpio["name"] != "control"]
+        with self.assertRaises(ValueError) as context:
+            GarageDevice(self.device_id, self.device_class, self.mock_gpio_service, self.mock_mqtt_service, Mock())
+        self.assertEqual(str(context.exception), "Pin 'control' not found for device 1.")
+
+    def test_missing_device_config_fails_at_construction(self):
+        with self.assertRaises(ValueError) as context:
+            GarageDevice(2, self.device_class, self.mock_gpio_service, self.mock_mqtt_service, Mock())
+        self.assertEqual(str(context.exception), "Device '2' not found.")
+
     def test_notify_state_change(self):
         # Call notify_state_change with a specific state
         self.garage_device.notify_state_change("custom_state")
@@ -1,9 +1,9 @@
 import json
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
 from src.devices.light import LightDevice
 from src.enums.gpio_enums import GPIOType, GPIOState
-from src.utils.payload_loader import PayloadLoader
+from src.enums.payload_enums import LightCommand
 
 
 class TestLightDevice(unittest.TestCase):
@@ -37,32 +37,58 @@ class TestLightDevice(unittest.TestCase):
             on_state_change=self.mock_state_change_callback,
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_turn_on(self, mock_payload_loader):
+    def test_handle_command_turn_on(self):
         # Simulate the "turn on" command
-        self.light_device.handle_command(json.dumps({"state": PayloadLoader.get("light", "open")}))
+        self.light_device.handle_command(json.dumps({"state": "ON"}).encode())
 
         # Assert that the GPIO control pin is toggled
         self.mock_gpio_service.write_pin.assert_called_once_with(self.control_pin, GPIOState.HIGH)
 
         # Assert that state change is notified
         self.mock_state_change_callback.assert_called_once_with(
-            self.device_class, self.device_id, json.dumps({"state": PayloadLoader.get("light", "open")})
+            self.device_class, self.device_id, b'{"state": "ON"}'
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_turn_off(self, mock_payload_loader):
+    def test_handle_command_turn_off(self):
         # Simulate the "close" command
-        self.light_device.handle_command(json.dumps({"state": PayloadLoader.get("light", "close")}))
+        self.light_device.handle_command(json.dumps({"state": "OFF"}))
 
         # Assert that the GPIO control pin is toggled
         self.mock_gpio_service.write_pin.assert_called_once_with(self.control_pin, GPIOState.LOW)
 
         # Assert that state change is notified
         self.mock_state_change_callback.assert_called_once_with(
-            self.device_class, self.device_id, json.dumps({"state": PayloadLoader.get("light", "close")})
+            self.device_class, self.device_id, b'{"state": "OFF"}'
         )
 
+    def test_handle_command_flash(self):
+        timer = Mock()
+        self.mock_gpio_service.timers.call_later.return_value = timer
+
+        self.light_device.handle_command(json.dumps({"state": "ON", "flash": 2}))
+        self.mock_gpio_service.timers.call_later.assert_called_once_with(2, self.light_device.clean_light)
+
+        # A second flash replaces the pending one
+        self.light_device.handle_command(json.dumps({"state": "ON", "flash": 2}))
+        timer.cancel.assert_called_once()
+
+        # When the timer fires the light goes off
+        self.light_device.clean_light()
+        self.mock_gpio_service.write_pin.assert_called_with(self.control_pin, GPIOState.LOW)
+        self.assertIsNone(self.light_device.flash_timer)
+
+    def test_decode_command(self):
+        self.assertEqual(self.light_device.decode_command(b'{"state": "ON"}'), {"state": LightCommand.ON})
+        self.assertEqual(self.light_device.decode_command('{"flash": 2}'), {"state": None, "flash": 2})
+        for payload in (b"not json", b'"ON"', b'{"state": "DIM"}', b'{"state": [1]}', b'{"state": {}}', b'{"state": 1}'):
+            with self.assertRaises(ValueError):
+                self.light_device.decode_command(payload)
+
+    def test_coalesce_key(self):
+        decode = self.light_device.decode_command
+        self.assertEqual(self.light_device.coalesce_key(decode(json.dumps({"state": "ON"}))), "state")
+        self.assertIsNone(self.light_device.coalesce_key(decode(json.dumps({"state": "ON", "flash": 2}))))
+
     def test_notify_state_change(self):
         # Call notify_state_change with a specific state
         self.light_device.notify_state_change("custom_state")
@@ -1,9 +1,8 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
 
 from src.devices.motion import MotionDevice
 from src.enums.gpio_enums import GPIOType, GPIOState
-from src.utils.payload_loader import PayloadLoader
 
 
 class TestMotionDevice(unittest.TestCase):
@@ -37,21 +36,33 @@ class TestMotionDevice(unittest.TestCase):
             on_state_change=self.mock_state_change_callback,
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_should_fail(self, mock_payload_loader):
+    def test_handle_command_should_fail(self):
         # Simulate an invalid command
         with self.assertRaises(ValueError) as context:
             self.motion_device.handle_command("invalid_command")
         self.assertEqual(
             str(context.exception), f"MotionDevice is a read-only device."
         )
+        with self.assertRaises(ValueError):
+            self.motion_device.decode_command(b"ON")
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_status_is_fetched(self, mock_payload_loader):
+    def test_status_is_fetched(self):
         self.motion_device.get_status()
 
         # Assert the callback is invoked with the correct parameters
         self.mock_gpio_service.read_pin.assert_called_once_with(self.status_pin)
 
+    def test_edge_pushes_state_change(self):
+        # The status pin is watched as soon as the device is created
+        self.mock_gpio_service.add_edge_callback.assert_called_once()
+        gpio, callback = self.mock_gpio_service.add_edge_callback.call_args.args
+        self.assertEqual(gpio, self.status_pin)
+
+        # Simulate a rising edge
+        self.mock_gpio_service.read_pin.return_value = 1
+        callback(self.status_pin, 1)
+
+        self.mock_state_change_callback.assert_called_once_with(self.device_class, self.device_id, b"detected")
+
 if __name__ == "__main__":
     unittest.main()
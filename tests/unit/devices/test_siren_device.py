@@ -1,8 +1,8 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
 from src.devices.siren import SirenDevice
 from src.enums.gpio_enums import GPIOType, GPIOState
-from src.utils.payload_loader import PayloadLoader
+from src.enums.payload_enums import SirenCommand
 
 
 class TestSirenDevice(unittest.TestCase):
@@ -36,34 +36,31 @@ class TestSirenDevice(unittest.TestCase):
             on_state_change=self.mock_state_change_callback,
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_turn_on(self, mock_payload_loader):
+    def test_handle_command_turn_on(self):
         # Simulate the "turn on" command
-        self.siren_device.handle_command(PayloadLoader.get(self.device_class, "on"))
+        self.siren_device.handle_command(b"ON")
 
         # Assert that the GPIO control pin is toggled
         self.mock_gpio_service.write_pin.assert_called_once_with(self.control_pin, GPIOState.HIGH)
 
         # Assert that state change is notified
         self.mock_state_change_callback.assert_called_once_with(
-            self.device_class, self.device_id, GPIOState.HIGH
+            self.device_class, self.device_id, b"high"
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_turn_off(self, mock_payload_loader):
-        # Simulate the "close" command
-        self.siren_device.handle_command(PayloadLoader.get(self.device_class, "off"))
+    def test_handle_command_turn_off(self):
+        # Simulate the "close" command, already decoded
+        self.siren_device.handle_command(SirenCommand.OFF)
 
         # Assert that the GPIO control pin is toggled
         self.mock_gpio_service.write_pin.assert_called_once_with(self.control_pin, GPIOState.LOW)
 
         # Assert that state change is notified
         self.mock_state_change_callback.assert_called_once_with(
-            self.device_class, self.device_id, GPIOState.LOW
+            self.device_class, self.device_id, b"low"
         )
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_invalid(self, mock_payload_loader):
+    def test_handle_command_invalid(self):
         # Simulate an invalid command
         with self.assertRaises(ValueError) as context:
             self.siren_device.handle_command("invalid_command")
@@ -71,6 +68,16 @@ class TestSirenDevice(unittest.TestCase):
             str(context.exception), f"Unknown command 'invalid_command' for SirenDevice {self.device_id}."
         )
 
+    def test_decode_command(self):
+        self.assertIs(self.siren_device.decode_command(b"ON"), SirenCommand.ON)
+        self.assertIs(self.siren_device.decode_command("OFF"), SirenCommand.OFF)
+        with self.assertRaises(ValueError):
+            self.siren_device.decode_command(b"invalid_command")
+
+    def test_coalesce_key(self):
+        self.assertEqual(self.siren_device.coalesce_key(SirenCommand.ON), "state")
+        self.assertEqual(self.siren_device.coalesce_key(SirenCommand.OFF), "state")
+
     def test_notify_state_change(self):
         # Call notify_state_change with a specific state
         self.siren_device.notify_state_change("custom_state")
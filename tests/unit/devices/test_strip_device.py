@@ -1,8 +1,9 @@
 import unittest
 from unittest.mock import MagicMock, patch
+from src.animations.effects import RainbowEffect
 from src.devices.strip import StripDevice
 from src.enums.gpio_enums import GPIOType, GPIOState
-from src.utils.payload_loader import PayloadLoader
+from src.enums.payload_enums import StripCommand
 from tests.unit.services.test_mqtt_service import mqtt_service
 
 
@@ -40,31 +41,42 @@ class TestStripDevice(unittest.TestCase):
             on_state_change=self.mock_state_change_callback,
             custom_vars=self.custom_vars)
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_color(self, mock_payload_loader):
-        self.device.handle_command(PayloadLoader.get("strip", "color"))
-        self.mock_gpio_service.set_strip_color.assert_any_call(self.device._get_gpio("control"), 1, (255, 255, 255))
+    def test_handle_command_color(self):
+        self.device.handle_command(b"COLOR")
+        self.mock_gpio_service.fill_strip.assert_called_once_with(self.control_pin, (255, 255, 255))
+        self.mock_gpio_service.show_strip.assert_called_once_with(self.control_pin)
         self.mock_gpio_service.write_pin.assert_called_once_with(self.power_pin, GPIOState.HIGH)
+        self.mock_state_change_callback.assert_called_once_with(
+            self.device_class, self.device_id, b"COLOR")
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_garage_animation(self, mock_payload_loader):
-        self.device.handle_command(PayloadLoader.get("strip", "garage_animation"))
+    def test_handle_command_garage_animation(self):
+        self.device.handle_command("ANIMATION")
         self.mock_gpio_service.write_pin.assert_called_once_with(self.power_pin, GPIOState.HIGH)
-        self.assertTrue(self.device.animation_thread.is_alive())
+        self.assertTrue(self.device.animation.is_running())
+        self.device.handle_command(StripCommand.STOP)
+        self.assertFalse(self.device.animation.is_running())
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_handle_command_stop(self, mock_payload_loader):
-        self.device.handle_command(PayloadLoader.get("strip", "stop"))
+    def test_handle_command_stop(self):
+        self.device.handle_command(StripCommand.STOP)
         self.mock_gpio_service.write_pin.assert_called_once_with(self.power_pin, GPIOState.LOW)
-        self.mock_gpio_service.set_strip_color.assert_any_call(self.device._get_gpio("control"), 0, (0, 0, 0))
+        self.mock_gpio_service.fill_strip.assert_called_once_with(self.control_pin, (0, 0, 0))
+        self.mock_gpio_service.show_strip.assert_called_once_with(self.control_pin)
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_get_status_running(self, mock_payload_loader):
-        with patch('threading.Thread.is_alive', return_value=True):
-            self.device.animation_thread = MagicMock()
-            self.assertEqual(self.device.get_status(), PayloadLoader.get("strip", "running"))
+    def test_get_status_running(self):
+        with patch.object(self.device.animation, "is_running", return_value=True):
+            self.assertEqual(self.device.get_status(), b"running")
 
-    @patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}")
-    def test_get_status_stopped(self, mock_payload_loader):
-        self.device.animation_thread = None
-        self.assertEqual(self.device.get_status(), PayloadLoader.get("strip", "stopped"))
+    def test_get_status_stopped(self):
+        self.assertEqual(self.device.get_status(), b"stopped")
+
+    def test_configured_animation(self):
+        self.device.custom_vars["animation"] = "rainbow"
+        self.device.custom_vars["animation_options"] = {"speed": 1.0}
+        self.device.handle_command("ANIMATION")
+        self.assertIsInstance(self.device.animation.effect, RainbowEffect)
+        self.device.animation.stop()
+
+    def test_unknown_animation(self):
+        self.device.custom_vars["animation"] = "unknown"
+        with self.assertRaises(ValueError):
+            self.device.handle_command("ANIMATION")
@@ -0,0 +1,48 @@
+import sys
+from importlib.metadata import EntryPoint
+from unittest.mock import patch
+
+import pytest
+from src.enums.device_class import DEVICE_CLASSES, DEVICE_MODULES, DeviceClassRegistry
+
+
+def test_registry_imports_on_lookup(monkeypatch):
+    monkeypatch.delitem(sys.modules, "src.devices.siren", raising=False)
+    registry = DeviceClassRegistry(DEVICE_MODULES)
+
+    assert "siren" in registry
+    assert "src.devices.siren" not in sys.modules
+    assert registry.loaded() == []
+
+    assert registry["siren"].__name__ == "SirenDevice"
+    assert "src.devices.siren" in sys.modules
+    assert registry.loaded() == ["siren"]
+
+
+def test_registry_unknown_class():
+    registry = DeviceClassRegistry(DEVICE_MODULES)
+
+    assert "doorbell" not in registry
+    assert registry.get("doorbell") is None
+    with pytest.raises(KeyError):
+        registry["doorbell"]
+
+
+def test_registry_entry_points():
+    """Test names missing from the built-in map are looked up among the installed plugins."""
+    plugin = EntryPoint("doorbell", "src.devices.garage:GarageDevice", "ha_rpi_connector.devices")
+    with patch("importlib.metadata.entry_points", return_value=[plugin]) as entry_points:
+        registry = DeviceClassRegistry(DEVICE_MODULES, "ha_rpi_connector.devices")
+        assert registry["garage"] is not None
+        entry_points.assert_not_called()
+
+        assert registry["doorbell"] is registry["garage"]
+        entry_points.assert_called_once_with(group="ha_rpi_connector.devices")
+    assert list(registry) == ["garage", "motion", "light", "siren", "strip", "doorbell"]
+
+
+def test_registry_overrides(monkeypatch):
+    monkeypatch.setitem(DEVICE_CLASSES, "garage", object)
+    assert DEVICE_CLASSES["garage"] is object
+    monkeypatch.undo()
+    assert DEVICE_CLASSES["garage"].__name__ == "GarageDevice"
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+from unittest.mock import Mock, patch
+from src.devices.base_device import BaseDevice
+from src.services.async_runtime import AsyncRuntime
+from src.services.mqtt_service import MQTTService
+
+
+class RecordingDevice(BaseDevice):
+    """Minimal device recording the thread its commands run on."""
+
+    def __init__(self):
+        self.device_class = "light"
+        self.device_id = 1
+        self.topics = {"availability": "light/1/availability", "command": "light/1/set", "status": "light/1/status"}
+        self.commands = []
+        self.handled = threading.Event()
+
+    def decode_command(self, payload):
+        return payload.decode()
+
+    def handle_command(self, command: str):
+        self.commands.append((command, threading.current_thread().name))
+        self.handled.set()
+
+    def get_status(self) -> str:
+        return "ON"
+
+
+@pytest.fixture
+def mock_mqtt_client():
+    """Mock the paho MQTT client."""
+    with patch("paho.mqtt.client.Client", autospec=True) as mock_client_class:
+        mock_client_class.return_value.loop_misc.return_value = 0
+        mock_client_class.return_value.socket.return_value = None
+        yield mock_client_class.return_value
+
+
+@pytest.fixture
+def device():
+    return RecordingDevice()
+
+
+@pytest.fixture
+def runtime(mock_mqtt_client, device):
+    service = MQTTService(host="localhost", port=1883, username="", password="", devices=[device], interval=0)
+    runtime = AsyncRuntime(service)
+    runtime.start()
+    yield runtime
+    runtime.stop()
+
+
+def message(topic, payload):
+    msg = Mock()
+    msg.topic = topic
+    msg.payload = payload
+    return msg
+
+
+def test_runtime_connects_and_installs_socket_hooks(runtime, mock_mqtt_client):
+    """Test the client is driven by the loop rather than by loop_start()."""
+    time.sleep(0.1)
+    mock_mqtt_client.connect.assert_called_once_with("localhost", 1883)
+    mock_mqtt_client.loop_start.assert_not_called()
+    assert mock_mqtt_client.on_socket_open == runtime._on_socket_open
+    assert mock_mqtt_client.on_socket_register_write == runtime._on_socket_register_write
+
+
+def test_runtime_runs_commands_in_executor(runtime, device):
+    """Test commands dispatched from the loop run as coroutines on the GPIO executor."""
+    runtime.loop.call_soon_threadsafe(runtime.mqtt_service.on_message, None, None, message("light/1/set", b"ON"))
+
+    assert device.handled.wait(1)
+    command, thread_name = device.commands[0]
+    assert command == "ON"
+    assert thread_name.startswith("gpio")
+
+    time.sleep(0.05)
+    stats = runtime.latency_stats()
+    assert stats["count"] == 1
+    assert stats["max_ms"] < 100
+
+
+def test_runtime_stop_publishes_offline(runtime, mock_mqtt_client):
+    """Test stopping shuts the loop down and disconnects the client."""
+    runtime.stop()
+
+    assert not runtime.thread.is_alive()
+    mock_mqtt_client.disconnect.assert_called_once()
+
+
+def test_runtime_stop_flushes_offline_before_disconnecting(mock_mqtt_client, device):
+    """Test the offline availability is written out before the client disconnects and the loop closes."""
+    service = MQTTService(host="localhost", port=1883, username="", password="", devices=[device], interval=0,
+                          availability_topic="connector/availability")
+    calls = []
+    info = Mock(rc=0)
+    info.is_published.side_effect = lambda: mock_mqtt_client.loop_write.call_count >= 2
+    mock_mqtt_client.publish.return_value = info
+    mock_mqtt_client.loop_write.side_effect = lambda *args: calls.append("loop_write")
+    mock_mqtt_client.disconnect.side_effect = lambda *args: calls.append("disconnect")
+    runtime = AsyncRuntime(service)
+    runtime.start()
+    runtime.stop()
+
+    assert not runtime.thread.is_alive()
+    assert calls == ["loop_write", "loop_write", "disconnect"]
+
+
+def test_runtime_socket_hooks_are_marshalled_to_loop(runtime):
+    """Test hooks fired from other threads (connect, publish) are run on the loop thread."""
+    sock = Mock()
+    sock.fileno.return_value = 99
+    with patch.object(runtime.loop, "add_writer") as add_writer:
+        runtime._on_socket_register_write(runtime.mqtt_service.client, None, sock)
+        time.sleep(0.05)
+        add_writer.assert_called_once_with(sock, runtime.mqtt_service.client.loop_write)
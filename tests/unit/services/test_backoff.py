@@ -0,0 +1,25 @@
+import pytest
+from src.services.backoff import Backoff
+
+
+def test_delays_grow_up_to_the_maximum():
+    backoff = Backoff(initial=0.5, maximum=4, rng=lambda: 1.0)
+    assert [backoff.next_delay() for _ in range(6)] == [0.5, 1, 2, 4, 4, 4]
+
+    backoff.reset()
+    assert backoff.next_delay() == 0.5
+
+
+def test_delays_are_jittered():
+    backoff = Backoff(initial=2, maximum=8, rng=lambda: 0.0)
+    assert [backoff.next_delay() for _ in range(3)] == [1, 2, 4]
+
+    delays = [Backoff(initial=2).next_delay() for _ in range(100)]
+    assert all(1 <= delay <= 2 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+@pytest.mark.parametrize("arguments", [{"initial": 0}, {"initial": 5, "maximum": 1}, {"multiplier": 0.5}])
+def test_invalid_backoff(arguments):
+    with pytest.raises(ValueError):
+        Backoff(**arguments)
@@ -0,0 +1,185 @@
+import threading
+import time
+
+import pytest
+from src.services.command_dispatcher import CommandDispatcher
+from src.services.metrics import COMMAND_LATENCY
+from src.services.tracing import Tracer
+
+
+class SlowDevice:
+    """Device recording its commands, blocking until released."""
+
+    def __init__(self, name, coalesce=True):
+        self.name = name
+        self.device_class = name.split("_")[0]
+        self.coalesce = coalesce
+        self.commands = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def identifier(self):
+        return self.name
+
+    def coalesce_key(self, command):
+        return "state" if self.coalesce and command in ("ON", "OFF") else None
+
+    def handle_command(self, command):
+        self.started.set()
+        self.release.wait(1)
+        self.commands.append(command)
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = CommandDispatcher(workers=2, max_depth=3)
+    yield dispatcher
+    dispatcher.stop()
+
+
+def test_dispatcher_coalesces_superseded_commands(dispatcher):
+    """Test a burst of toggles only applies the latest state."""
+    device = SlowDevice("light_1")
+    dispatcher.submit(device, "ON")
+    assert device.started.wait(1)
+    for command in ["OFF", "ON", "OFF", "ON"]:
+        dispatcher.submit(device, command)
+
+    device.release.set()
+    assert dispatcher.wait_idle(1)
+    assert device.commands == ["ON", "ON"]
+    assert dispatcher.stats()["light_1"]["coalesced"] == 3
+
+
+def test_dispatcher_keeps_order_around_coalesced_commands(dispatcher):
+    """Test a superseding command is moved after the non-coalescable ones."""
+    device = SlowDevice("light_1")
+    dispatcher.submit(device, "FLASH")
+    assert device.started.wait(1)
+    dispatcher.submit(device, "ON")
+    dispatcher.submit(device, "FLASH")
+    dispatcher.submit(device, "OFF")
+
+    device.release.set()
+    assert dispatcher.wait_idle(1)
+    assert device.commands == ["FLASH", "FLASH", "OFF"]
+
+
+def test_dispatcher_slow_device_does_not_block_others(dispatcher):
+    """Test commands of other devices run while one device is busy."""
+    slow = SlowDevice("strip_1")
+    fast = SlowDevice("siren_1")
+    fast.release.set()
+
+    dispatcher.submit(slow, "ON")
+    assert slow.started.wait(1)
+    dispatcher.submit(fast, "ON")
+
+    time.sleep(0.1)
+    assert fast.commands == ["ON"]
+    assert slow.commands == []
+    slow.release.set()
+    assert dispatcher.wait_idle(1)
+
+
+def test_dispatcher_drop_oldest(dispatcher):
+    """Test the oldest command is dropped when the mailbox is full."""
+    device = SlowDevice("garage_1", coalesce=False)
+    dispatcher.submit(device, "first")
+    assert device.started.wait(1)
+    for command in ["a", "b", "c", "d"]:
+        dispatcher.submit(device, command)
+
+    assert dispatcher.stats()["garage_1"] == {"depth": 3, "processed": 0, "coalesced": 0, "dropped": 1}
+    device.release.set()
+    assert dispatcher.wait_idle(1)
+    assert device.commands == ["first", "b", "c", "d"]
+
+
+def test_dispatcher_forgets_removed_devices():
+    """Test the queued commands of a removed device are dropped, whether its mailbox is running or waiting."""
+    dispatcher = CommandDispatcher(workers=1)
+    running, waiting = SlowDevice("garage_1", coalesce=False), SlowDevice("light_1")
+    dispatcher.submit(running, "first")
+    assert running.started.wait(1)
+    dispatcher.submit(running, "second")
+    dispatcher.submit(waiting, "ON")
+
+    dispatcher.forget(running)
+    dispatcher.forget(waiting)
+    running.release.set()
+    assert dispatcher.wait_idle(1)
+    dispatcher.stop()
+    assert running.commands == ["first"]
+    assert waiting.commands == []
+    assert dispatcher.stats() == {}
+
+
+def test_dispatcher_drop_newest():
+    """Test the incoming command is dropped when the mailbox is full."""
+    dispatcher = CommandDispatcher(workers=1, max_depth=1, overflow="drop_newest")
+    device = SlowDevice("garage_1", coalesce=False)
+    dispatcher.submit(device, "first")
+    assert device.started.wait(1)
+    dispatcher.submit(device, "a")
+    dispatcher.submit(device, "b")
+
+    device.release.set()
+    assert dispatcher.wait_idle(1)
+    assert device.commands == ["first", "a"]
+    assert dispatcher.stats()["garage_1"]["dropped"] == 1
+    dispatcher.stop()
+
+
+def test_dispatcher_invalid_overflow():
+    with pytest.raises(ValueError):
+        CommandDispatcher(workers=0, overflow="block")
+
+
+def test_dispatcher_failing_command_does_not_kill_worker(dispatcher):
+    """Test a command raising an exception is logged and the worker keeps serving."""
+    class FailingDevice(SlowDevice):
+        def handle_command(self, command):
+            if command == "bad":
+                raise ValueError("boom")
+            super().handle_command(command)
+
+    device = FailingDevice("siren_1")
+    device.release.set()
+
+    dispatcher.submit(device, "bad")
+    dispatcher.submit(device, "ON")
+
+    assert dispatcher.wait_idle(1)
+    assert device.commands == ["ON"]
+
+
+def test_dispatcher_metrics(dispatcher):
+    """Test mailbox counters are exported and command latency is observed per device class."""
+    device = SlowDevice("siren_1")
+    device.release.set()
+    before = COMMAND_LATENCY.labels("siren").snapshot()[2]
+    dispatcher.submit(device, "ON")
+    assert dispatcher.wait_idle(1)
+
+    samples = {(name, labels["device"]): value for name, _, _, labels, value in dispatcher.collect_metrics()}
+    assert samples[("connector_commands_processed_total", "siren_1")] == 1
+    assert samples[("connector_mailbox_depth", "siren_1")] == 0
+    assert COMMAND_LATENCY.labels("siren").snapshot()[2] == before + 1
+
+
+def test_dispatcher_finishes_traces_of_skipped_commands(dispatcher):
+    """Test coalesced commands close their trace, the executed one is traced through its handler."""
+    tracer = Tracer()
+    device = SlowDevice("light_1")
+    dispatcher.submit(device, "FLASH")
+    assert device.started.wait(1)
+    superseded, latest = tracer.start("light_1", "ON"), tracer.start("light_1", "OFF")
+    dispatcher.submit(device, "ON", trace=superseded)
+    dispatcher.submit(device, "OFF", trace=latest)
+
+    assert superseded.status == "coalesced"
+    device.release.set()
+    assert dispatcher.wait_idle(1)
+    assert latest.status == "ok"
+    assert [s.name for s in latest.spans] == ["queue", "device.handle_command"]
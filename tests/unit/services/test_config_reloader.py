@@ -0,0 +1,96 @@
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+from src.services.config_reloader import ConfigReloader
+from src.utils.config import get_config
+
+CONFIG = """
+devices:
+  - id: 1
+    class: garage
+    gpio:
+      - {name: status, type: input, gpio: 18}
+      - {name: control, type: output, gpio: 20}
+mqtt: {host: localhost, port: 1883}
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "default.yaml"
+    path.write_text(CONFIG)
+    return path
+
+
+@pytest.fixture
+def device_service(config_file):
+    service = Mock()
+    service.config = get_config(config_file, cache_path=False)
+    service.reload.return_value = {"added": [], "removed": [], "changed": [("garage", 1)]}
+    return service
+
+
+@pytest.fixture
+def reloader(device_service, config_file):
+    return ConfigReloader(device_service, Mock(), path=config_file, cache_path=False)
+
+
+def test_reload_applies_devices_and_runs_hooks(reloader, device_service, config_file):
+    hook = Mock()
+    reloader.reload_hooks.append(hook)
+    config_file.write_text(CONFIG.replace("gpio: 20", "gpio: 21"))
+
+    assert reloader.reload()
+
+    config = device_service.reload.call_args.args[0]
+    assert config["devices"][0]["gpio"][1]["gpio"] == 21
+    hook.assert_called_once_with(device_service.reload.return_value)
+
+
+def test_reload_ignores_invalid_files(reloader, device_service, config_file):
+    config_file.write_text(CONFIG.replace("type: input", "type: analog"))
+
+    assert not reloader.reload()
+    device_service.reload.assert_not_called()
+
+
+def test_watch_reloads_on_modification(reloader, device_service, config_file):
+    """Test the watcher only reloads once the file changed, and keeps polling."""
+    reloader.watch(2)
+    reloader.timers.call_later.assert_called_once_with(2, reloader._check, 2)
+
+    reloader._check(2)
+    device_service.reload.assert_not_called()
+
+    threads = []
+    reloaded = threading.Event()
+
+    def reload(config):
+        threads.append(threading.current_thread().name)
+        reloaded.set()
+        return {"added": [], "removed": [], "changed": []}
+
+    device_service.reload.side_effect = reload
+    config_file.write_text(CONFIG + "status_interval: 30\n")
+    reloader._mtime = None
+    reloader._check(2)
+    assert reloaded.wait(1)
+    # Reloading blocks, it runs on a thread of its own rather than on the timer thread
+    assert threads == ["config-reload"]
+    assert reloader.timers.call_later.call_count == 3
+
+
+def test_watch_hands_the_reload_over(device_service, config_file):
+    """Test a changed file is reloaded through schedule_reload rather than on the timer thread."""
+    schedule_reload = Mock()
+    reloader = ConfigReloader(device_service, Mock(), path=config_file, cache_path=False,
+                              schedule_reload=schedule_reload)
+    reloader.watch(2)
+    reloader._mtime = None
+    reloader._check(2)
+    reloader._check(2)
+
+    schedule_reload.assert_called_once_with()
+    device_service.reload.assert_not_called()
@@ -4,9 +4,11 @@ from importlib import import_module
 from pathlib import Path
 
 import pytest
-from unittest.mock import Mock
+from unittest.mock import Mock, call
 from src.services.device_service import DeviceService
+from src.services.gpio_service import GPIOService
 from src.enums.device_class import DEVICE_CLASSES
+from src.utils.config import compile_config, freeze
 
 
 @pytest.fixture
@@ -52,7 +54,7 @@ def mock_mqtt_service():
 
 
 @pytest.fixture
-def mock_device_classes():
+def mock_device_classes(monkeypatch):
     class MockGarageDevice:
         def __init__(self, device_id, device_class, gpio_service, mqtt_service, on_state_change, custom_vars=None):
             self.device_id = device_id
@@ -69,8 +71,8 @@ def mock_device_classes():
             self.mqtt_service = mqtt_service
             self.on_state_change = on_state_change
 
-    DEVICE_CLASSES["garage"] = MockGarageDevice
-    DEVICE_CLASSES["motion"] = MockMotionDevice
+    monkeypatch.setitem(DEVICE_CLASSES, "garage", MockGarageDevice)
+    monkeypatch.setitem(DEVICE_CLASSES, "motion", MockMotionDevice)
 
 
 def test_device_service_initialization(sample_config, mock_gpio_service, mock_mqtt_service, mock_device_classes):
@@ -95,7 +97,8 @@ def test_device_service_initialization(sample_config, mock_gpio_service, mock_mq
     assert motion_device.on_state_change == mock_mqtt_service.handle_device_state_change
 
 
-def test_device_service_unsupported_device_class(sample_config, mock_gpio_service, mock_mqtt_service):
+def test_device_service_unsupported_device_class(sample_config, mock_gpio_service, mock_mqtt_service,
+                                                 mock_device_classes):
     # Add an unsupported device class
     sample_config["devices"].append({"id": 4, "class": "unsupported", "gpio": []})
 
@@ -124,4 +127,109 @@ def test_all_device_class_are_registered(mock_gpio_service, mock_mqtt_service):
     # Import all device classes and check registration
     for device_file in device_files:
         device_class = device_file.replace(".py", "")
-        assert device_class in DEVICE_CLASSES
\ No newline at end of file
+        assert device_class in DEVICE_CLASSES
+
+@pytest.fixture
+def reload_services(sample_config):
+    config = freeze(compile_config(sample_config))
+    gpio_service = GPIOService(devices=config["devices"], mock_gpio=True)
+    mqtt_service = Mock()
+    service = DeviceService(config, gpio_service, mqtt_service)
+    return service, gpio_service, mqtt_service
+
+
+def test_device_service_reload_rebuilds_only_changed_devices(sample_config, reload_services):
+    """Test a reload keeps unchanged devices and pins, rebuilds changed ones and (un)registers the others."""
+    service, gpio_service, mqtt_service = reload_services
+    garage_1, garage_2, motion = service.devices
+    devices = service.devices
+    sample_config["devices"][1]["gpio"][1]["default"] = "low"
+    del sample_config["devices"][2]
+    sample_config["devices"].append({"id": 5, "class": "siren", "gpio": [{"name": "control", "type": "output",
+                                                                         "gpio": 5}]})
+
+    changes = service.reload(freeze(compile_config(sample_config)))
+
+    assert changes == {"added": [("siren", 5)], "removed": [("motion", 3)], "changed": [("garage", 2)]}
+    assert service.devices is devices
+    assert service.devices[0] is garage_1
+    assert service.devices[1] is not garage_2 and service.devices[1].device_id == 2
+    assert service.devices[2].device_class == "siren"
+    mqtt_service.remove_device.assert_called_once_with(motion)
+    mqtt_service.replace_device.assert_called_once_with(garage_2, service.devices[1])
+    mqtt_service.add_device.assert_called_once_with(service.devices[2])
+    mqtt_service.publish_availability.assert_has_calls([call("offline", [motion]),
+                                                        call("online", [service.devices[2]])])
+    # The motion watcher is gone, the rebuilt garage watches its status pin once
+    assert 4 not in gpio_service._edge_callbacks
+    assert gpio_service._edge_callbacks[27] == [service.devices[1]._on_input_edge]
+
+
+def test_device_service_reload_rejects_unsupported_class(sample_config, reload_services):
+    service, _, mqtt_service = reload_services
+    sample_config["devices"].append({"id": 9, "class": "unsupported", "gpio": []})
+
+    with pytest.raises(ValueError, match="Unsupported device class: unsupported"):
+        service.reload(freeze(compile_config(sample_config)))
+    mqtt_service.add_device.assert_not_called()
+
+
+def test_device_service_reload_checks_devices_first(sample_config, reload_services):
+    """Test a device missing a required pin is rejected before the running devices are touched."""
+    service, gpio_service, mqtt_service = reload_services
+    devices = list(service.devices)
+    old_config = gpio_service.devices
+    sample_config["devices"][0]["gpio"][1]["name"] = "relay"
+
+    with pytest.raises(ValueError, match="Pin 'control' not found for device 1"):
+        service.reload(freeze(compile_config(sample_config)))
+    assert service.devices == devices
+    assert gpio_service.devices is old_config
+    assert gpio_service._edge_callbacks[18] == [devices[0]._on_input_edge]
+    mqtt_service.replace_device.assert_not_called()
+
+
+def test_device_service_reload_rolls_back(sample_config, reload_services, monkeypatch):
+    """Test a device failing to build restores the previous devices and pins."""
+    service, gpio_service, mqtt_service = reload_services
+    garage_1, garage_2, motion = service.devices
+    config = service.config
+    sample_config["devices"][1]["gpio"][1]["default"] = "low"
+    sample_config["devices"].append({"id": 5, "class": "siren", "gpio": [{"name": "control", "type": "output",
+                                                                         "gpio": 5}]})
+    create_device = service.create_device
+
+    def failing_create_device(device_config):
+        if device_config["class"] == "siren":
+            raise RuntimeError("siren failed")
+        return create_device(device_config)
+
+    monkeypatch.setattr(service, "create_device", failing_create_device)
+    with pytest.raises(RuntimeError, match="siren failed"):
+        service.reload(freeze(compile_config(sample_config)))
+
+    assert service.config is config
+    assert gpio_service.devices == config["devices"]
+    assert service.devices[0] is garage_1 and service.devices[2] is motion
+    rebuilt = service.devices[1]
+    assert rebuilt is not garage_2 and rebuilt.device_id == 2
+    assert mqtt_service.replace_device.call_args.args[1] is rebuilt
+    mqtt_service.add_device.assert_not_called()
+    assert gpio_service._edge_callbacks[27] == [rebuilt._on_input_edge]
+
+    # The next reload starts from the restored configuration
+    monkeypatch.setattr(service, "create_device", create_device)
+    changes = service.reload(freeze(compile_config(sample_config)))
+    assert changes == {"added": [("siren", 5)], "removed": [], "changed": [("garage", 2)]}
+
+
+def test_device_service_bridge_availability(sample_config):
+    """Test devices use the bridge availability topic, unless configured with their own."""
+    sample_config["devices"][2]["availability"] = "device"
+    config = freeze(compile_config(sample_config))
+    gpio_service = GPIOService(devices=config["devices"], mock_gpio=True)
+    service = DeviceService(config, gpio_service, Mock(), availability_topic="ha-rpi-connector/pi/availability")
+
+    assert [device.get_topic("availability") for device in service.devices] == [
+        "ha-rpi-connector/pi/availability", "ha-rpi-connector/pi/availability", "motion/3/availability"]
+    assert all(device.bridge_availability_topic == "ha-rpi-connector/pi/availability" for device in service.devices)
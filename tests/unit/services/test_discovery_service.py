@@ -0,0 +1,152 @@
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+from src.devices.garage import GarageDevice
+from src.devices.motion import MotionDevice
+from src.services.discovery_service import DiscoveryService, digest
+from src.services.gpio_service import GPIOService
+from src.services.mqtt_service import MQTTService
+from src.services.timer_service import TimerService
+from src.utils.payload_loader import PayloadLoader
+
+
+@pytest.fixture(autouse=True)
+def payloads():
+    with patch.object(PayloadLoader, "get", side_effect=lambda category, key: f"{category}_{key}"):
+        yield
+
+
+@pytest.fixture
+def devices():
+    gpio_service = GPIOService(devices=[
+        {"id": 1, "class": "garage", "gpio": [{"name": "status", "type": "input", "gpio": 18},
+                                              {"name": "control", "type": "output", "gpio": 20}]},
+        {"id": 2, "class": "motion", "gpio": [{"name": "status", "type": "input", "gpio": 4}]},
+    ], mock_gpio=True)
+    return [GarageDevice(1, "garage", gpio_service, Mock(), Mock()), MotionDevice(2, "motion", gpio_service, Mock(), Mock())]
+
+
+@pytest.fixture
+def mqtt_service():
+    with patch("paho.mqtt.client.Client", autospec=True):
+        service = MQTTService(host="localhost", port=1883, username="", password="", devices=[], interval=0,
+                              timers=TimerService())
+        yield service
+        service.timers.stop()
+
+
+@pytest.fixture
+def discovery(mqtt_service, devices, tmp_path):
+    return DiscoveryService(mqtt_service, devices, node_id="pi", cache_path=tmp_path / "cache.json", settle=0.05)
+
+
+def retained(topic, payload):
+    return SimpleNamespace(topic=topic, payload=payload.encode(), retain=True)
+
+
+def published_topics(mqtt_service):
+    return [c.args[0] for c in mqtt_service.client.publish.call_args_list]
+
+
+def test_discovery_configs(discovery):
+    """Test configs are built from the device topics and component options."""
+    configs = discovery.configs()
+    garage = json.loads(configs["homeassistant/cover/pi/garage_1/config"])
+    motion = json.loads(configs["homeassistant/binary_sensor/pi/motion_2/config"])
+
+    assert garage["command_topic"] == "garage/1/set"
+    assert garage["state_topic"] == "garage/1/status"
+    assert garage["unique_id"] == "pi_garage_1"
+    assert garage["payload_open"] == "OPEN"
+    assert garage["payload_available"] == "availability_online"
+    assert "command_topic" not in motion
+    assert motion["payload_on"] == "detected"
+
+
+def test_discovery_publishes_only_changed(discovery, mqtt_service):
+    """Test configs already retained with the same content are not republished, stale ones are cleared."""
+    configs = discovery.configs()
+    garage_topic = "homeassistant/cover/pi/garage_1/config"
+    removed_topic = "homeassistant/light/pi/light_9/config"
+
+    discovery.on_connect()
+    discovery.on_retained(None, None, retained(garage_topic, configs[garage_topic]))
+    discovery.on_retained(None, None, retained(removed_topic, "{}"))
+    sent = discovery.sync()
+
+    assert sent == 2
+    mqtt_service.client.publish.assert_any_call("homeassistant/binary_sensor/pi/motion_2/config",
+                                                configs["homeassistant/binary_sensor/pi/motion_2/config"],
+                                                retain=True, qos=1)
+    mqtt_service.client.publish.assert_any_call(removed_topic, "", retain=True, qos=1)
+    assert garage_topic not in published_topics(mqtt_service)
+    assert json.loads(discovery.cache_path.read_text()) == {topic: digest(payload) for topic, payload in configs.items()}
+
+
+def test_discovery_subscribes_with_the_commands(discovery, mqtt_service):
+    """Test the retained configs are subscribed with the command topics, not in a SUBSCRIBE of their own."""
+    discovery.start()
+    discovery.on_connect()
+    discovery.sync()
+
+    assert discovery.wildcard in mqtt_service.subscriptions
+    mqtt_service.client.subscribe.assert_not_called()
+    mqtt_service.client.unsubscribe.assert_not_called()
+
+def test_discovery_restart_with_cache(discovery, mqtt_service, devices):
+    """Test a restart syncs as soon as the broker returned the cached configs, without publishing anything."""
+    discovery.on_connect()
+    discovery.sync()
+    mqtt_service.client.publish.reset_mock()
+
+    restarted = DiscoveryService(mqtt_service, devices, node_id="pi", cache_path=discovery.cache_path, settle=10)
+    restarted.on_connect()
+    for topic, payload in restarted.configs().items():
+        restarted.on_retained(None, None, retained(topic, payload))
+    time.sleep(0.1)
+
+    assert restarted._sync_timer is None
+    mqtt_service.client.publish.assert_not_called()
+
+    # Configs published after the sync no longer count as retained
+    restarted.on_retained(None, None, retained("homeassistant/light/pi/light_9/config", "{}"))
+    assert "homeassistant/light/pi/light_9/config" not in restarted._retained
+
+
+def test_discovery_without_verification(discovery, mqtt_service, devices):
+    """Test the local cache alone decides what is published when retained configs are not read back."""
+    discovery.on_connect()
+    discovery.sync()
+    mqtt_service.client.publish.reset_mock()
+    mqtt_service.client.subscribe.reset_mock()
+
+    devices[0].custom_vars["name"] = "Garage door"
+    restarted = DiscoveryService(mqtt_service, devices, node_id="pi", cache_path=discovery.cache_path,
+                                 verify_retained=False)
+    restarted.start()
+    restarted.on_connect()
+
+    assert published_topics(mqtt_service) == ["homeassistant/cover/pi/garage_1/config"]
+    assert restarted.wildcard not in mqtt_service.subscriptions
+    mqtt_service.client.subscribe.assert_not_called()
+
+
+def test_discovery_bridge_availability(discovery, devices):
+    """Test devices with their own availability topic also require the bridge to be online."""
+    garage, motion = devices
+    for device in devices:
+        device.bridge_availability_topic = "ha-rpi-connector/pi/availability"
+    garage.topics["availability"] = "ha-rpi-connector/pi/availability"
+    configs = discovery.configs()
+    garage = json.loads(configs["homeassistant/cover/pi/garage_1/config"])
+    motion = json.loads(configs["homeassistant/binary_sensor/pi/motion_2/config"])
+
+    assert garage["availability_topic"] == "ha-rpi-connector/pi/availability"
+    assert "availability" not in garage
+    assert "availability_topic" not in motion
+    assert motion["availability"] == [{"topic": "ha-rpi-connector/pi/availability"},
+                                      {"topic": "motion/2/availability"}]
+    assert motion["availability_mode"] == "all"
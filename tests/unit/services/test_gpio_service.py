@@ -1,6 +1,8 @@
 import logging
+import time
+
 import pytest
-from unittest.mock import patch, call
+from unittest.mock import Mock, patch, call
 from src.services.gpio_service import GPIOService
 from src.enums.gpio_enums import GPIOType, GPIOState
 
@@ -52,21 +54,28 @@ def test_gpio_service_read_pin(mock_logger, gpio_service_with_mock):
     assert result == 0  # Default mock return value
 
     # Assert log for reading pin
-    mock_logger.debug.assert_has_calls([call("Mock read GPIO pin 17")])
+    mock_logger.debug.assert_has_calls([call("Mock read GPIO pin %s", 17)])
 
 def test_gpio_service_write_pin(mock_logger, gpio_service_with_mock):
     """Test writing to a GPIO pin in mock mode."""
     gpio_service_with_mock.write_pin(22, "high")
 
     # Assert log for writing pin
-    mock_logger.debug.assert_has_calls([call("Mock write GPIO pin 22 to high")])
+    mock_logger.debug.assert_has_calls([call("Mock write GPIO pin %s to %s", 22, "high")])
+
+def test_gpio_service_write_pin_updates_mock_levels(gpio_service_with_mock):
+    """Test mock writes are read back, like the levels driven by pulses."""
+    gpio_service_with_mock.write_pin(17, "high")
+    assert gpio_service_with_mock.read_pin(17) == 1
+    gpio_service_with_mock.write_pin(17, "low")
+    assert gpio_service_with_mock.read_pin(17) == 0
 
 def test_gpio_service_toggle_pin(mock_logger, gpio_service_with_mock):
     """Test toggling a GPIO pin in mock mode."""
     gpio_service_with_mock.toggle_pin(18, duration=0.5)
 
     # Assert log for toggling pin
-    mock_logger.debug.assert_has_calls([call("Mock toggle GPIO pin 18")])
+    mock_logger.debug.assert_has_calls([call("Mock toggle GPIO pin %s", 18)])
 
 def test_gpio_service_cleanup(mock_logger, gpio_service_with_mock):
     """Test GPIO cleanup in mock mode."""
@@ -74,3 +83,109 @@ def test_gpio_service_cleanup(mock_logger, gpio_service_with_mock):
 
     # Assert log for cleanup
     mock_logger.debug.assert_has_calls([call("Cleaning up GPIO resources")])
+
+def test_gpio_service_mock_edge_callback(gpio_service_with_mock):
+    """Test edge callbacks fire in mock mode and the new level is readable."""
+    callback = Mock()
+    gpio_service_with_mock.add_edge_callback(18, callback)
+
+    gpio_service_with_mock.set_mock_level(18, 1)
+
+    callback.assert_called_once_with(18, 1)
+    assert gpio_service_with_mock.read_pin(18) == 1
+
+def test_gpio_service_mock_edge_debounce(gpio_service_with_mock):
+    """Test edges inside the debounce window are ignored."""
+    callback = Mock()
+    gpio_service_with_mock.add_edge_callback(18, callback, debounce_ms=1000)
+
+    gpio_service_with_mock.set_mock_level(18, 1)
+    gpio_service_with_mock.set_mock_level(18, 0)
+    gpio_service_with_mock.set_mock_level(18, 1)
+
+    callback.assert_called_once_with(18, 1)
+
+def test_gpio_service_mock_edge_ignores_same_level(gpio_service_with_mock):
+    """Test writing the current level again does not produce an edge."""
+    callback = Mock()
+    gpio_service_with_mock.add_edge_callback(18, callback, debounce_ms=0)
+
+    gpio_service_with_mock.set_mock_level(18, 0)
+
+    callback.assert_not_called()
+
+def test_gpio_service_debounce_from_config():
+    """Test the per-pin `debounce` setting is used when none is given."""
+    service = GPIOService(devices=[{"id": "device_1", "gpio": [{"gpio": 4, "type": GPIOType.INPUT, "debounce": 0}]}],
+                          mock_gpio=True)
+    callback = Mock()
+    service.add_edge_callback(4, callback)
+
+    service.set_mock_level(4, 1)
+    service.set_mock_level(4, 0)
+
+    assert callback.call_count == 2
+
+def test_gpio_service_edge_latency(gpio_service_with_mock):
+    """Test an edge reaches its callback within milliseconds."""
+    received = []
+    gpio_service_with_mock.add_edge_callback(18, lambda gpio, level: received.append(time.perf_counter()))
+
+    start = time.perf_counter()
+    gpio_service_with_mock.set_mock_level(18, 1)
+
+    assert received and received[0] - start < 0.005
+
+def test_gpio_service_strip_fill_shows_once(gpio_service_with_mock):
+    """Test painting a whole strip costs a single show()."""
+    gpio_service_with_mock.initialize_strip(12, 300)
+
+    gpio_service_with_mock.fill_strip(12, (255, 128, 0))
+    gpio_service_with_mock.show_strip(12)
+
+    assert gpio_service_with_mock.show_counts[12] == 1
+    assert set(gpio_service_with_mock.frames[12]) == {0xFF8000}
+
+def test_gpio_service_strip_range(gpio_service_with_mock):
+    """Test setting a range only touches the requested pixels."""
+    gpio_service_with_mock.initialize_strip(12, 5)
+
+    gpio_service_with_mock.set_strip_range(12, 1, 3, (0, 0, 255))
+
+    assert list(gpio_service_with_mock.frames[12]) == [0, 0xFF, 0xFF, 0, 0]
+    assert gpio_service_with_mock.show_counts[12] == 0
+
+def test_gpio_service_strip_frame_from_bytes(gpio_service_with_mock):
+    """Test a whole frame can be loaded from RGB bytes."""
+    gpio_service_with_mock.initialize_strip(12, 2)
+
+    gpio_service_with_mock.set_strip_frame(12, bytes([1, 2, 3, 4, 5, 6]))
+
+    assert list(gpio_service_with_mock.frames[12]) == [0x010203, 0x040506]
+
+def test_gpio_service_strip_frame_size_mismatch(gpio_service_with_mock):
+    """Test a frame of the wrong size is rejected."""
+    gpio_service_with_mock.initialize_strip(12, 2)
+
+    with pytest.raises(ValueError):
+        gpio_service_with_mock.set_strip_frame(12, [0, 0, 0])
+
+def test_gpio_service_set_strip_color_shows(gpio_service_with_mock):
+    """Test the single pixel helper still shows the change by default."""
+    gpio_service_with_mock.initialize_strip(12, 3)
+
+    gpio_service_with_mock.set_strip_color(12, 1, (255, 0, 0))
+    gpio_service_with_mock.set_strip_color(12, 2, (255, 0, 0), show=False)
+
+    assert list(gpio_service_with_mock.frames[12]) == [0, 0xFF0000, 0xFF0000]
+    assert gpio_service_with_mock.show_counts[12] == 1
+
+def test_gpio_service_toggle_pin_does_not_block(gpio_service_with_mock):
+    """Test toggling returns immediately and the pin is restored later."""
+    start = time.monotonic()
+    gpio_service_with_mock.toggle_pin(22, duration=0.1)
+    assert time.monotonic() - start < 0.05
+    assert gpio_service_with_mock.read_pin(22) == 0
+
+    assert gpio_service_with_mock.pulses.wait_idle(1)
+    assert gpio_service_with_mock.read_pin(22) == 1
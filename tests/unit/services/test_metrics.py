@@ -0,0 +1,72 @@
+import urllib.error
+import urllib.request
+
+import pytest
+from src.services.metrics import Histogram, MetricsRegistry, MetricsServer
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_histogram_buckets():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    cumulative, total, count = histogram.snapshot()
+    assert cumulative == [2, 3, 4]
+    assert total == pytest.approx(3.65)
+    assert count == 4
+
+
+def test_registry_render(registry):
+    """Test histograms and collected samples are exported in the Prometheus text format."""
+    latency = registry.histogram("command_seconds", "Command latency.", buckets=(0.01, 0.1), labels=("device_class",))
+    latency.labels("light").observe(0.05)
+    registry.add_collector(lambda: [("published_total", "counter", "Published messages.", {"kind": "status"}, 3)])
+
+    text = registry.render()
+
+    assert "# TYPE command_seconds histogram" in text
+    assert 'command_seconds_bucket{device_class="light",le="0.01"} 0' in text
+    assert 'command_seconds_bucket{device_class="light",le="0.1"} 1' in text
+    assert 'command_seconds_bucket{device_class="light",le="+Inf"} 1' in text
+    assert 'command_seconds_count{device_class="light"} 1' in text
+    assert "# TYPE published_total counter" in text
+    assert 'published_total{kind="status"} 3.0' in text
+
+
+def test_registry_returns_registered_histogram(registry):
+    assert registry.histogram("a", "A.") is registry.histogram("a", "Again.")
+
+
+def test_histogram_label_count(registry):
+    family = registry.histogram("gpio_seconds", "GPIO.", labels=("operation",))
+    with pytest.raises(ValueError):
+        family.labels("read", "extra")
+
+
+def test_failing_collector_is_skipped(registry):
+    def broken():
+        raise RuntimeError("boom")
+
+    registry.add_collector(broken)
+    registry.add_collector(lambda: [("threads", "gauge", "Threads.", {}, 4)])
+
+    assert "threads 4.0" in registry.render()
+
+
+def test_metrics_server(registry):
+    registry.add_collector(lambda: [("threads", "gauge", "Threads.", {}, 4)])
+    server = MetricsServer(registry, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=2) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "threads 4.0" in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other", timeout=2)
+    finally:
+        server.stop()
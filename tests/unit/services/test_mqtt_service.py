@@ -1,6 +1,14 @@
+import time
+
 import pytest
 from unittest.mock import Mock, patch, call
+import paho.mqtt.client as mqtt
+from src.devices.motion import MotionDevice
+from src.services.backoff import Backoff
+from src.services.gpio_service import GPIOService
 from src.services.mqtt_service import MQTTService
+from src.services.outbound_spool import OutboundSpool
+from src.services.tracing import Tracer
 
 
 @pytest.fixture
@@ -9,16 +17,22 @@ def mock_devices():
     mock_device_1 = Mock()
     mock_device_1.device_class = "garage"
     mock_device_1.device_id = 1
+    mock_device_1.identifier.return_value = "garage_1"
     mock_device_1.get_topic.side_effect = lambda t: f"{t}/garage/1"
     mock_device_1.get_status.return_value = '{"status": "ok"}'
+    mock_device_1.decode_command.side_effect = bytes.decode
     mock_device_1.handle_command = Mock()
+    mock_device_1.watched_pins = ()
 
     mock_device_2 = Mock()
     mock_device_2.device_class = "motion"
     mock_device_2.device_id = 2
+    mock_device_2.identifier.return_value = "motion_2"
     mock_device_2.get_topic.side_effect = lambda t: f"{t}/motion/2"
     mock_device_2.get_status.return_value = '{"status": "active"}'
+    mock_device_2.decode_command.side_effect = bytes.decode
     mock_device_2.handle_command = Mock()
+    mock_device_2.watched_pins = ()
 
     return [mock_device_1, mock_device_2]
 
@@ -48,13 +62,8 @@ def test_mqtt_service_on_connect(mqtt_service, mock_mqtt_client, mock_devices):
     """Test the `on_connect` method."""
     mqtt_service.on_connect(mock_mqtt_client, None, None, 0)
 
-    # Ensure subscription to device topics
-    expected_calls = [call(device.get_topic("command")) for device in mock_devices]
-    mock_mqtt_client.subscribe.assert_has_calls(expected_calls)
-
-    # Check logging and connection handling
-    mock_mqtt_client.subscribe.assert_called()
-    assert mock_mqtt_client.subscribe.call_count == len(mock_devices)
+    # Ensure subscription to device topics, in a single SUBSCRIBE
+    mock_mqtt_client.subscribe.assert_called_once_with([(device.get_topic("command"), 0) for device in mock_devices])
 
 
 def test_mqtt_service_on_message(mqtt_service, mock_devices):
@@ -80,7 +89,7 @@ def test_mqtt_service_publish(mqtt_service, mock_mqtt_client):
     """Test the `publish` method."""
     mqtt_service.publish("test/topic", '{"key": "value"}', retain=True)
 
-    mock_mqtt_client.publish.assert_called_once_with("test/topic", '{"key": "value"}', retain=True, qos=2)
+    mock_mqtt_client.publish.assert_called_once_with("test/topic", '{"key": "value"}', retain=True, qos=1)
 
 
 def test_mqtt_service_publish_status(mqtt_service, mock_mqtt_client, mock_devices):
@@ -90,7 +99,7 @@ def test_mqtt_service_publish_status(mqtt_service, mock_mqtt_client, mock_device
     for device in mock_devices:
         topic = device.get_topic("status")
         payload = device.get_status()
-        mock_mqtt_client.publish.assert_any_call(topic, payload, retain=True, qos=2)
+        mock_mqtt_client.publish.assert_any_call(topic, payload, retain=True, qos=1)
 
 
 def test_mqtt_service_handle_device_state_change(mqtt_service, mock_mqtt_client):
@@ -98,7 +107,7 @@ def test_mqtt_service_handle_device_state_change(mqtt_service, mock_mqtt_client)
     mqtt_service.handle_device_state_change("garage", 1, '{"state": "open"}')
 
     mock_mqtt_client.publish.assert_called_once_with(
-        "garage/1/status", '{"state": "open"}', retain=False, qos=2
+        "garage/1/status", '{"state": "open"}', retain=False, qos=1
     )
 
 
@@ -106,7 +115,8 @@ def test_mqtt_service_start_and_stop(mqtt_service, mock_mqtt_client):
     """Test the `start` and `stop` methods."""
     with patch("threading.Thread.start") as mock_thread_start:
         mqtt_service.start()
-        mock_mqtt_client.connect.assert_called_once_with("localhost", 1883)
+        mock_mqtt_client.connect_async.assert_called_once_with("localhost", 1883)
+        mock_mqtt_client.connect.assert_not_called()
         mock_mqtt_client.loop_start.assert_called_once()
         mock_thread_start.assert_called_once()
 
@@ -132,7 +142,7 @@ def test_mqtt_service_publish_availability(mqtt_service, mock_mqtt_client, mock_
     mqtt_service.publish_availability("online")
     for device in mock_devices:
         topic = device.get_topic("availability")
-        mock_mqtt_client.publish.assert_any_call(topic, "online", retain=True, qos=2)
+        mock_mqtt_client.publish.assert_any_call(topic, "online", retain=True, qos=1)
 
     # Reset the mock
     mock_mqtt_client.publish.reset_mock()
@@ -141,4 +151,298 @@ def test_mqtt_service_publish_availability(mqtt_service, mock_mqtt_client, mock_
     mqtt_service.publish_availability("offline")
     for device in mock_devices:
         topic = device.get_topic("availability")
-        mock_mqtt_client.publish.assert_any_call(topic, "offline", retain=True, qos=2)
\ No newline at end of file
+        mock_mqtt_client.publish.assert_any_call(topic, "offline", retain=True, qos=1)
+
+def test_mqtt_service_on_connect_wildcard(mqtt_service, mock_mqtt_client):
+    """Test a single wildcard subscription replaces the per-device ones."""
+    mqtt_service.subscribe_wildcard = True
+    mqtt_service.on_connect(mock_mqtt_client, None, None, 0)
+
+    mock_mqtt_client.subscribe.assert_called_once_with([("+/+/set", 0)])
+
+
+def test_mqtt_service_on_message_uses_index(mqtt_service, mock_devices):
+    """Test routing only touches the matching device."""
+    message = Mock()
+    message.topic = "motion/2/set"
+    message.payload = b"ON"
+
+    mqtt_service.on_message(None, None, message)
+
+    mock_devices[1].handle_command.assert_called_once_with("ON")
+    mock_devices[0].handle_command.assert_not_called()
+
+
+def test_mqtt_service_add_and_remove_device(mqtt_service, mock_mqtt_client):
+    """Test the routing index follows devices added or removed at runtime."""
+    device = Mock()
+    device.device_class = "light"
+    device.device_id = 7
+    device.get_topic.side_effect = lambda t: f"light/7/{t}"
+    device.decode_command.side_effect = bytes.decode
+    message = Mock()
+    message.topic = "light/7/set"
+    message.payload = b"ON"
+    mock_mqtt_client.is_connected.return_value = True
+
+    mqtt_service.add_device(device)
+    mqtt_service.on_message(None, None, message)
+    device.handle_command.assert_called_once_with("ON")
+    mock_mqtt_client.subscribe.assert_called_once_with("light/7/command")
+
+    mqtt_service.remove_device(device)
+    mqtt_service.on_message(None, None, message)
+    device.handle_command.assert_called_once()
+    mock_mqtt_client.unsubscribe.assert_called_once_with("light/7/command")
+    assert device not in mqtt_service.devices
+
+
+def test_mqtt_service_runs_removal_hooks(mqtt_service, mock_devices):
+    """Test removal hooks are told about removed devices and about the ones replaced by a rebuilt device."""
+    hook = Mock()
+    mqtt_service.removal_hooks.append(hook)
+    rebuilt = Mock(device_class=mock_devices[0].device_class, device_id=mock_devices[0].device_id, watched_pins=())
+    rebuilt.get_topic.side_effect = mock_devices[0].get_topic.side_effect
+
+    mqtt_service.replace_device(mock_devices[0], rebuilt)
+    hook.assert_called_once_with(mock_devices[0])
+    mqtt_service.remove_device(rebuilt)
+    hook.assert_called_with(rebuilt)
+
+
+def test_mqtt_service_delay_updates(mqtt_service, mock_mqtt_client):
+    """Test state changes are suppressed during a delay and published again afterwards."""
+    mqtt_service.delay_updates("garage_1", 0.05)
+    mqtt_service.handle_device_state_change("garage", 1, "opening")
+    mock_mqtt_client.publish.assert_not_called()
+
+    time.sleep(0.1)
+    mqtt_service.handle_device_state_change("garage", 1, "open")
+    mock_mqtt_client.publish.assert_called_once_with("garage/1/status", "open", retain=False, qos=1)
+    assert mqtt_service.timers.pending() == 0
+
+
+def test_mqtt_service_delay_updates_extends(mqtt_service):
+    """Test a new delay replaces the running one."""
+    mqtt_service.delay_updates("garage_1", 0.05)
+    mqtt_service.delay_updates("garage_1", 0.2)
+    time.sleep(0.1)
+
+    assert "garage_1" in mqtt_service.delayed_devices
+    assert mqtt_service.timers.pending() == 1
+
+
+def test_mqtt_service_publish_policy(mock_devices, mock_mqtt_client):
+    """Test each topic kind is published with its configured QoS and retain flag."""
+    service = MQTTService(host="localhost", port=1883, username="user", password="pass", devices=mock_devices,
+                          interval=0, publish_policy={"status": {"qos": 0}, "ack": {"qos": 2, "retain": True}},
+                          max_inflight=5)
+    mock_mqtt_client.publish.return_value = Mock(rc=0)
+
+    service.publish_status()
+    service.handle_device_state_change("garage", 1, "open")
+    service.publish_availability("online")
+
+    mock_mqtt_client.max_inflight_messages_set.assert_called_once_with(5)
+    mock_mqtt_client.publish.assert_any_call("status/garage/1", '{"status": "ok"}', retain=True, qos=0)
+    mock_mqtt_client.publish.assert_any_call("garage/1/status", "open", retain=True, qos=2)
+    mock_mqtt_client.publish.assert_any_call("availability/garage/1", "online", retain=True, qos=1)
+    assert service.publish_stats() == {"status": 2, "availability": 2, "ack": 1, "discovery": 0, "acknowledged": 0,
+                                       "rejected": 0, "spooled": 0, "replayed": 0, "inflight": 5}
+
+    service.on_publish(mock_mqtt_client, None, 1)
+    assert service.publish_stats()["inflight"] == 4
+
+
+@pytest.mark.parametrize("policy", [{"status": {"qos": 3}}, {"command": {"qos": 1}}, {"status": {"priority": 1}}])
+def test_mqtt_service_invalid_publish_policy(policy):
+    with pytest.raises(ValueError):
+        MQTTService.build_publish_policy(policy)
+
+
+def test_mqtt_service_publish_status_only_changed(mqtt_service, mock_mqtt_client, mock_devices):
+    """Test idle sweeps publish nothing and do not read the devices, state changes are published once."""
+    mqtt_service.publish_status()
+    mock_mqtt_client.publish.reset_mock()
+
+    mqtt_service.publish_status()
+    mock_mqtt_client.publish.assert_not_called()
+    for device in mock_devices:
+        device.get_status.assert_called_once()
+
+    mqtt_service.handle_device_state_change("motion", 2, '{"status": "idle"}')
+    mock_mqtt_client.publish.reset_mock()
+    mqtt_service.publish_status()
+    mock_mqtt_client.publish.assert_called_once_with("status/motion/2", '{"status": "idle"}', retain=True, qos=1)
+    assert mqtt_service.state_store.snapshot()["motion_2"] == '{"status": "idle"}'
+
+
+def test_mqtt_service_publish_status_after_delay(mqtt_service, mock_mqtt_client, mock_devices):
+    """Test a delayed device is skipped by the sweep and read again once the delay is over."""
+    mqtt_service.publish_status()
+    mock_mqtt_client.publish.reset_mock()
+
+    mqtt_service.delay_updates("garage_1", 0.05)
+    mock_devices[0].get_status.return_value = '{"status": "moved"}'
+    mqtt_service.publish_status()
+    mock_mqtt_client.publish.assert_not_called()
+
+    time.sleep(0.1)
+    mqtt_service.publish_status()
+    mock_mqtt_client.publish.assert_called_once_with("status/garage/1", '{"status": "moved"}', retain=True, qos=1)
+
+
+def test_mqtt_service_traces_commands(mqtt_service, mock_devices):
+    """Test a traced command is followed from its receipt to its status publish."""
+    mqtt_service.tracer = Tracer()
+    mock_devices[0].handle_command.side_effect = \
+        lambda command: mqtt_service.handle_device_state_change("garage", 1, '{"state": "open"}')
+    message = Mock(topic="garage/1/set", payload=b"OPEN", timestamp=time.monotonic())
+
+    mqtt_service.on_message(None, None, message)
+
+    trace, = mqtt_service.tracer.traces()
+    assert (trace.device, trace.command, trace.status) == ("garage_1", "OPEN", "ok")
+    assert [s.name for s in trace.spans] == ["mqtt.receive", "queue", "mqtt.publish_state", "device.handle_command"]
+    assert trace.spans[2].args == {"topic": "garage/1/status"}
+
+
+def test_mqtt_service_on_message_drops_unknown_commands(mqtt_service, mock_devices):
+    """Test payloads the device cannot decode are dropped on receipt, before being dispatched."""
+    mock_devices[0].decode_command.side_effect = ValueError("Unknown command")
+    mqtt_service.dispatch = Mock()
+
+    mqtt_service.on_message(None, None, Mock(topic="garage/1/set", payload=b"JUMP"))
+
+    mqtt_service.dispatch.assert_not_called()
+
+
+def test_publish_spools_while_disconnected(mock_devices, mock_mqtt_client, tmp_path):
+    """Test messages published offline are spooled, replayed once connected and dropped when acknowledged."""
+    spool = OutboundSpool(str(tmp_path / "spool"))
+    service = MQTTService(host="localhost", port=1883, username="user", password="pass", devices=mock_devices,
+                          interval=0, spool=spool)
+    mock_mqtt_client.is_connected.return_value = False
+
+    assert service.publish("garage/1/status", "open") is None
+    service.publish("garage/1/status", "closed")
+    mock_mqtt_client.publish.assert_not_called()
+    assert len(spool) == 1
+
+    mock_mqtt_client.is_connected.return_value = True
+    mock_mqtt_client.publish.return_value = Mock(mid=7)
+    service.on_connect(mock_mqtt_client, None, None, 0)
+    mock_mqtt_client.publish.assert_called_once_with("garage/1/status", b"closed", retain=False, qos=1)
+
+    service.on_publish(mock_mqtt_client, None, 7)
+    assert len(spool) == 0
+    assert service.publish_stats()["spooled"] == 2
+    assert service.publish_stats()["inflight"] == 0
+
+
+def test_live_publish_supersedes_spooled_message(mock_devices, mock_mqtt_client, tmp_path):
+    spool = OutboundSpool(str(tmp_path / "spool"))
+    service = MQTTService(host="localhost", port=1883, username="user", password="pass", devices=mock_devices,
+                          interval=0, spool=spool)
+    mock_mqtt_client.is_connected.return_value = False
+    service.publish("garage/1/status", "open")
+
+    mock_mqtt_client.is_connected.return_value = True
+    service.publish("garage/1/status", "closed")
+
+    assert len(spool) == 0
+
+
+def test_mqtt_service_ready_once_subscribed(mqtt_service, mock_mqtt_client):
+    """Test the service is ready once the batched subscription is acknowledged, and no longer once disconnected."""
+    mqtt_service.subscriptions.append("nodes/+")
+    mock_mqtt_client.subscribe.return_value = (0, 5)
+    mqtt_service.connecting()
+    mqtt_service.on_connect(mock_mqtt_client, None, None, 0)
+    assert mock_mqtt_client.subscribe.call_args.args[0][-1] == ("nodes/+", 0)
+    assert not mqtt_service.ready.is_set()
+
+    mqtt_service.on_subscribe(mock_mqtt_client, None, 4, (0,))
+    assert not mqtt_service.ready.is_set()
+    mqtt_service.on_subscribe(mock_mqtt_client, None, 5, (0, 0, 0))
+    assert mqtt_service.ready.is_set()
+    assert mqtt_service.last_ready_latency >= 0
+
+    mqtt_service.on_disconnect(mock_mqtt_client, None, 7)
+    assert not mqtt_service.ready.is_set()
+
+
+def test_mqtt_service_retries_with_backoff(mock_devices, mock_mqtt_client):
+    """Test every failed attempt sets paho's next reconnection delay from the backoff, reset once connected."""
+    backoff = Backoff(initial=1, maximum=4, rng=lambda: 1.0)
+    service = MQTTService(host="localhost", port=1883, username="user", password="pass", devices=mock_devices,
+                          interval=0, backoff=backoff)
+    service.start()
+    mock_mqtt_client.reconnect_delay_set.assert_called_once_with(1, 1)
+
+    for _ in range(3):
+        service.on_connect_fail(mock_mqtt_client, None)
+    assert mock_mqtt_client.reconnect_delay_set.call_args_list[1:] == [call(1, 1), call(2, 2), call(4, 4)]
+
+    service.on_connect(mock_mqtt_client, None, None, 0)
+    service.on_disconnect(mock_mqtt_client, None, 7)
+    mock_mqtt_client.reconnect_delay_set.assert_called_with(1, 1)
+
+
+def test_mqtt_service_bridge_availability(mock_devices, mock_mqtt_client):
+    """Test the bridge availability topic is the last will, and replaces the availability of the devices using it."""
+    mock_devices[0].get_topic.side_effect = lambda t: "bridge/availability" if t == "availability" else f"{t}/garage/1"
+    service = MQTTService(host="localhost", port=1883, username="user", password="pass", devices=mock_devices,
+                          interval=0, availability_topic="bridge/availability")
+    mock_mqtt_client.will_set.assert_called_once_with("bridge/availability", "offline", qos=1, retain=True)
+
+    service.publish_availability("online")
+    assert [c.args[:2] for c in mock_mqtt_client.publish.call_args_list] == [
+        ("bridge/availability", "online"), ("availability/motion/2", "online")]
+
+    # Devices removed on a reload: the bridge stays online
+    mock_mqtt_client.publish.reset_mock()
+    assert service.publish_availability("offline", mock_devices) is None
+    mock_mqtt_client.publish.assert_called_once_with("availability/motion/2", "offline", retain=True, qos=1)
+
+    # The broker published the will when the connection dropped
+    mock_mqtt_client.publish.reset_mock()
+    service.on_connect(mock_mqtt_client, None, None, 0)
+    mock_mqtt_client.publish.assert_not_called()
+    service.on_connect(mock_mqtt_client, None, None, 0)
+    mock_mqtt_client.publish.assert_called_once_with("bridge/availability", "online", retain=True, qos=1)
+
+
+def test_mqtt_service_sweep_rereads_watched_inputs(mock_mqtt_client):
+    """Test the sweep publishes the current level of an input whose last edge was swallowed by the debounce."""
+    gpio_service = GPIOService(devices=[{"id": 1, "class": "motion",
+                                         "gpio": [{"name": "status", "type": "input", "gpio": 4, "debounce": 200}]}],
+                               mock_gpio=True)
+    service = MQTTService(host="localhost", port=1883, username="user", password="pass", devices=[], interval=0)
+    device = MotionDevice(1, "motion", gpio_service, service, service.handle_device_state_change)
+    service.devices = [device]
+    service.publish_status()
+
+    gpio_service.set_mock_level(4, 1)
+    service.publish_status()
+    # Back to 0 within the debounce window: no edge is dispatched
+    gpio_service.set_mock_level(4, 0)
+    service.publish_status()
+
+    retained = [c.args[1] for c in mock_mqtt_client.publish.call_args_list
+                if c.args[0] == "motion/1/status" and c.kwargs["retain"]]
+    assert retained == [b"free", b"detected", b"free"]
+    assert service.state_store.snapshot() == {"motion_1": b"free"}
+
+
+def test_mqtt_service_rejected_messages_are_not_inflight(mqtt_service, mock_mqtt_client):
+    """Test messages dropped by the client are counted apart, QoS 1 messages kept for the next connection are not."""
+    mqtt_service.publish_policy["status"] = mqtt_service.publish_policy["status"]._replace(qos=0)
+    mock_mqtt_client.publish.return_value = Mock(rc=mqtt.MQTT_ERR_NO_CONN)
+    mqtt_service.publish("garage/1/status", "open", kind="status")
+    mqtt_service.publish("garage/1/status", "open", kind="ack")
+    mock_mqtt_client.publish.return_value = Mock(rc=mqtt.MQTT_ERR_QUEUE_SIZE)
+    mqtt_service.publish("garage/1/status", "open", kind="ack")
+
+    stats = mqtt_service.publish_stats()
+    assert (stats["status"], stats["ack"], stats["rejected"], stats["inflight"]) == (0, 1, 2, 1)
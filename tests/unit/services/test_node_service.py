@@ -0,0 +1,84 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from src.services.mqtt_service import AVAILABILITY
+from src.services.node_service import NodeService
+
+
+def device(identifier):
+    return SimpleNamespace(identifier=lambda: identifier)
+
+
+def announcement(node, devices, status="online", heartbeat=30, timestamp=1000.0):
+    payload = json.dumps({"node": node, "status": status, "devices": devices, "heartbeat": heartbeat,
+                          "timestamp": timestamp})
+    return SimpleNamespace(topic=f"ha-rpi-connector/nodes/{node}", payload=payload.encode())
+
+
+@pytest.fixture
+def clock():
+    return Mock(return_value=1000.0)
+
+
+@pytest.fixture
+def node_service(clock):
+    return NodeService(Mock(), "pi-a", [device("garage_1"), device("light_1")], Mock(), heartbeat=30, clock=clock)
+
+
+def test_announce(node_service):
+    node_service.on_connect()
+
+    topic, payload = node_service.mqtt_service.publish.call_args.args
+    assert topic == "ha-rpi-connector/nodes/pi-a"
+    assert json.loads(payload) == {"node": "pi-a", "status": "online", "devices": ["garage_1", "light_1"],
+                                   "heartbeat": 30, "timestamp": 1000.0}
+    assert node_service.mqtt_service.publish.call_args.kwargs == {"retain": True, "kind": AVAILABILITY}
+
+
+def test_heartbeat_and_stop(node_service):
+    node_service.start()
+    node_service.mqtt_service.subscriptions.append.assert_called_once_with("ha-rpi-connector/nodes/+")
+    node_service.timers.call_later.assert_called_once_with(30, node_service._beat)
+
+    node_service._beat()
+    assert node_service.timers.call_later.call_count == 2
+
+    node_service.stop()
+    node_service.timers.call_later.return_value.cancel.assert_called_once()
+    payload = json.loads(node_service.mqtt_service.publish.call_args.args[1])
+    assert payload["status"] == "offline" and payload["devices"] == []
+
+
+def test_peers_and_conflicts(node_service, clock):
+    node_service.on_announcement(None, None, announcement("pi-a", ["strip_1"]))
+    node_service.on_announcement(None, None, announcement("pi-b", ["light_1", "siren_1"]))
+
+    assert "pi-a" not in node_service.nodes
+    assert node_service.is_alive("pi-b")
+    assert node_service.owners() == {"light_1": "pi-a", "siren_1": "pi-b", "garage_1": "pi-a"}
+    assert node_service.conflicts() == [("pi-b", "light_1")]
+
+    # Resolved once pi-b stops claiming the device
+    node_service.on_announcement(None, None, announcement("pi-b", ["siren_1"]))
+    assert node_service.conflicts() == []
+
+
+def test_liveness(node_service, clock):
+    node_service.on_announcement(None, None, announcement("pi-b", ["siren_1"], heartbeat=10))
+    node_service.on_announcement(None, None, announcement("pi-c", ["motion_1"], status="offline"))
+
+    assert node_service.is_alive("pi-b")
+    assert not node_service.is_alive("pi-c")
+    clock.return_value = 1031.0
+    assert not node_service.is_alive("pi-b")
+    assert node_service.owners() == {"garage_1": "pi-a", "light_1": "pi-a"}
+
+    node_service.on_announcement(None, None, SimpleNamespace(topic="ha-rpi-connector/nodes/pi-b", payload=b""))
+    assert "pi-b" not in node_service.nodes
+
+
+def test_invalid_announcement_is_ignored(node_service):
+    node_service.on_announcement(None, None, SimpleNamespace(topic="ha-rpi-connector/nodes/pi-b", payload=b"{"))
+    assert node_service.nodes == {}
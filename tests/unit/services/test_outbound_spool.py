@@ -0,0 +1,114 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from src.services.outbound_spool import MAGIC, OutboundSpool
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "outbound.spool")
+
+
+def replay(spool):
+    published = []
+
+    def publish(topic, payload, qos, retain):
+        published.append((topic, payload, qos, retain))
+        return SimpleNamespace(mid=len(published))
+
+    spool.replay(publish)
+    return published
+
+
+def test_messages_survive_a_restart(path):
+    spool = OutboundSpool(path)
+    spool.put("garage/1/status", "open", 1, True)
+    spool.put("light/1/status", b'{"state": "ON"}', 0, False)
+    spool.close()
+
+    assert replay(OutboundSpool(path)) == [("garage/1/status", b"open", 1, True),
+                                           ("light/1/status", b'{"state": "ON"}', 0, False)]
+
+
+def test_messages_are_coalesced_per_topic(path):
+    spool = OutboundSpool(path)
+    spool.put("garage/1/status", "opening", 1, True)
+    spool.put("light/1/status", "ON", 1, True)
+    spool.put("garage/1/status", "open", 1, True)
+    spool.close()
+
+    restarted = OutboundSpool(path)
+    assert replay(restarted) == [("light/1/status", b"ON", 1, True), ("garage/1/status", b"open", 1, True)]
+    assert spool.coalesced == 1
+
+
+def test_acknowledged_messages_are_removed(path):
+    spool = OutboundSpool(path)
+    spool.put("garage/1/status", "open", 1, True)
+    spool.put("light/1/status", "ON", 1, True)
+    replay(spool)
+
+    spool.acknowledge(1)
+    spool.close()
+    assert [message[0] for message in replay(OutboundSpool(path))] == ["light/1/status"]
+
+    spool = OutboundSpool(path)
+    replay(spool)
+    spool.acknowledge(1)
+    # Emptied, the file starts over
+    assert len(spool) == 0
+    assert os.path.getsize(path) == len(MAGIC)
+
+
+def test_message_spooled_again_during_replay_is_kept(path):
+    spool = OutboundSpool(path)
+    spool.put("garage/1/status", "opening", 1, True)
+    replay(spool)
+    spool.put("garage/1/status", "open", 1, True)
+
+    spool.acknowledge(1)
+
+    assert replay(spool) == [("garage/1/status", b"open", 1, True)]
+
+
+def test_size_is_capped(path):
+    """Test the file is compacted at max_bytes, dropping the oldest messages that do not fit."""
+    spool = OutboundSpool(path, max_bytes=200)
+    for i in range(20):
+        spool.put("garage/1/status", f"state {i}", 1, True)
+    assert os.path.getsize(path) <= 200
+    for i in range(10):
+        spool.put(f"garage/{i}/status", "open", 1, True)
+    spool.close()
+
+    assert os.path.getsize(path) <= 200
+    topics = [message[0] for message in replay(OutboundSpool(path, max_bytes=200))]
+    assert topics[-1] == "garage/9/status"
+    assert "garage/1/status" not in topics
+    assert spool.dropped > 0
+
+
+def test_writes_are_batched(path):
+    timers = Mock()
+    spool = OutboundSpool(path, sync_interval=1.0, timers=timers)
+    spool.put("garage/1/status", "open", 1, True)
+    spool.put("garage/2/status", "open", 1, True)
+
+    timers.call_later.assert_called_once_with(1.0, spool.sync)
+    assert os.path.getsize(path) == len(MAGIC)
+    spool.sync()
+    assert spool.syncs == 1
+    assert len(replay(OutboundSpool(path))) == 2
+
+
+def test_torn_records_are_truncated(path):
+    spool = OutboundSpool(path)
+    spool.put("garage/1/status", "open", 1, True)
+    spool.put("garage/2/status", "closed", 1, True)
+    spool.close()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+
+    assert replay(OutboundSpool(path)) == [("garage/1/status", b"open", 1, True)]
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+from src.services.pulse_scheduler import PulseScheduler
+from src.services.timer_service import TimerService
+
+
+class Recorder:
+    """Record pin writes with their time relative to creation."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.writes = []
+        self.lock = threading.Lock()
+
+    def __call__(self, gpio, high):
+        with self.lock:
+            self.writes.append((gpio, high, time.monotonic() - self.start))
+
+    def edges(self, gpio):
+        return [(high, at) for pin, high, at in self.writes if pin == gpio]
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+@pytest.fixture
+def timers():
+    timers = TimerService()
+    yield timers
+    timers.stop()
+
+
+@pytest.fixture
+def scheduler(recorder, timers):
+    scheduler = PulseScheduler(recorder, timers, gap=0.05)
+    yield scheduler
+    scheduler.stop()
+
+
+def test_pulse_returns_immediately(scheduler, recorder):
+    """Test the caller does not wait for the restore edge."""
+    start = time.monotonic()
+    scheduler.pulse(18, 0.2)
+    assert time.monotonic() - start < 0.05
+
+    assert recorder.edges(18) == [(False, pytest.approx(0, abs=0.05))]
+    assert scheduler.is_busy(18)
+
+    assert scheduler.wait_idle(1)
+    (_, low_at), (high, high_at) = recorder.edges(18)
+    assert high is True
+    assert high_at - low_at == pytest.approx(0.2, abs=0.05)
+
+
+def test_pulses_on_same_pin_are_serialized(scheduler, recorder):
+    """Test overlapping pulses on one pin are played one after the other."""
+    scheduler.pulse(18, 0.1)
+    scheduler.pulse(18, 0.1)
+    assert scheduler.wait_idle(1)
+
+    edges = recorder.edges(18)
+    assert [high for high, _ in edges] == [False, True, False, True]
+    # The second press starts after the first one is released plus the gap
+    assert edges[2][1] - edges[1][1] == pytest.approx(0.05, abs=0.04)
+
+
+def test_pulses_on_different_pins_overlap(scheduler, recorder):
+    """Test two doors can be pulsed at the same time."""
+    scheduler.pulse(18, 0.2)
+    scheduler.pulse(20, 0.2)
+    assert scheduler.wait_idle(1)
+
+    assert recorder.edges(18)[1][1] == pytest.approx(0.2, abs=0.05)
+    assert recorder.edges(20)[1][1] == pytest.approx(0.2, abs=0.05)
+
+
+def test_stop_restores_active_pulses(scheduler, recorder, timers):
+    """Test stopping mid-pulse leaves the relay released."""
+    scheduler.pulse(18, 5)
+    scheduler.stop()
+
+    assert recorder.edges(18)[-1][0] is True
+    assert timers.pending() == 0
+    assert not scheduler.is_busy(18)
+    with pytest.raises(RuntimeError):
+        scheduler.pulse(18, 0.1)
@@ -0,0 +1,80 @@
+from unittest.mock import Mock
+
+import pytest
+from src.services.state_store import StateStore
+
+
+def make_device(device_class, device_id, status):
+    device = Mock()
+    device.identifier.return_value = f"{device_class}_{device_id}"
+    device.get_topic.side_effect = lambda t: f"{device_class}/{device_id}/{t}"
+    device.get_status.return_value = status
+    return device
+
+
+@pytest.fixture
+def devices():
+    return [make_device("garage", 1, "closed"), make_device("light", 2, "OFF")]
+
+
+@pytest.fixture
+def store(devices):
+    store = StateStore()
+    for device in devices:
+        store.register(device)
+    return store
+
+
+def test_store_reads_new_devices_once(store, devices):
+    """Test registered devices are read on the first sweep only."""
+    store.refresh()
+    assert sorted(store.take_dirty()) == [("garage/1/status", "closed"), ("light/2/status", "OFF")]
+
+    store.refresh()
+    assert store.take_dirty() == []
+    for device in devices:
+        device.get_status.assert_called_once()
+
+
+def test_store_tracks_changes(store):
+    """Test only recorded changes that differ from the published state are dirty."""
+    store.refresh()
+    store.take_dirty()
+
+    assert store.record("light_2", "ON")
+    assert store.take_dirty() == [("light/2/status", "ON")]
+
+    store.record("light_2", "OFF")
+    assert not store.record("light_2", "ON")  # Back to the published state
+    assert store.take_dirty() == []
+    assert not store.record("siren_9", "ON")  # Unknown device
+
+
+def test_store_skip_keeps_devices_dirty(store):
+    store.refresh(skip={"garage_1"})
+    assert store.take_dirty(skip={"light_2"}) == []
+    assert store.stats() == {"devices": 2, "dirty": 1, "stale": 1}
+
+    store.refresh()
+    assert sorted(store.take_dirty()) == [("garage/1/status", "closed"), ("light/2/status", "OFF")]
+
+
+def test_store_invalidate(store, devices):
+    """Test invalidated devices are read again."""
+    store.refresh()
+    store.take_dirty()
+    devices[0].get_status.return_value = "open"
+
+    store.invalidate("garage_1")
+    store.refresh()
+
+    assert store.take_dirty() == [("garage/1/status", "open")]
+    assert store.snapshot() == {"garage_1": "open", "light_2": "OFF"}
+
+
+def test_store_unregister(store, devices):
+    store.unregister(devices[1])
+    store.refresh()
+
+    assert store.snapshot() == {"garage_1": "closed"}
+    devices[1].get_status.assert_not_called()
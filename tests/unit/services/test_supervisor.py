@@ -0,0 +1,106 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+from unittest.mock import Mock
+from src.services.supervisor import Supervisor
+
+
+@pytest.fixture
+def supervisor():
+    return Supervisor(shutdown_timeout=1)
+
+
+def run_in_thread(supervisor):
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    return thread
+
+
+def test_supervisor_is_idle_while_running(supervisor):
+    """The supervisor must not burn CPU while waiting for a stop request."""
+    thread = run_in_thread(supervisor)
+    time.sleep(0.1)
+
+    cpu_start = time.process_time()
+    time.sleep(0.5)
+    cpu_used = time.process_time() - cpu_start
+
+    supervisor.request_stop()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert cpu_used < 0.05
+    assert supervisor.cpu_usage() < 0.1
+
+
+def test_supervisor_runs_hooks_in_reverse_order(supervisor):
+    """Test shutdown hooks are run last-registered first."""
+    calls = []
+    supervisor.add_shutdown_hook(lambda: calls.append("gpio"))
+    supervisor.add_shutdown_hook(lambda: calls.append("mqtt"))
+
+    thread = run_in_thread(supervisor)
+    supervisor.request_stop()
+    thread.join(1)
+
+    assert calls == ["mqtt", "gpio"]
+
+
+def test_supervisor_shutdown_is_bounded(supervisor):
+    """A hanging hook must not keep the process alive past the shutdown timeout."""
+    supervisor.shutdown_timeout = 0.2
+    supervisor.add_shutdown_hook(lambda: time.sleep(5))
+
+    start = time.monotonic()
+    supervisor.shutdown()
+    assert time.monotonic() - start < 1
+
+
+def test_supervisor_failing_hook_does_not_block_others(supervisor):
+    """Test a failing hook is logged and the remaining hooks still run."""
+    hook = Mock()
+    supervisor.add_shutdown_hook(hook)
+    supervisor.add_shutdown_hook(Mock(side_effect=RuntimeError("boom")))
+
+    supervisor.shutdown()
+    hook.assert_called_once()
+
+
+def test_supervisor_stops_on_sigterm(supervisor):
+    """Test SIGTERM stops the supervisor when it runs in the main thread."""
+    previous = signal.getsignal(signal.SIGTERM)
+    hook = Mock()
+    supervisor.add_shutdown_hook(hook)
+
+    timer = threading.Timer(0.1, os.kill, args=(os.getpid(), signal.SIGTERM))
+    timer.start()
+    supervisor.run()
+
+    hook.assert_called_once()
+    assert signal.getsignal(signal.SIGTERM) is previous
+
+
+def test_supervisor_dispatches_custom_signal(supervisor):
+    """Test custom signal handlers run from the supervisor loop."""
+    handler = Mock(side_effect=lambda: supervisor.request_stop())
+    supervisor.add_signal_handler(signal.SIGUSR1, handler)
+
+    timer = threading.Timer(0.1, os.kill, args=(os.getpid(), signal.SIGUSR1))
+    timer.start()
+    supervisor.run()
+
+    handler.assert_called_once()
+
+
+def test_supervisor_sends_signals_from_other_threads(supervisor):
+    """Test send_signal runs the signal handler on the supervisor loop."""
+    threads = []
+    supervisor.add_signal_handler(signal.SIGHUP,
+                                  lambda: threads.append(threading.current_thread()) or supervisor.request_stop())
+
+    threading.Timer(0.1, supervisor.send_signal, args=(signal.SIGHUP,)).start()
+    supervisor.run()
+
+    assert threads == [threading.current_thread()]
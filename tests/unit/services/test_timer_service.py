@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from unittest.mock import Mock
+from src.services.timer_service import AsyncioTimerService, TimerService
+
+
+@pytest.fixture
+def timers():
+    timers = TimerService()
+    yield timers
+    timers.stop()
+
+
+def test_timer_service_runs_callbacks_in_deadline_order(timers):
+    """Test callbacks run in deadline order, not scheduling order."""
+    calls = []
+    done = threading.Event()
+    timers.call_later(0.1, lambda: (calls.append("late"), done.set()))
+    timers.call_later(0.05, calls.append, "early")
+
+    assert done.wait(1)
+    assert calls == ["early", "late"]
+
+
+def test_timer_service_cancel(timers):
+    """Test a cancelled callback never runs and is not counted as pending."""
+    callback = Mock()
+    timer = timers.call_later(0.05, callback)
+    assert timers.pending() == 1
+
+    timer.cancel()
+    timer.cancel()
+    time.sleep(0.1)
+
+    callback.assert_not_called()
+    assert not timer.active
+    assert timers.stats()["cancelled"] == 1
+    assert timers.pending() == 0
+
+
+def test_timer_service_reports_lateness(timers):
+    """Test the stats expose how late callbacks ran."""
+    done = threading.Event()
+    timers.call_later(0.01, done.set)
+    assert done.wait(1)
+
+    stats = timers.stats()
+    assert stats["fired"] == 1
+    assert 0 <= stats["lateness_ms_max"] < 50
+
+
+def test_timer_service_compacts_cancelled_timers(timers):
+    """Test mass cancellations do not leave the heap growing."""
+    handles = [timers.call_later(60, Mock()) for _ in range(1000)]
+    for handle in handles:
+        handle.cancel()
+
+    assert timers.pending() == 0
+    assert len(timers._heap) < 100
+
+
+def test_timer_service_failing_callback_does_not_stop_others(timers):
+    done = threading.Event()
+    timers.call_later(0, Mock(side_effect=RuntimeError("boom")))
+    timers.call_later(0.01, done.set)
+
+    assert done.wait(1)
+
+
+def test_timer_service_stop(timers):
+    timers.stop()
+    with pytest.raises(RuntimeError):
+        timers.call_later(0, Mock())
+
+
+def test_asyncio_timer_service():
+    """Test the asyncio variant runs callbacks on the loop, including those registered before attach()."""
+    timers = AsyncioTimerService()
+    calls = []
+    timers.call_later(0.01, calls.append, "before")
+    cancelled = timers.call_later(0.01, calls.append, "cancelled")
+    cancelled.cancel()
+
+    async def run():
+        timers.attach(asyncio.get_running_loop())
+        timers.call_later(0.02, calls.append, "after")
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert calls == ["before", "after"]
+    assert timers.pending() == 0
+
+
+def test_asyncio_timer_service_stop():
+    """Test stop() cancels the callbacks already scheduled on the loop."""
+    timers = AsyncioTimerService()
+    calls = []
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        timers.attach(loop)
+        timers.call_later(0.05, calls.append, "pending")
+        await asyncio.sleep(0.01)
+        await loop.run_in_executor(None, timers.stop)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert calls == []
+    assert timers.stats()["cancelled"] == 1
+    with pytest.raises(RuntimeError):
+        timers.call_later(0, calls.append, "late")
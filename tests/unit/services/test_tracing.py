@@ -0,0 +1,75 @@
+import json
+import time
+
+import pytest
+from src.services.tracing import Tracer, current_trace, execution, span
+
+
+@pytest.fixture
+def tracer():
+    return Tracer(capacity=3)
+
+
+def test_execution_records_queue_handler_and_nested_spans(tracer):
+    """Test a traced command gets its wait, handler and GPIO spans, in order."""
+    trace = tracer.start("light_1", "ON", time.monotonic())
+    with execution(trace):
+        assert current_trace() is trace
+        with span("gpio.write", pin=17):
+            pass
+
+    assert current_trace() is None
+    assert trace.status == "ok"
+    assert [s.name for s in trace.spans] == ["mqtt.receive", "queue", "gpio.write", "device.handle_command"]
+    assert trace.spans[2].args == {"pin": 17}
+    assert tracer.traces() == [trace]
+
+
+def test_execution_marks_failed_commands(tracer):
+    """Test a handler raising finishes its trace as an error."""
+    trace = tracer.start("light_1", "ON")
+    with pytest.raises(RuntimeError):
+        with execution(trace):
+            raise RuntimeError("boom")
+    assert trace.status == "error"
+
+
+def test_untraced_execution_and_spans_do_nothing(tracer):
+    """Test spans outside of a traced command are not recorded anywhere."""
+    with execution(None):
+        with span("gpio.write", pin=17):
+            pass
+    assert tracer.traces() == []
+
+
+def test_ring_buffer_keeps_latest_traces(tracer):
+    """Test only the last `capacity` traces are kept, and a trace is stored once."""
+    traces = [tracer.start("light_1", str(i)) for i in range(5)]
+    for trace in traces:
+        trace.finish()
+    traces[-1].finish("dropped")
+
+    assert tracer.traces() == traces[2:]
+    assert traces[-1].status == "ok"
+    assert [entry["command"] for entry in tracer.dump()] == ["2", "3", "4"]
+
+
+def test_chrome_export(tracer, tmp_path):
+    """Test the export is a Chrome trace with one row per command and microsecond timestamps."""
+    trace = tracer.start("light_1", "ON", time.monotonic())
+    with execution(trace):
+        with span("gpio.write", pin=17):
+            pass
+
+    path = tmp_path / "trace.json"
+    tracer.export_chrome(str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+
+    assert events[0] == {"name": "thread_name", "ph": "M", "pid": 1, "tid": trace.trace_id,
+                         "args": {"name": "light_1 ON"}}
+    complete = [event for event in events if event["ph"] == "X"]
+    assert [event["name"] for event in complete] == ["command", "mqtt.receive", "queue", "gpio.write",
+                                                     "device.handle_command"]
+    assert complete[0]["ts"] == pytest.approx(trace.start * 1e6)
+    assert complete[0]["dur"] >= complete[-1]["dur"]
+    assert complete[3]["args"]["pin"] == 17
@@ -0,0 +1,37 @@
+from benchmarks.harness import compare, load_baseline, measure, percentile, save_baseline
+
+
+def test_measure_reports_rates_and_percentiles():
+    result = measure(lambda: sum(range(100)), samples=5, min_time=0.001, warmup=1)
+
+    assert result["ops_per_sec"] > 0
+    assert result["p50_us"] <= result["p95_us"] <= result["p99_us"]
+    assert result["calls_per_sample"] >= 1
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 95) == 7
+
+
+def test_baseline_round_trip_and_compare(tmp_path):
+    """Test slowdowns beyond the threshold are flagged, and benchmarks missing from the baseline ignored."""
+    path = tmp_path / "baseline.json"
+    save_baseline({"fast": {"ops_per_sec": 1000.0}, "slow": {"ops_per_sec": 1000.0}}, path)
+
+    report = compare({"fast": {"ops_per_sec": 950.0}, "slow": {"ops_per_sec": 700.0}, "new": {"ops_per_sec": 1.0}},
+                     load_baseline(path), threshold=0.15)
+
+    assert report["fast"]["regression"] is False
+    assert report["slow"]["regression"] is True
+    assert round(report["slow"]["change"], 2) == -0.3
+    assert "new" not in report
+
+
+def test_routing_benchmark_runs():
+    """Keep the routing benchmark in step with the device interface MQTTService relies on."""
+    from benchmarks.routing import route_cost
+
+    assert route_cost(10, number=100) > 0
@@ -0,0 +1,34 @@
+from benchmarks.importtime import check_budget, measure_imports, parse_importtime, startup_statement, total_us
+
+OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       658 |       1985 | site
+import time:       300 |        300 |     yaml.error
+import time:       700 |       1000 |   yaml
+import time:       500 |       1500 | src.utils.config
+import time:       100 |        100 | src.devices.motion
+"""
+
+
+def test_parse_importtime():
+    entries = parse_importtime(OUTPUT)
+
+    assert [entry["module"] for entry in entries] == ["site", "yaml.error", "yaml", "src.utils.config",
+                                                      "src.devices.motion"]
+    assert [entry["depth"] for entry in entries] == [0, 2, 1, 0, 0]
+    assert entries[2]["self_us"] == 700 and entries[2]["cumulative_us"] == 1000
+    assert total_us(entries) == 1600
+
+
+def test_check_budget():
+    report = {"total_ms": 1.6, "entries": parse_importtime(OUTPUT)}
+
+    assert check_budget(report, {"max_ms": 2, "forbidden": ["numpy"]}) == []
+    assert check_budget(report, {"max_ms": 1, "forbidden": ["yaml"]}) == [
+        "startup imports took 1.6 ms, budget 1 ms", "yaml is imported"]
+
+
+def test_motion_only_startup_skips_heavy_imports():
+    """Test a node without strips nor the asyncio runtime loads neither numpy nor asyncio."""
+    report = measure_imports(startup_statement(["motion", "garage"]), runs=1)
+
+    assert check_budget(report, {"max_ms": float("inf"), "forbidden": ["numpy", "asyncio", "http.server"]}) == []
@@ -0,0 +1,134 @@
+import json
+import pickle
+from unittest.mock import patch
+
+import pytest
+import yaml
+from src.utils.config import changed_sections, compile_config, diff_devices, freeze, get_config, node_name, owned_config
+
+CONFIG = """
+devices:
+  - id: 1
+    class: garage
+    gpio:
+      - {name: status, type: input, gpio: 18}
+      - {name: control, type: output, gpio: 20, default: high}
+  - id: 2
+    class: strip
+    gpio:
+      - {name: control, type: output, gpio: 12}
+      - {name: power, type: output, gpio: 13}
+    env:
+      num_leds: 60
+      color: [255, 120, 0]
+mqtt:
+  host: localhost
+  port: 1883
+"""
+
+
+def raw_config():
+    return yaml.safe_load(CONFIG)
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "default.yaml"
+    path.write_text(CONFIG)
+    return path
+
+
+def test_config_is_compiled_and_frozen(config_file):
+    """Test defaults are filled in and the result cannot be modified."""
+    config = get_config(config_file, cache_path=False)
+
+    assert config["mqtt"]["username"] == ""
+    assert config["devices"][0]["env"] == {}
+    assert config["devices"][1]["env"]["color"] == (255, 120, 0)
+    with pytest.raises(TypeError):
+        config["devices"][0]["id"] = 3
+    with pytest.raises(TypeError):
+        config["mqtt"]["host"] = "broker"
+
+
+def test_config_cache_is_reused_until_the_file_changes(config_file, tmp_path):
+    """Test an unchanged file is not parsed again, a modified one is."""
+    cache_path = tmp_path / "cache"
+    first = get_config(config_file, cache_path)
+    with patch("src.utils.config.yaml.load") as load:
+        assert get_config(config_file, cache_path) == first
+        load.assert_not_called()
+
+    config_file.write_text(CONFIG.replace("port: 1883", "port: 1884"))
+    assert get_config(config_file, cache_path)["mqtt"]["port"] == 1884
+
+
+
+def test_config_cache_is_plain_json(config_file, tmp_path):
+    """Test the cache holds data only: anything but the JSON it writes is ignored and replaced."""
+    cache_path = tmp_path / "cache"
+    cache_path.write_bytes(pickle.dumps({"key": None, "config": {}}))
+    config = get_config(config_file, cache_path)
+
+    cached = json.loads(cache_path.read_text())
+    assert cached["config"]["mqtt"] == dict(config["mqtt"])
+
+@pytest.mark.parametrize("change, error", [
+    (lambda c: c.update(colour=1), "Unknown configuration section 'colour'"),
+    (lambda c: c.pop("mqtt"), "Missing configuration section 'mqtt'"),
+    (lambda c: c["mqtt"].update(port="1883"), "mqtt.port: expected int"),
+    (lambda c: c.update(runtime="fibers"), "runtime: expected one of"),
+    (lambda c: c["devices"][0]["gpio"][0].update(type="analog"), r"devices\[0\].gpio\[0\].type"),
+    (lambda c: c["devices"][0]["gpio"][1].update(defualt="high"), r"unknown keys \['defualt'\]"),
+    (lambda c: c["devices"][0]["gpio"][1].update(gpio=True), r"devices\[0\].gpio\[1\].gpio: expected int"),
+    (lambda c: c["devices"][1].update(id=1, **{"class": "garage"}), "duplicate device garage 1"),
+    (lambda c: c["devices"][1]["gpio"][0].update(gpio=18), "GPIO pin 18 is already used by garage 1"),
+    (lambda c: c["devices"][1]["gpio"][1].update(name="control"), "duplicate pin name 'control'"),
+    (lambda c: c["devices"][0].update(availability="own"), r"devices\[0\].availability: expected one of"),
+])
+def test_config_validation(change, error):
+    raw = raw_config()
+    change(raw)
+    with pytest.raises(ValueError, match=error):
+        compile_config(raw)
+
+
+def test_config_diff():
+    old = freeze(compile_config(raw_config()))
+    raw = raw_config()
+    raw["devices"][1]["env"]["num_leds"] = 120
+    raw["devices"].append({"id": 3, "class": "motion", "gpio": [{"name": "status", "type": "input", "gpio": 4}]})
+    del raw["devices"][0]
+    raw["status_interval"] = 30
+    new = freeze(compile_config(raw))
+
+    assert diff_devices(old, new) == ([("motion", 3)], [("garage", 1)], [("strip", 2)])
+    assert changed_sections(old, new) == ["status_interval"]
+
+
+def test_nodes_share_pin_numbers():
+    """Test pins only clash between devices of one node, or with devices run by every node."""
+    raw = raw_config()
+    raw["devices"][0]["node"] = "pi-a"
+    raw["devices"][1]["node"] = "pi-b"
+    raw["devices"][1]["gpio"][0]["gpio"] = 18
+    config = freeze(compile_config(raw))
+
+    assert [device["id"] for device in owned_config(config, "pi-a")["devices"]] == [1]
+    assert [device["id"] for device in owned_config(config, "pi-b")["devices"]] == [2]
+
+    raw["devices"][1]["node"] = None
+    with pytest.raises(ValueError, match="GPIO pin 18 is already used by garage 1"):
+        compile_config(raw)
+
+
+def test_unassigned_devices_run_on_every_node():
+    config = freeze(compile_config(raw_config()))
+    assert len(owned_config(config, "pi-a")["devices"]) == 2
+
+
+def test_node_name(monkeypatch):
+    monkeypatch.delenv("HA_RPI_NODE", raising=False)
+    assert node_name({"node": {"name": "pi-a"}}) == "pi-a"
+    monkeypatch.setenv("HA_RPI_NODE", "pi-b")
+    assert node_name({"node": {"name": "pi-a"}}) == "pi-b"
@@ -0,0 +1,95 @@
+import logging
+import queue
+
+import pytest
+from src.utils.logger import DroppingQueueHandler, LogPipeline, RateLimitFilter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+def make_record(msg="Published to %s", args=("topic",), level=logging.DEBUG, lineno=10):
+    return logging.LogRecord("MQTTService", level, "mqtt_service.py", lineno, msg, args, None)
+
+
+def test_rate_limit_burst_and_refill():
+    """Test a call site is cut off after its burst, then let through at the refill rate with a summary."""
+    clock = Clock()
+    rate_limit = RateLimitFilter(rate=2, burst=3, clock=clock)
+
+    assert [rate_limit.filter(make_record()) for _ in range(5)] == [True, True, True, False, False]
+    assert rate_limit.suppressed == 2
+
+    clock.now = 0.5
+    record = make_record()
+    assert rate_limit.filter(record)
+    assert record.getMessage() == "Published to topic [2 similar messages suppressed]"
+
+
+def test_rate_limit_is_per_call_site():
+    """Test another call site keeps its own budget, and errors are never suppressed."""
+    rate_limit = RateLimitFilter(rate=1, burst=1, clock=Clock())
+    assert rate_limit.filter(make_record())
+    assert not rate_limit.filter(make_record())
+    assert rate_limit.filter(make_record(lineno=20))
+    assert rate_limit.filter(make_record(level=logging.ERROR))
+
+
+def test_rate_limit_sampling():
+    """Test one in `sample` suppressed records is still let through."""
+    rate_limit = RateLimitFilter(rate=1, burst=1, sample=3, clock=Clock())
+    assert [rate_limit.filter(make_record()) for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert rate_limit.suppressed == 4
+
+
+@pytest.mark.parametrize("rate, burst, sample", [(0, 1, 0), (1, 0, 0), (1, 1, -1)])
+def test_rate_limit_invalid(rate, burst, sample):
+    with pytest.raises(ValueError):
+        RateLimitFilter(rate=rate, burst=burst, sample=sample)
+
+
+def test_queue_handler_drops_when_full_without_formatting():
+    """Test records are queued unformatted and counted as dropped once the queue is full."""
+    handler = DroppingQueueHandler(queue.Queue(1))
+    record = make_record(args=({"payload": 1},))
+    handler.handle(record)
+    handler.handle(make_record())
+
+    assert handler.queue.get_nowait() is record
+    assert record.msg == "Published to %s"
+    assert handler.dropped == 1
+
+
+def test_pipeline_writes_in_background_and_flushes_on_stop():
+    """Test records reach the handlers through the writer thread, and stop() writes the queued ones."""
+    target = ListHandler()
+    target.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    pipeline = LogPipeline([target], rate_limit=RateLimitFilter(rate=1, burst=2, clock=Clock()))
+    logger = logging.getLogger("test_logger.pipeline")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(pipeline.handler)
+    pipeline.start()
+    try:
+        for _ in range(4):
+            logger.debug("Mock write GPIO pin %s to %s", 22, "high")
+    finally:
+        pipeline.stop()
+        logger.removeHandler(pipeline.handler)
+
+    assert target.messages == ["DEBUG Mock write GPIO pin 22 to high"] * 2
+    assert pipeline.stats() == {"queued": 0, "dropped": 0, "suppressed": 2}
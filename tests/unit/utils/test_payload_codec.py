@@ -0,0 +1,90 @@
+import json
+from enum import Enum
+from unittest.mock import patch
+
+import pytest
+from src.utils.payload_codec import PayloadCodec
+from src.utils.payload_loader import PayloadLoader
+
+
+class Command(Enum):
+    ON = "on"
+    OFF = "off"
+
+
+class State(Enum):
+    RUNNING = "running"
+
+
+PAYLOADS = {"fan": {"on": "ON", "off": "OFF", "running": "spinning"}}
+
+
+@pytest.fixture(autouse=True)
+def loader():
+    """Keep the test codecs out of the codecs registered by the device classes."""
+    with patch.object(PayloadLoader, "_codecs", []), patch.object(PayloadLoader, "_payloads", None):
+        yield
+
+
+def test_codec_decodes_bytes_and_text_to_commands():
+    codec = PayloadCodec("fan", Command, State)
+    codec.compile(PAYLOADS)
+
+    assert codec.decode(b"ON") is Command.ON
+    assert codec.decode("OFF") is Command.OFF
+    assert codec.decode(Command.OFF) is Command.OFF
+    assert codec.decode(b"on") is None
+    assert codec.decode(b"spinning") is None
+
+
+def test_codec_encodes_states():
+    codec = PayloadCodec("fan", Command, State, state_format=lambda state: json.dumps({"state": state}))
+    codec.compile(PAYLOADS)
+
+    assert codec.encode(State.RUNNING) == b'{"state": "spinning"}'
+    assert codec.payload(State.RUNNING) == "spinning"
+    assert codec.payload(Command.ON) == "ON"
+
+
+def test_codec_rejects_missing_and_duplicate_payloads():
+    codec = PayloadCodec("fan", Command, State)
+    with pytest.raises(ValueError, match=r"Missing payloads \['off', 'running'\] in section 'fan'"):
+        codec.compile({"fan": {"on": "ON"}})
+    with pytest.raises(ValueError, match="more than one command"):
+        codec.compile({"fan": {"on": "ON", "off": "ON", "running": "spinning"}})
+    with pytest.raises(ValueError, match=r"Payloads \['off', 'on'\] .* must be quoted"):
+        codec.compile({"fan": {"on": True, "off": False, "running": "spinning"}})
+
+
+def test_loader_compiles_registered_codecs(tmp_path):
+    """Test codecs are compiled when the payloads are loaded, or on registration once they are."""
+    path = tmp_path / "payloads.yaml"
+    path.write_text('fan:\n  "on": "ON"\n  "off": "OFF"\n  running: spinning\n')
+    codec = PayloadCodec("fan", Command, State)
+
+    PayloadLoader.load_payloads(path)
+
+    assert codec.decode(b"ON") is Command.ON
+    assert PayloadCodec("fan", states=State).encode(State.RUNNING) == b"spinning"
+
+
+def test_loader_fails_on_missing_payloads(tmp_path):
+    """Test a payload missing from the file fails the load rather than the first command."""
+    path = tmp_path / "payloads.yaml"
+    path.write_text('fan:\n  "on": "ON"\n')
+    PayloadCodec("fan", Command, State)
+
+    with pytest.raises(ValueError, match="Missing payloads"):
+        PayloadLoader.load_payloads(path)
+    assert PayloadLoader._payloads is None
+
+
+def test_repository_payloads_cover_every_device_class():
+    """Test conf/payloads.yaml has every payload the device classes use."""
+    from src.devices.garage import GarageDevice
+    from src.devices.light import LightDevice
+    from src.devices.motion import MotionDevice
+    from src.devices.siren import SirenDevice
+    from src.devices.strip import StripDevice
+    for device_class in (GarageDevice, LightDevice, MotionDevice, SirenDevice, StripDevice):
+        device_class.codec.compile(PayloadLoader.load_payloads())